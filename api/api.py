@@ -1,11 +1,27 @@
-import uuid
+import json
+import hashlib
 import logging
 
-from flask import request, jsonify
+from flask import Response, request, jsonify, stream_with_context
 from service.config import ConfigLoader
+from service.concurrency import ThreadBusyError, OverloadedError, TokenBucketLimiter
+from service.agent.resilience import ModelTimeoutError
+from service.checkpointer import CheckpointerFactory
+from service.metrics import get_metrics
+from service.jobs import JobManager
+from service.idempotency import IdempotencyStore, IdempotencyConflictError, IdempotencyInProgressError
+from service.log import bind_request, bind_thread, current_request_id, summarize_payload
 
 class API:
-    def __init__(self, app, agent, config_loader=None):
+    SSE_HEADERS = {
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    }
+
+    # Longest Idempotency-Key accepted
+    MAX_IDEMPOTENCY_KEY = 255
+
+    def __init__(self, app, agent, config_loader=None, idempotency=None):
         if not app:
             raise ValueError("app can't be None")
 
@@ -23,13 +39,22 @@ class API:
         self.app = app
         self.agent = agent
         self.config_loader = config_loader
+        self.metrics = get_metrics(config_loader.config)
+        self.rate_limiter = TokenBucketLimiter.from_config(config_loader.config, self.metrics)
+        self.jobs = JobManager.from_config(config_loader.config)
+        self.idempotency = idempotency
 
         self.register()
 
         logging.debug("API created")
 
+    def bind_log_context(self):
+        """Give every log line of this request its request_id (and thread_id, when known)"""
+        view_args = request.view_args or {}
+        bind_request(thread_id=view_args.get('thread_id'))
+
     def get_data(self):
-        request_id = str(uuid.uuid4())
+        request_id = current_request_id() or bind_request()
 
         try:
             data = request.get_json(force=True)
@@ -40,7 +65,10 @@ class API:
         if data is None:
             return None, self.send_error(400, "No JSON data provided")
 
-        logging.info(f"got request: id: {request_id}, data: {data}")
+        if isinstance(data, dict):
+            bind_thread(data.get('thread_id'))
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            logging.info(f"got request: id: {request_id}, data: {summarize_payload(data)}")
         data['request_id'] = request_id
 
         return data, None
@@ -51,8 +79,174 @@ class API:
     def send_error(self, code, text):
         return self.send(code, {'error': text})
 
+    def send_overloaded(self, error):
+        return self.respond(self.overloaded(error))
+
+    def overloaded(self, error):
+        logging.warning(f"request rejected: {error}")
+        return 429, {'error': str(error), 'reason': error.reason}, {'Retry-After': str(error.retry_after)}
+
+    def respond(self, outcome, replayed=False):
+        """Send a (code, body, headers) outcome"""
+        code, body, headers = outcome
+        headers = dict(headers)
+        if replayed:
+            headers['Idempotent-Replayed'] = 'true'
+        body, code = self.send(code, body)
+        return body, code, headers
+
+    def limit_rate(self, data, cost=1):
+        """Take from the client's (or thread's) token bucket; returns a 429 response when it is empty"""
+        if self.rate_limiter is None:
+            return None
+        if cost > self.rate_limiter.burst:
+            return self.send_error(413, f"request costs {cost} rate limit tokens, more than the burst of "
+                                        f"{self.rate_limiter.burst}: split it")
+        try:
+            self.rate_limiter.acquire(self.rate_limit_key(data), cost)
+        except OverloadedError as e:
+            return self.send_overloaded(e)
+        return None
+
+    def rate_limit_key(self, data):
+        rate_limit = self.config_loader.config.concurrency.rate_limit
+        if rate_limit.key == 'thread' and data.get('thread_id'):
+            return f"thread:{data['thread_id']}"
+        return f"client:{self.client_id(rate_limit.client_header)}"
+
+    def client_id(self, header):
+        return request.headers.get(header) or request.remote_addr
+
+    def check_admission(self):
+        """Fail fast when the agent's queue is full, before a response starts streaming"""
+        admission = getattr(self.agent, 'admission', None)
+        if admission is None:
+            return None
+        try:
+            admission.check()
+        except OverloadedError as e:
+            return self.send_overloaded(e)
+        return None
+
     def register(self):
+        self.app.before_request(self.bind_log_context)
         self.app.add_url_rule('/message', 'message', self.message, methods=['POST'])
+        self.app.add_url_rule('/message/stream', 'message_stream', self.message_stream, methods=['POST'])
+        self.app.add_url_rule('/messages/batch', 'messages_batch', self.messages_batch, methods=['POST'])
+        self.app.add_url_rule('/threads/<thread_id>/messages', 'thread_messages', self.thread_messages, methods=['GET'])
+
+        endpoints = self.config_loader.config.api.endpoints
+        self.app.add_url_rule(endpoints['health'], 'health', self.health, methods=['GET'])
+        if self.metrics is not None:
+            self.app.add_url_rule(endpoints['metrics'], 'metrics', self.metrics_view, methods=['GET'])
+        if self.jobs is not None:
+            self.app.add_url_rule('/jobs/<job_id>', 'job', self.job, methods=['GET'])
+
+    def start_jobs(self):
+        """Start the background job workers, once the agent exists"""
+        if self.jobs is not None:
+            self.jobs.start(self.run_job)
+
+    def run_job(self, job):
+        bind_request(job.id, job.thread_id)
+        state, error = self.agent.handle_message(job.payload['message'], job.thread_id, delta=job.payload['delta'])
+        if error:
+            raise error
+        return self.serialize_state(state)
+
+    def is_async_request(self):
+        return request.args.get('async', '').lower() in ('1', 'true', 'yes')
+
+    def submit_job(self, data):
+        """Queue the turn; the outcome is 202 with the job's id"""
+        if self.jobs is None:
+            return 400, {'error': "async jobs are disabled"}, {}
+
+        try:
+            job = self.jobs.submit(data['thread_id'], {
+                'message': data['message'],
+                'delta': self.is_delta_response(data),
+            })
+        except OverloadedError as e:
+            return self.overloaded(e)
+
+        logging.debug(f"job queued: id {job.id}")
+        return 202, job.to_dict(), {'Location': f"/jobs/{job.id}"}
+
+    def idempotency_request(self, data):
+        """(key, fingerprint) of a request carrying an idempotency key, (None, None) otherwise, and an error response"""
+        if self.idempotency is None:
+            return None, None, None
+        key = self.idempotency_key()
+        if not key:
+            return None, None, None
+        if len(key) > self.MAX_IDEMPOTENCY_KEY:
+            return None, None, self.send_error(400, f"idempotency key too long (max {self.MAX_IDEMPOTENCY_KEY})")
+
+        # Keys are scoped to the thread, so clients of different threads can't collide
+        scoped = hashlib.sha256(f"{data['thread_id']}\0{key}".encode('utf-8')).hexdigest()
+        fingerprint = IdempotencyStore.fingerprint({
+            'message': data['message'],
+            'delta': self.is_delta_response(data),
+            'async': self.is_async_request(),
+        })
+        return scoped, fingerprint, None
+
+    def idempotency_key(self):
+        return request.headers.get(self.config_loader.config.idempotency.header)
+
+    def idempotent(self, data, execute):
+        """Respond with execute()'s outcome, run at most once per idempotency key"""
+        key, fingerprint, error = self.idempotency_request(data)
+        if error:
+            return error
+        if key is None:
+            return self.respond(execute())
+
+        try:
+            outcome, replayed = self.idempotency.run(key, fingerprint, execute)
+        except IdempotencyConflictError as e:
+            return self.send_error(422, str(e))
+        except IdempotencyInProgressError as e:
+            return self.send_error(409, str(e))
+        if replayed:
+            logging.info(f"replayed idempotent request: thread {data['thread_id']}")
+        return self.respond(outcome, replayed)
+
+    def get_wait(self, args):
+        wait = args.get('wait', 0)
+        try:
+            wait = float(wait)
+        except (TypeError, ValueError):
+            return None, self.send_error(400, f"Invalid wait: {wait}")
+        return max(0.0, wait), None
+
+    def job(self, job_id):
+        wait, error = self.get_wait(request.args)
+        if error:
+            return error
+
+        job = self.jobs.wait(job_id, wait) if wait else self.jobs.get(job_id)
+        if job is None:
+            return self.send_error(404, f"job {job_id} not found")
+        return self.send(200, job.to_dict())
+
+    def health(self):
+        """Readiness: the agent is built and its checkpoint store answers"""
+        if self.agent is None:
+            return self.send(503, {'status': 'starting'})
+
+        try:
+            CheckpointerFactory.check(self.agent.checkpointer)
+        except Exception as e:
+            logging.warning(f"health check failed: {e}")
+            return self.send(503, {'status': 'unavailable', 'checkpointer': str(e)})
+
+        return self.send(200, {'status': 'ok', 'checkpointer': 'ok'})
+
+    def metrics_view(self):
+        payload, content_type = self.metrics.render()
+        return Response(payload, content_type=content_type)
 
     def message(self):
         data, error = self.get_data()
@@ -67,30 +261,199 @@ class API:
 
         if not message or not thread_id:
             return self.send_error(400, 'message and thread_id are required')
+        if not isinstance(thread_id, str):
+            return self.send_error(400, 'thread_id must be a string')
+
+        error = self.limit_rate(data)
+        if error:
+            return error
+
+        if self.is_async_request():
+            return self.idempotent(data, lambda: self.submit_job(data))
+
+        return self.idempotent(data, lambda: self.run_message(data))
+
+    def run_message(self, data):
+        """Run the turn; returns (code, body, headers) so the outcome can be replayed to retries"""
+        delta = self.is_delta_response(data)
 
         try:
-            agent_final_state, error = self.agent.handle_message(message, thread_id)
+            agent_final_state, error = self.agent.handle_message(data['message'], data['thread_id'], delta=delta)
             if error:
                 logging.error(f"internal error: {error}")
-                return self.send_error(500, f"internal error: {error}")
+                return 500, {'error': f"internal error: {error}"}, {}
 
-            # Convert messages to serializable format
-            messages = agent_final_state.get("messages", []) if agent_final_state else []
-            serializable_state = {
-                "messages": [
-                    {
-                        "type": msg.__class__.__name__,
-                        "content": msg.content,
-                        "id": getattr(msg, 'id', None),
-                        "name": getattr(msg, 'name', None)
-                    }
-                    for msg in messages
-                ]
-            }
+            serializable_state = self.serialize_state(agent_final_state)
 
             request_id = data.get('request_id', 'unknown')
             logging.debug(f"request processed: id {request_id}")
-            return jsonify(serializable_state)
+            return 200, serializable_state, {}
+        except OverloadedError as e:
+            return self.overloaded(e)
+        except ThreadBusyError as e:
+            logging.warning(f"request rejected: {e}")
+            return 409, {'error': str(e)}, {}
+        except ModelTimeoutError as e:
+            logging.warning(f"request timed out: {e}")
+            return 504, {'error': str(e)}, {}
+        except Exception as e:
+            logging.error(f"internal error: {e}")
+            return 500, {'error': f"internal error: {e}"}, {}
+
+    def messages_batch(self):
+        data, error = self.get_data()
+        if error:
+            return error
+
+        items, error = self.get_batch_items(data)
+        if error:
+            return error
+
+        error = self.limit_rate(data, cost=len(items)) or self.check_admission()
+        if error:
+            return error
+
+        try:
+            max_concurrency = self.config_loader.config.api.batch['max_concurrency']
+            results, error = self.agent.handle_batch(items, max_concurrency=max_concurrency)
+            if error:
+                logging.error(f"internal error: {error}")
+                return self.send_error(500, f"internal error: {error}")
+
+            request_id = data.get('request_id', 'unknown')
+            logging.debug(f"batch processed: id {request_id}, items {len(items)}")
+            return self.send(200, self.serialize_batch(items, results))
+        except OverloadedError as e:
+            return self.send_overloaded(e)
+        except Exception as e:
+            logging.error(f"internal error: {e}")
+            return self.send_error(500, f"internal error: {e}")
+
+    def get_batch_items(self, data):
+        items = data.get('items') if data else None
+        if not isinstance(items, list) or not items:
+            return None, self.send_error(400, 'items must be a non-empty list')
+
+        max_items = self.config_loader.config.api.batch['max_items']
+        if len(items) > max_items:
+            return None, self.send_error(413, f'batch too large: {len(items)} items (max {max_items})')
+
+        return items, None
+
+    def serialize_batch(self, items, results):
+        serialized = []
+        for item, result in zip(items, results):
+            entry = {"thread_id": item.get('thread_id') if isinstance(item, dict) else None}
+            if "error" in result:
+                entry["error"] = result["error"]
+            else:
+                entry["messages"] = [self.serialize_message(msg) for msg in result["messages"]]
+            serialized.append(entry)
+        return {"results": serialized}
+
+    def is_delta_response(self, data):
+        response_mode = data.get('response_mode', self.config_loader.config.api.response_mode)
+        return response_mode == 'delta'
+
+    def thread_messages(self, thread_id):
+        limit, error = self.get_page_limit(request.args)
+        if error:
+            return error
+
+        cursor = request.args.get('cursor') or None
+
+        try:
+            page, error = self.agent.get_messages(thread_id, cursor=cursor, limit=limit)
+            if error:
+                return self.send_error(400, str(error))
+
+            return self.send(200, self.serialize_page(page))
         except Exception as e:
             logging.error(f"internal error: {e}")
             return self.send_error(500, f"internal error: {e}")
+
+    def get_page_limit(self, args):
+        pagination = self.config_loader.config.api.pagination
+        limit = args.get('limit', pagination['default_limit'])
+
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            return None, self.send_error(400, f"Invalid limit: {limit}")
+
+        if limit < 1:
+            return None, self.send_error(400, "limit must be positive")
+
+        return min(limit, pagination['max_limit']), None
+
+    def serialize_page(self, page):
+        return {
+            "messages": [self.serialize_message(msg) for msg in page["messages"]],
+            "next_cursor": page["next_cursor"],
+        }
+
+    def message_stream(self):
+        data, error = self.get_data()
+        if error:
+            return error
+
+        if data is None:
+            return self.send_error(400, "No data provided")
+
+        message = data.get('message')
+        thread_id = data.get('thread_id')
+
+        if not message or not thread_id:
+            return self.send_error(400, 'message and thread_id are required')
+        if not isinstance(thread_id, str):
+            return self.send_error(400, 'thread_id must be a string')
+
+        error = self.limit_rate(data) or self.check_admission()
+        if error:
+            return error
+
+        request_id = data.get('request_id', 'unknown')
+
+        def generate():
+            try:
+                for event, payload in self.agent.stream_message(message, thread_id):
+                    yield self.format_event(event, payload, thread_id)
+                logging.debug(f"stream processed: id {request_id}")
+            except Exception as e:
+                logging.error(f"internal error: {e}")
+                yield self.format_sse("error", {"error": f"internal error: {e}"})
+
+        return Response(
+            stream_with_context(generate()),
+            mimetype='text/event-stream',
+            headers=self.SSE_HEADERS,
+        )
+
+    def format_event(self, event, payload, thread_id):
+        if event == "token":
+            return self.format_sse("token", {"content": payload})
+
+        messages = payload.get("messages", [])
+        return self.format_sse(event, {
+            "thread_id": thread_id,
+            "message_ids": [getattr(msg, 'id', None) for msg in messages],
+            "messages": [self.serialize_message(msg) for msg in messages],
+        })
+
+    def format_sse(self, event, data):
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+    def serialize_state(self, state):
+        # Convert messages to serializable format
+        messages = state.get("messages", []) if state else []
+        return {
+            "messages": [self.serialize_message(msg) for msg in messages]
+        }
+
+    def serialize_message(self, msg):
+        return {
+            "type": msg.__class__.__name__,
+            "content": msg.content,
+            "id": getattr(msg, 'id', None),
+            "name": getattr(msg, 'name', None)
+        }
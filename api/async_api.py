@@ -0,0 +1,241 @@
+import logging
+
+from quart import Response, request, jsonify
+from api.api import API
+from service.concurrency import ThreadBusyError, OverloadedError
+from service.agent.resilience import ModelTimeoutError
+from service.checkpointer import CheckpointerFactory
+from service.idempotency import IdempotencyConflictError, IdempotencyInProgressError
+from service.log import bind_request, bind_thread, current_request_id, summarize_payload
+
+
+class AsyncAPI(API):
+    """API served by Quart (ASGI): views await the agent instead of blocking a worker thread"""
+
+    async def bind_log_context(self):
+        # A coroutine, so Quart runs it in the request's task rather than a worker thread
+        view_args = request.view_args or {}
+        bind_request(thread_id=view_args.get('thread_id'))
+
+    async def get_data(self):
+        request_id = current_request_id() or bind_request()
+
+        try:
+            data = await request.get_json(force=True)
+        except Exception as e:
+            logging.error(f"JSON parsing error: {e}")
+            return None, self.send_error(400, f"Invalid JSON: {str(e)}")
+
+        if data is None:
+            return None, self.send_error(400, "No JSON data provided")
+
+        if isinstance(data, dict):
+            bind_thread(data.get('thread_id'))
+        if logging.getLogger().isEnabledFor(logging.INFO):
+            logging.info(f"got request: id: {request_id}, data: {summarize_payload(data)}")
+        data['request_id'] = request_id
+
+        return data, None
+
+    def send(self, code, msg):
+        return jsonify(msg), code
+
+    def client_id(self, header):
+        return request.headers.get(header) or request.remote_addr
+
+    def idempotency_key(self):
+        return request.headers.get(self.config_loader.config.idempotency.header)
+
+    def start_jobs(self):
+        if self.jobs is not None:
+            self.jobs.astart(self.run_job)
+
+    async def run_job(self, job):
+        bind_request(job.id, job.thread_id)
+        state, error = await self.agent.ahandle_message(job.payload['message'], job.thread_id,
+                                                        delta=job.payload['delta'])
+        if error:
+            raise error
+        return self.serialize_state(state)
+
+    def is_async_request(self):
+        return request.args.get('async', '').lower() in ('1', 'true', 'yes')
+
+    async def job(self, job_id):
+        wait, error = self.get_wait(request.args)
+        if error:
+            return error
+
+        job = await self.jobs.await_job(job_id, wait) if wait else self.jobs.get(job_id)
+        if job is None:
+            return self.send_error(404, f"job {job_id} not found")
+        return self.send(200, job.to_dict())
+
+    async def health(self):
+        if self.agent is None:
+            return self.send(503, {'status': 'starting'})
+
+        try:
+            await CheckpointerFactory.acheck(self.agent.checkpointer)
+        except Exception as e:
+            logging.warning(f"health check failed: {e}")
+            return self.send(503, {'status': 'unavailable', 'checkpointer': str(e)})
+
+        return self.send(200, {'status': 'ok', 'checkpointer': 'ok'})
+
+    async def metrics_view(self):
+        payload, content_type = self.metrics.render()
+        return Response(payload, content_type=content_type)
+
+    async def message(self):
+        data, error = await self.get_data()
+        if error:
+            return error
+
+        if data is None:
+            return self.send_error(400, "No data provided")
+
+        message = data.get('message')
+        thread_id = data.get('thread_id')
+
+        if not message or not thread_id:
+            return self.send_error(400, 'message and thread_id are required')
+        if not isinstance(thread_id, str):
+            return self.send_error(400, 'thread_id must be a string')
+
+        error = self.limit_rate(data)
+        if error:
+            return error
+
+        if self.is_async_request():
+            async def submit():
+                return self.submit_job(data)
+            return await self.idempotent(data, submit)
+
+        return await self.idempotent(data, lambda: self.run_message(data))
+
+    async def idempotent(self, data, execute):
+        key, fingerprint, error = self.idempotency_request(data)
+        if error:
+            return error
+        if key is None:
+            return self.respond(await execute())
+
+        try:
+            outcome, replayed = await self.idempotency.arun(key, fingerprint, execute)
+        except IdempotencyConflictError as e:
+            return self.send_error(422, str(e))
+        except IdempotencyInProgressError as e:
+            return self.send_error(409, str(e))
+        if replayed:
+            logging.info(f"replayed idempotent request: thread {data['thread_id']}")
+        return self.respond(outcome, replayed)
+
+    async def run_message(self, data):
+        delta = self.is_delta_response(data)
+
+        try:
+            agent_final_state, error = await self.agent.ahandle_message(data['message'], data['thread_id'], delta=delta)
+            if error:
+                logging.error(f"internal error: {error}")
+                return 500, {'error': f"internal error: {error}"}, {}
+
+            serializable_state = self.serialize_state(agent_final_state)
+
+            request_id = data.get('request_id', 'unknown')
+            logging.debug(f"request processed: id {request_id}")
+            return 200, serializable_state, {}
+        except OverloadedError as e:
+            return self.overloaded(e)
+        except ThreadBusyError as e:
+            logging.warning(f"request rejected: {e}")
+            return 409, {'error': str(e)}, {}
+        except ModelTimeoutError as e:
+            logging.warning(f"request timed out: {e}")
+            return 504, {'error': str(e)}, {}
+        except Exception as e:
+            logging.error(f"internal error: {e}")
+            return 500, {'error': f"internal error: {e}"}, {}
+
+    async def messages_batch(self):
+        data, error = await self.get_data()
+        if error:
+            return error
+
+        items, error = self.get_batch_items(data)
+        if error:
+            return error
+
+        error = self.limit_rate(data, cost=len(items)) or self.check_admission()
+        if error:
+            return error
+
+        try:
+            max_concurrency = self.config_loader.config.api.batch['max_concurrency']
+            results, error = await self.agent.ahandle_batch(items, max_concurrency=max_concurrency)
+            if error:
+                logging.error(f"internal error: {error}")
+                return self.send_error(500, f"internal error: {error}")
+
+            request_id = data.get('request_id', 'unknown')
+            logging.debug(f"batch processed: id {request_id}, items {len(items)}")
+            return self.send(200, self.serialize_batch(items, results))
+        except OverloadedError as e:
+            return self.send_overloaded(e)
+        except Exception as e:
+            logging.error(f"internal error: {e}")
+            return self.send_error(500, f"internal error: {e}")
+
+    async def thread_messages(self, thread_id):
+        limit, error = self.get_page_limit(request.args)
+        if error:
+            return error
+
+        cursor = request.args.get('cursor') or None
+
+        try:
+            page, error = await self.agent.aget_messages(thread_id, cursor=cursor, limit=limit)
+            if error:
+                return self.send_error(400, str(error))
+
+            return self.send(200, self.serialize_page(page))
+        except Exception as e:
+            logging.error(f"internal error: {e}")
+            return self.send_error(500, f"internal error: {e}")
+
+    async def message_stream(self):
+        data, error = await self.get_data()
+        if error:
+            return error
+
+        if data is None:
+            return self.send_error(400, "No data provided")
+
+        message = data.get('message')
+        thread_id = data.get('thread_id')
+
+        if not message or not thread_id:
+            return self.send_error(400, 'message and thread_id are required')
+        if not isinstance(thread_id, str):
+            return self.send_error(400, 'thread_id must be a string')
+
+        error = self.limit_rate(data) or self.check_admission()
+        if error:
+            return error
+
+        request_id = data.get('request_id', 'unknown')
+
+        async def generate():
+            try:
+                async for event, payload in self.agent.astream_message(message, thread_id):
+                    yield self.format_event(event, payload, thread_id)
+                logging.debug(f"stream processed: id {request_id}")
+            except Exception as e:
+                logging.error(f"internal error: {e}")
+                yield self.format_sse("error", {"error": f"internal error: {e}"})
+
+        return Response(
+            generate(),
+            mimetype='text/event-stream',
+            headers=self.SSE_HEADERS,
+        )
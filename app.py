@@ -5,29 +5,20 @@ from flask import Flask
 from api.api import API
 from service.config import ConfigLoader
 from service.checkpointer import CheckpointerFactory
+from service.checkpointer.retention import RetentionWorker
 from service.agent.agent import chat_agent
+from service.cache import ResponseCache
+from service.concurrency import ThreadLockManager, AdmissionController
+from service.metrics import get_metrics
+from service.idempotency import IdempotencyStore
+from service.tools import ToolRegistry
+from service.log import configure_logging
 from langchain_google_genai import ChatGoogleGenerativeAI
 
 
 def setup_logging(config):
     """Setup logging based on configuration"""
-    if logging.getLogger().handlers:
-        return  # Already configured
-
-    level = getattr(logging, config.logging.level.upper())
-    format_str = config.logging.format
-
-    if config.logging.file:
-        logging.basicConfig(
-            level=level,
-            format=format_str,
-            filename=config.logging.file
-        )
-    else:
-        logging.basicConfig(
-            level=level,
-            format=format_str
-        )
+    configure_logging(config.logging)
 
 
 def handle_exception(exc_type, exc_value, exc_traceback):
@@ -38,10 +29,23 @@ def handle_exception(exc_type, exc_value, exc_traceback):
     logging.error(f"Unhandled exception: {exc_type.__name__}: {exc_value}")
 
 
-def create_app():
-    """Application factory"""
+def create_model(config):
+    """Create the chat model client"""
+    return ChatGoogleGenerativeAI(
+        model=config.model.name,
+        **config.model.parameters
+    )
+
+
+def create_app(config_loader=None, model=None):
+    """Application factory.
+
+    A config loader and a chat model can be injected, e.g. by the
+    benchmarks, which run the real app against an offline fake model.
+    """
     # Load configuration
-    config_loader = ConfigLoader()
+    if config_loader is None:
+        config_loader = ConfigLoader()
     config = config_loader.load()
 
     # Setup logging
@@ -50,6 +54,12 @@ def create_app():
     # Setup exception handling
     sys.excepthook = handle_exception
 
+    if model is None:
+        model = create_model(config)
+
+    if config.app.mode == "async":
+        return create_async_app(config_loader, config, model)
+
     # Create Flask app
     app = Flask(config.app.name)
 
@@ -57,27 +67,117 @@ def create_app():
     checkpointer = CheckpointerFactory.create(config)
     checkpointer_type = CheckpointerFactory.get_checkpointer_type(config)
     logging.info(f"Initialized with {checkpointer_type}")
+    CheckpointerFactory.publish_stats(checkpointer, get_metrics(config))
+
+    # Pool statistics are exported per shard on /metrics (checkpoint_pool_stats)
+    pool_stats = CheckpointerFactory.get_pool_stats(checkpointer)
+    if pool_stats:
+        logging.info(f"Checkpoint pool stats: {pool_stats}")
+
+    # Create response cache (shares the checkpointer's connection pool)
+    response_cache = ResponseCache.from_config(config, CheckpointerFactory.get_connection_pool(checkpointer),
+                                               get_metrics(config))
+    if response_cache:
+        response_cache.setup()
+
+    # Create per-thread ordering locks (Postgres locks get a pool of their own)
+    thread_locks = ThreadLockManager.from_config(config, CheckpointerFactory.get_connection_pool(checkpointer))
 
     # Create agent
     agent = chat_agent(
-        ChatGoogleGenerativeAI(
-            model=config.model.name,
-            **config.model.parameters
-        ),
-        config.tools.enabled,
+        model,
+        ToolRegistry.from_config(config),
         checkpointer,
+        config,
+        response_cache,
+        thread_locks,
+        get_metrics(config),
+        AdmissionController.from_config(config, get_metrics(config)),
     )
 
+    # Start background checkpoint pruning
+    RetentionWorker.start_from_config(config)
+
+    # Create idempotency key store (shares the checkpointer's connection pool)
+    idempotency = IdempotencyStore.from_config(config, CheckpointerFactory.get_connection_pool(checkpointer),
+                                               get_metrics(config))
+    if idempotency:
+        idempotency.setup()
+
     # Create API
-    api = API(app, agent, config_loader)
+    api = API(app, agent, config_loader, idempotency)
+    app.extensions['api'] = api
+    api.start_jobs()
 
     logging.info(f"Application '{config.app.name}' v{config.app.version} initialized")
     return app, config
 
 
-# Create the application
-app, config = create_app()
+def create_async_app(config_loader, config, model):
+    """Application factory for the async (ASGI) serving mode"""
+    from quart import Quart
+    from api.async_api import AsyncAPI
+
+    # Create Quart app
+    app = Quart(config.app.name)
+
+    # The agent is created once the event loop is running, because the
+    # async checkpointer's connection pool is bound to that loop
+    api = AsyncAPI(app, None, config_loader)
+    app.extensions['api'] = api
+
+    @app.before_serving
+    async def startup():
+        checkpointer = await CheckpointerFactory.acreate(config)
+        logging.info(f"Initialized with {checkpointer.__class__.__name__} (async)")
+        CheckpointerFactory.publish_stats(checkpointer, get_metrics(config))
+
+        # Pool statistics are exported per shard on /metrics (checkpoint_pool_stats)
+        pool_stats = CheckpointerFactory.get_pool_stats(checkpointer)
+        if pool_stats:
+            logging.info(f"Checkpoint pool stats: {pool_stats}")
+
+        response_cache = ResponseCache.from_config(config, CheckpointerFactory.get_connection_pool(checkpointer),
+                                                   get_metrics(config))
+        if response_cache:
+            await response_cache.asetup()
+
+        thread_locks = await ThreadLockManager.afrom_config(config,
+                                                            CheckpointerFactory.get_connection_pool(checkpointer))
+
+        api.agent = chat_agent(
+            model,
+            ToolRegistry.from_config(config),
+            checkpointer,
+            config,
+            response_cache,
+            thread_locks,
+            get_metrics(config),
+            AdmissionController.from_config(config, get_metrics(config)),
+        )
+
+        api.idempotency = IdempotencyStore.from_config(config, CheckpointerFactory.get_connection_pool(checkpointer),
+                                                       get_metrics(config))
+        if api.idempotency:
+            await api.idempotency.asetup()
+
+        RetentionWorker.start_from_config(config)
+        api.start_jobs()
+
+    @app.after_serving
+    async def shutdown():
+        if api.jobs is not None:
+            api.jobs.stop()
+        if api.agent is not None:
+            if api.agent.thread_locks is not None:
+                await api.agent.thread_locks.aclose()
+            await CheckpointerFactory.aclose(api.agent.checkpointer)
+
+    logging.info(f"Application '{config.app.name}' v{config.app.version} initialized (async mode)")
+    return app, config
+
 
 if __name__ == '__main__':
+    app, config = create_app()
     logging.info(f"Server is running on http://localhost:{config.app.port}")
     app.run(host='0.0.0.0', port=config.app.port, debug=config.app.debug, use_reloader=False)
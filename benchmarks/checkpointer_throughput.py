@@ -0,0 +1,144 @@
+"""Compare checkpointer throughput across the memory, sqlite and postgres backends.
+
+Each backend runs the same workload: a graph with a stub model node, driven
+by concurrent conversations of several turns each. Postgres is included when
+the connection configured in config.yaml (or POSTGRES_CONNECTION_STRING) is
+reachable.
+
+    python -m benchmarks.checkpointer_throughput --threads 50 --turns 10 --concurrency 8
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END, START, MessagesState, StateGraph
+from service.checkpointer import CheckpointerFactory
+from service.config import ConfigLoader
+
+
+def build_graph(checkpointer, reply_size: int):
+    reply = "x" * reply_size
+
+    def agent(state: MessagesState):
+        return {"messages": [AIMessage(content=reply)]}
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("agent", agent)
+    graph.add_edge(START, "agent")
+    graph.add_edge("agent", END)
+    return graph.compile(checkpointer=checkpointer)
+
+
+def run_conversation(graph, thread_id: str, turns: int, message: str):
+    config = {"configurable": {"thread_id": thread_id}}
+    latencies = []
+    for _ in range(turns):
+        started = time.perf_counter()
+        graph.invoke({"messages": [HumanMessage(content=message)]}, config)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def run_reads(graph, thread_ids):
+    latencies = []
+    for thread_id in thread_ids:
+        started = time.perf_counter()
+        graph.get_state({"configurable": {"thread_id": thread_id}})
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def percentile(values, q: float) -> float:
+    return statistics.quantiles(values, n=100)[int(q) - 1] if len(values) > 1 else values[0]
+
+
+def bench(name: str, checkpointer, args):
+    graph = build_graph(checkpointer, args.message_size)
+    thread_ids = [f"bench-{name}-{time.time_ns()}-{i}" for i in range(args.threads)]
+    message = "y" * args.message_size
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = executor.map(lambda thread_id: run_conversation(graph, thread_id, args.turns, message), thread_ids)
+        turn_latencies = [latency for latencies in results for latency in latencies]
+    write_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        chunks = [thread_ids[i::args.concurrency] for i in range(args.concurrency)]
+        read_latencies = [latency for latencies in executor.map(lambda chunk: run_reads(graph, chunk), chunks)
+                          for latency in latencies]
+    read_seconds = time.perf_counter() - started
+
+    for thread_id in thread_ids:
+        checkpointer.delete_thread(thread_id)
+
+    return {
+        "backend": name,
+        "turns/s": len(turn_latencies) / write_seconds,
+        "turn p50 ms": percentile(turn_latencies, 50) * 1000,
+        "turn p95 ms": percentile(turn_latencies, 95) * 1000,
+        "reads/s": len(read_latencies) / read_seconds,
+        "read p95 ms": percentile(read_latencies, 95) * 1000,
+    }
+
+
+def print_table(rows):
+    columns = list(rows[0].keys())
+    widths = [max(len(column), 10) for column in columns]
+    print("  ".join(column.rjust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        cells = [row[column] if isinstance(row[column], str) else f"{row[column]:.1f}" for column in columns]
+        print("  ".join(cell.rjust(width) for cell, width in zip(cells, widths)))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare checkpointer backends")
+    parser.add_argument("--config", default="config/config.yaml", help="path to config.yaml")
+    parser.add_argument("--backends", default="memory,sqlite,postgres", help="comma separated backends to run")
+    parser.add_argument("--threads", type=int, default=50, help="conversations per backend")
+    parser.add_argument("--turns", type=int, default=10, help="turns per conversation")
+    parser.add_argument("--concurrency", type=int, default=8, help="conversations run in parallel")
+    parser.add_argument("--message-size", type=int, default=200, help="characters per message")
+    args = parser.parse_args(argv)
+
+    config = ConfigLoader(args.config).load()
+    config.checkpoint.cache.enabled = False
+    scratch = tempfile.mkdtemp(prefix="checkpointer-bench-")
+    config.checkpoint.sqlite.path = os.path.join(scratch, "checkpoints.sqlite")
+
+    rows = []
+    try:
+        for backend in args.backends.split(","):
+            if backend == "postgres" and not ConfigLoader.build_postgres_connection_string(config.checkpoint.postgres):
+                print("skipping postgres: no connection configured")
+                continue
+
+            config.checkpoint.type = backend
+            checkpointer = CheckpointerFactory.create(config)
+            if backend == "postgres" and CheckpointerFactory.get_connection_pool(checkpointer) is None:
+                print("skipping postgres: database not reachable")
+                continue
+
+            try:
+                rows.append(bench(backend, checkpointer, args))
+            finally:
+                CheckpointerFactory.close(checkpointer)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    print(f"{args.threads} conversations x {args.turns} turns, concurrency {args.concurrency}")
+    print_table(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
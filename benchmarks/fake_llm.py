@@ -0,0 +1,79 @@
+"""Deterministic offline chat model for benchmarks.
+
+Replies are built from a fixed vocabulary, seeded by the prompt, so the same
+conversation always produces the same tokens. Latency is simulated as a fixed
+time to first token plus a per-token generation time.
+"""
+import time
+import asyncio
+from typing import Any, AsyncIterator, Iterator, List, Optional
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.messages.utils import count_tokens_approximately
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+WORDS = (
+    "the agent keeps a running conversation with every user and stores each turn "
+    "so that later requests continue where the previous one stopped"
+).split()
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model with configurable latency and output length that never leaves the process"""
+
+    first_token_ms: float = 200.0
+    ms_per_token: float = 5.0
+    output_tokens: int = 64
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-offline"
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        seed = sum(len(str(message.content)) for message in messages)
+        return [WORDS[(seed + i) % len(WORDS)] for i in range(self.output_tokens)]
+
+    def _message(self, messages: List[BaseMessage], tokens: List[str]) -> AIMessage:
+        input_tokens = count_tokens_approximately(messages)
+        return AIMessage(
+            content=" ".join(tokens),
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": len(tokens),
+                "total_tokens": input_tokens + len(tokens),
+            },
+        )
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager=None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        time.sleep((self.first_token_ms + self.ms_per_token * len(tokens)) / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, tokens))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager=None, **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        await asyncio.sleep((self.first_token_ms + self.ms_per_token * len(tokens)) / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages, tokens))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.first_token_ms / 1000)
+        for index, token in enumerate(self._tokens(messages)):
+            if index:
+                time.sleep(self.ms_per_token / 1000)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token + " "))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.first_token_ms / 1000)
+        for index, token in enumerate(self._tokens(messages)):
+            if index:
+                await asyncio.sleep(self.ms_per_token / 1000)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=token + " "))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
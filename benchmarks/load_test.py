@@ -0,0 +1,297 @@
+"""Load test of the HTTP app against an offline fake model.
+
+Builds the real application with create_app(), swapping Gemini for a
+deterministic FakeChatModel, and sweeps checkpointer backend, concurrency and
+thread history length. Each cell posts `--requests` turns to /message through
+the framework's test client and reports RPS and latency percentiles. Results
+are written as JSON; pass a previous result file as `--baseline` to compare.
+
+    python -m benchmarks.load_test --backends memory,postgres --concurrency 1,8,32 --history 0,50
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import subprocess
+from datetime import datetime, timezone
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from benchmarks.fake_llm import FakeChatModel
+from service.checkpointer import CheckpointerFactory
+from service.config import ConfigLoader
+
+# Metrics compared against the baseline, and whether higher is better
+COMPARED = {"rps": True, "p50_ms": False, "p95_ms": False, "p99_ms": False}
+
+
+def percentile(sorted_values, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(cell, latencies, errors, seconds):
+    latencies = sorted(latencies)
+    return {
+        **cell,
+        "errors": errors,
+        "rps": round(len(latencies) / seconds, 2) if seconds else 0.0,
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2) if latencies else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def split_requests(total: int, workers: int):
+    return [total // workers + (1 if i < total % workers else 0) for i in range(workers)]
+
+
+@contextmanager
+def instant(model: FakeChatModel):
+    """Temporarily remove the fake model's latency, so seeding history is fast"""
+    saved = model.first_token_ms, model.ms_per_token
+    model.first_token_ms = model.ms_per_token = 0
+    try:
+        yield
+    finally:
+        model.first_token_ms, model.ms_per_token = saved
+
+
+def run_sync_cell(app, model, cell, thread_ids):
+    """Drive a Flask app with one test client per worker thread"""
+    def seed(thread_id):
+        client = app.test_client()
+        for turn in range(cell["history"]):
+            client.post("/message", json={"message": f"history turn {turn}", "thread_id": thread_id})
+
+    def work(args):
+        thread_id, count = args
+        client = app.test_client()
+        latencies, errors = [], 0
+        for turn in range(count):
+            started = time.perf_counter()
+            response = client.post("/message", json={"message": f"load turn {turn}", "thread_id": thread_id})
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+        return latencies, errors
+
+    with ThreadPoolExecutor(max_workers=cell["concurrency"]) as executor:
+        with instant(model):
+            list(executor.map(seed, thread_ids))
+
+        started = time.perf_counter()
+        results = list(executor.map(work, zip(thread_ids, split_requests(cell["requests"], len(thread_ids)))))
+        seconds = time.perf_counter() - started
+
+    latencies = [latency for worker_latencies, _ in results for latency in worker_latencies]
+    return summarize(cell, latencies, sum(errors for _, errors in results), seconds)
+
+
+async def run_async_cell(client, model, cell, thread_ids):
+    """Drive a Quart app with one coroutine per worker"""
+    async def seed(thread_id):
+        for turn in range(cell["history"]):
+            await client.post("/message", json={"message": f"history turn {turn}", "thread_id": thread_id})
+
+    async def work(thread_id, count):
+        latencies, errors = [], 0
+        for turn in range(count):
+            started = time.perf_counter()
+            response = await client.post("/message", json={"message": f"load turn {turn}", "thread_id": thread_id})
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors += 1
+        return latencies, errors
+
+    with instant(model):
+        await asyncio.gather(*(seed(thread_id) for thread_id in thread_ids))
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(
+        work(thread_id, count)
+        for thread_id, count in zip(thread_ids, split_requests(cell["requests"], len(thread_ids)))
+    ))
+    seconds = time.perf_counter() - started
+
+    latencies = [latency for worker_latencies, _ in results for latency in worker_latencies]
+    return summarize(cell, latencies, sum(errors for _, errors in results), seconds)
+
+
+def run_cell(config_loader, model, cell):
+    config = config_loader.config
+    config.checkpoint.type = cell["backend"]
+    prefix = f"bench-{cell['backend']}-c{cell['concurrency']}-h{cell['history']}-{time.time_ns()}"
+    thread_ids = [f"{prefix}-{worker}" for worker in range(cell["concurrency"])]
+
+    app, _ = create_app(config_loader, model)
+    api = app.extensions["api"]
+
+    if config.app.mode == "async":
+        async def run():
+            async with app.test_app() as test_app:
+                if not backend_ready(api, cell):
+                    return None
+                result = await run_async_cell(test_app.test_client(), model, cell, thread_ids)
+                for thread_id in thread_ids:
+                    await api.agent.checkpointer.adelete_thread(thread_id)
+                return result
+        return asyncio.run(run())
+
+    try:
+        if not backend_ready(api, cell):
+            return None
+        result = run_sync_cell(app, model, cell, thread_ids)
+        for thread_id in thread_ids:
+            api.agent.checkpointer.delete_thread(thread_id)
+        return result
+    finally:
+        CheckpointerFactory.close(api.agent.checkpointer)
+
+
+def backend_ready(api, cell) -> bool:
+    # The factory falls back to MemorySaver when Postgres can't be reached
+    if cell["backend"] == "postgres" and CheckpointerFactory.get_connection_pool(api.agent.checkpointer) is None:
+        print(f"skipping {cell}: postgres not reachable")
+        return False
+    return True
+
+
+def compare(results, baseline, tolerance: float):
+    """Print changes against a baseline run; returns the number of regressions beyond tolerance"""
+    def key(row):
+        return row["backend"], row["mode"], row["concurrency"], row["history"]
+
+    previous = {key(row): row for row in baseline["results"]}
+    regressions = 0
+    print(f"\ncompared with baseline from {baseline['meta'].get('timestamp')} ({baseline['meta'].get('git_rev')})")
+    for row in results:
+        old = previous.get(key(row))
+        if old is None:
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED.items():
+            if not old[metric]:
+                continue
+            change = (row[metric] - old[metric]) / old[metric]
+            regressed = -change > tolerance if higher_is_better else change > tolerance
+            regressions += regressed
+            changes.append(f"{metric} {change:+.1%}{' REGRESSION' if regressed else ''}")
+        print(f"  {key(row)}: " + ", ".join(changes))
+    return regressions
+
+
+def print_table(results):
+    columns = ["backend", "mode", "concurrency", "history", "requests", "errors",
+               "rps", "p50_ms", "p95_ms", "p99_ms"]
+    print("  ".join(column.rjust(11) for column in columns))
+    for row in results:
+        print("  ".join(str(row[column]).rjust(11) for column in columns))
+
+
+def git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def int_list(value: str):
+    return [int(item) for item in value.split(",") if item]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the app against an offline fake model")
+    parser.add_argument("--config", default="config/config.yaml", help="path to config.yaml")
+    parser.add_argument("--mode", choices=["sync", "async"], help="override app.mode")
+    parser.add_argument("--backends", default="memory,postgres", help="comma separated checkpoint types")
+    parser.add_argument("--concurrency", type=int_list, default=[1, 8, 32], help="comma separated client counts")
+    parser.add_argument("--history", type=int_list, default=[0, 50], help="comma separated turns per thread before measuring")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per cell")
+    parser.add_argument("--first-token-ms", type=float, default=200.0, help="fake model time to first token")
+    parser.add_argument("--ms-per-token", type=float, default=5.0, help="fake model time per output token")
+    parser.add_argument("--output-tokens", type=int, default=64, help="fake model tokens per reply")
+    parser.add_argument("--output", default="bench_results.json", help="where to write the JSON results")
+    parser.add_argument("--baseline", help="previous results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative change counted as a regression")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    config_loader = ConfigLoader(args.config)
+    config = config_loader.load()
+    os.environ.setdefault(config.model.api_key_env, "offline-benchmark")
+    if args.mode:
+        config.app.mode = args.mode
+    # Measure the request path itself: no response cache hits, no background pruning
+    config.cache.enabled = False
+    config.checkpoint.retention.enabled = False
+
+    model = FakeChatModel(
+        first_token_ms=args.first_token_ms,
+        ms_per_token=args.ms_per_token,
+        output_tokens=args.output_tokens,
+    )
+
+    results = []
+    for backend in args.backends.split(","):
+        for history in args.history:
+            for concurrency in args.concurrency:
+                cell = {
+                    "backend": backend,
+                    "mode": config.app.mode,
+                    "concurrency": concurrency,
+                    "history": history,
+                    "requests": args.requests,
+                }
+                result = run_cell(config_loader, model, cell)
+                if result is not None:
+                    results.append(result)
+                    print(f"{backend} c={concurrency} h={history}: {result['rps']} rps, p95 {result['p95_ms']} ms")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "git_rev": git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "model": {
+                "first_token_ms": args.first_token_ms,
+                "ms_per_token": args.ms_per_token,
+                "output_tokens": args.output_tokens,
+            },
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    print()
+    print_table(results)
+    print(f"\nresults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if regressions:
+            print(f"{regressions} metric(s) regressed by more than {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
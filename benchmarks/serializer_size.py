@@ -0,0 +1,124 @@
+"""Compare checkpoint serializers on realistic conversation histories.
+
+For each history length, a conversation of alternating human and AI messages
+is built from a fixed seed, and its `messages` channel value is encoded with
+every serializer. Reported per serializer: encoded size of the final history,
+bytes written over the whole thread (each turn stores the full list again),
+and median encode/decode time.
+
+    python -m benchmarks.serializer_size --history 10,50,200 --repeat 20
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from service.checkpointer.serializer import ZSTD_AVAILABLE, CompactSerializer
+
+VOCABULARY = (
+    "the a to of and in is that for it you with on this be are as can your not or have "
+    "agent thread message state checkpoint model request response user assistant data "
+    "function return value error config database server query cache table index python "
+    "please thanks could would should explain example code step first then next because "
+    "however also which when where what how why if else while using call result list"
+).split()
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    # Zipf-like word choice, as in natural text a few words dominate
+    picked = [VOCABULARY[min(int(rng.paretovariate(1.2)) - 1, len(VOCABULARY) - 1)] for _ in range(words)]
+    return " ".join(picked).capitalize() + "."
+
+
+def conversation(turns: int, seed: int = 7):
+    rng = random.Random(seed)
+    messages = []
+    for turn in range(turns):
+        question = " ".join(sentence(rng, rng.randint(6, 20)) for _ in range(rng.randint(1, 3)))
+        answer = "\n\n".join(
+            " ".join(sentence(rng, rng.randint(8, 25)) for _ in range(rng.randint(2, 5)))
+            for _ in range(rng.randint(1, 4))
+        )
+        messages.append(HumanMessage(content=question, id=f"human-{turn}"))
+        messages.append(AIMessage(
+            content=answer,
+            id=f"run-{seed}-{turn}",
+            response_metadata={"model_name": "gemini-2.0-flash", "finish_reason": "STOP"},
+            usage_metadata={"input_tokens": 40 * turn, "output_tokens": len(answer) // 4,
+                            "total_tokens": 40 * turn + len(answer) // 4},
+        ))
+    return messages
+
+
+def serializers():
+    candidates = {
+        "jsonplus": JsonPlusSerializer(),
+        "compact-zlib-1": CompactSerializer("zlib", level=1),
+        "compact-zlib-6": CompactSerializer("zlib", level=6),
+    }
+    if ZSTD_AVAILABLE:
+        candidates["compact-zstd-3"] = CompactSerializer("zstd", level=3)
+        candidates["compact-zstd-9"] = CompactSerializer("zstd", level=9)
+    return candidates
+
+
+def median_seconds(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def bench(name, serde, messages, repeat: int):
+    typed = serde.dumps_typed(messages)
+    assert serde.loads_typed(typed) == messages, f"{name} did not round-trip"
+
+    # Every turn writes the whole list again as a new channel version
+    written = sum(len(serde.dumps_typed(messages[:end])[1]) for end in range(2, len(messages) + 1, 2))
+
+    return {
+        "serializer": name,
+        "turns": len(messages) // 2,
+        "type": typed[0],
+        "bytes": len(typed[1]),
+        "thread KiB": written / 1024,
+        "encode ms": median_seconds(lambda: serde.dumps_typed(messages), repeat) * 1000,
+        "decode ms": median_seconds(lambda: serde.loads_typed(typed), repeat) * 1000,
+    }
+
+
+def print_table(rows):
+    columns = list(rows[0].keys())
+    widths = [max(len(column), 10) for column in columns]
+    print("  ".join(column.rjust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        cells = [f"{row[column]:.3f}" if isinstance(row[column], float) else str(row[column]) for column in columns]
+        print("  ".join(cell.rjust(width) for cell, width in zip(cells, widths)))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare checkpoint serializers")
+    parser.add_argument("--history", default="10,50,200", help="comma separated conversation lengths in turns")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per measurement")
+    args = parser.parse_args(argv)
+
+    rows = []
+    for turns in [int(item) for item in args.history.split(",") if item]:
+        messages = conversation(turns)
+        for name, serde in serializers().items():
+            rows.append(bench(name, serde, messages, args.repeat))
+
+    print_table(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
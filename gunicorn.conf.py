@@ -0,0 +1,83 @@
+"""gunicorn settings for production: gunicorn -c gunicorn.conf.py
+
+Worker and thread counts come from app.workers / app.threads (or the
+WEB_CONCURRENCY / THREADS environment variables). Sync mode runs gthread
+workers on the Flask app; async mode runs uvicorn workers on the Quart app.
+"""
+import os
+import glob
+import shutil
+import logging
+import tempfile
+from service.config import ConfigLoader
+
+_config = ConfigLoader().load()
+
+bind = f"0.0.0.0:{_config.app.port}"
+workers = _config.app.workers
+timeout = _config.app.worker_timeout
+graceful_timeout = 30
+keepalive = 5
+accesslog = "-"
+
+# Import config and libraries once in the master; see server.py
+preload_app = True
+
+if _config.app.mode == "async":
+    worker_class = "uvicorn_worker.UvicornWorker"
+    wsgi_app = "server:asgi_application"
+else:
+    worker_class = "gthread"
+    threads = _config.app.threads
+    wsgi_app = "server:application"
+
+# Every worker has its own metrics; they are aggregated through files in a
+# shared directory. Must be set before prometheus_client is imported.
+_created_metrics_dir = None
+if _config.metrics.enabled and workers > 1:
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        _created_metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+    for _path in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+        os.remove(_path)
+
+
+def on_starting(server):
+    from service.checkpointer import CheckpointerFactory
+
+    checkpointer_type = CheckpointerFactory.get_checkpointer_type(_config)
+    if workers > 1 and checkpointer_type.startswith("MemorySaver"):
+        logging.warning(f"checkpointer is {checkpointer_type}: each worker keeps its own threads, "
+                        "use postgres or sqlite with several workers")
+    if workers > 1 and _config.concurrency.thread_lock != "postgres":
+        logging.warning(f"concurrency.thread_lock is {_config.concurrency.thread_lock}: "
+                        "turns of one thread are only serialized within a worker")
+    if workers > 1 and _config.jobs.enabled:
+        logging.warning(f"jobs.store is {_config.jobs.store} with {workers} workers: jobs of one thread "
+                        "run in submission order only when they are submitted to the same worker")
+    write_behind = _config.checkpoint.write_behind
+    if workers > 1 and write_behind.enabled and not write_behind.flush_on_release:
+        logging.warning("checkpoint.write_behind.flush_on_release is false: a worker's buffered checkpoints "
+                        "are invisible to the others, so a thread's next turn may fork its conversation")
+
+
+def post_fork(server, worker):
+    from server import init_worker
+    init_worker()
+
+
+def worker_exit(server, worker):
+    # Commits buffered checkpoint writes (checkpoint.write_behind) before the worker exits
+    from server import shutdown_worker
+    shutdown_worker()
+
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    if _created_metrics_dir:
+        shutil.rmtree(_created_metrics_dir, ignore_errors=True)
@@ -0,0 +1,15 @@
+-- Indexes used by checkpoint retention (service/checkpointer/retention.py)
+-- Apply after PostgresSaver has created its tables:
+--   python -m service.checkpointer.retention --migrate
+
+-- Latest checkpoint lookup and "older than the N-th newest" range deletes per thread
+CREATE INDEX CONCURRENTLY IF NOT EXISTS checkpoints_thread_ns_id_desc_idx
+    ON checkpoints (thread_id, checkpoint_ns, checkpoint_id DESC);
+
+-- Finding idle threads by checkpoint timestamp
+CREATE INDEX CONCURRENTLY IF NOT EXISTS checkpoints_thread_ts_idx
+    ON checkpoints (thread_id, (checkpoint->>'ts'));
+
+-- Range deletes of pending writes for pruned checkpoints
+CREATE INDEX CONCURRENTLY IF NOT EXISTS checkpoint_writes_thread_ns_id_idx
+    ON checkpoint_writes (thread_id, checkpoint_ns, checkpoint_id);
@@ -0,0 +1,50 @@
+"""Production entry point, served by gunicorn (see gunicorn.conf.py).
+
+This module is imported once in the gunicorn master (preload_app), so the
+configuration is parsed and the heavy libraries are imported before fork
+and shared by all workers. The application itself - checkpointer connection
+pools, the model client, background threads - is created in each worker
+after fork by init_worker(), so no connection or socket crosses a fork.
+"""
+import app as app_module
+from service.checkpointer import CheckpointerFactory
+from service.config import ConfigLoader
+
+config_loader = ConfigLoader()
+config = config_loader.load()
+
+if config.app.mode == "async":
+    # Imported lazily by create_async_app; load it before fork as well
+    import quart  # noqa: F401
+    import api.async_api  # noqa: F401
+
+_app = None
+
+
+def init_worker():
+    """Build this worker's application; called from gunicorn's post_fork hook"""
+    global _app
+    _app, _ = app_module.create_app(config_loader)
+
+
+def shutdown_worker():
+    """Release this worker's resources; called from gunicorn's worker_exit hook.
+
+    The async app does this itself when the server stops serving.
+    """
+    if _app is None or config.app.mode == "async":
+        return
+    api = _app.extensions['api']
+    if api.jobs is not None:
+        api.jobs.stop()
+    CheckpointerFactory.close(api.agent.checkpointer)
+
+
+def application(environ, start_response):
+    """WSGI entry point (sync mode)"""
+    return _app(environ, start_response)
+
+
+async def asgi_application(scope, receive, send):
+    """ASGI entry point (async mode)"""
+    await _app(scope, receive, send)
@@ -1,11 +1,25 @@
+import uuid
 import logging
+import functools
+from collections import defaultdict
+from contextlib import asynccontextmanager, contextmanager, nullcontext
 
 from dotenv import load_dotenv
 from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
-from langchain_core.messages import HumanMessage
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig, RunnableLambda
+from langchain_core.utils.function_calling import convert_to_openai_tool
 from typing import Annotated
-from typing_extensions import TypedDict
+from typing_extensions import NotRequired, TypedDict
+from service.config import Config, GraphNodeConfig
+from service.agent.context import ContextWindow, merge_token_counts, message_text
+from service.agent.resilience import ResilientCaller
+from service.checkpointer import CheckpointerFactory
+from service.tools import ToolExecutor
+
+# Set in the run config of streamed turns; hedging would emit every token twice
+STREAMING_KEY = "__agent_streaming"
 
 # Load environment variables from .env file
 load_dotenv()
@@ -13,15 +27,40 @@ load_dotenv()
 # Define the state for our graph
 class State(TypedDict):
     messages: Annotated[list, add_messages]
+    summary: NotRequired[str]
+    summarized_through: NotRequired[str]  # id of the last message the summary covers
+    token_counts: NotRequired[Annotated[dict, merge_token_counts]]
 
 class chat_agent:
-    def __init__(self, model, tools, checkpointer):
+    def __init__(self, model, tools, checkpointer, config=None, response_cache=None, thread_locks=None, metrics=None,
+                 admission=None):
         if model is None or tools is None or checkpointer is None:
             raise ValueError("model, tools, and checkpointer can't be None")
 
         self.model = model
         self.tools = tools
         self.checkpointer = checkpointer
+        self.config = config or Config()
+        self.context = ContextWindow(self.config.graph.context)
+        self.response_cache = response_cache
+        self.thread_locks = thread_locks
+        self.metrics = metrics
+        self.admission = admission
+        # Buffered checkpoint writes a turn must commit before another worker may run the thread
+        self.write_behind = None
+        if self.config.checkpoint.write_behind.flush_on_release:
+            self.write_behind = CheckpointerFactory.get_write_behind(checkpointer)
+        self.model_calls = ResilientCaller(
+            self.config.graph.nodes.get("agent") or GraphNodeConfig(),
+            metrics,
+            self.config.model.name,
+            ResilientCaller.pool_size(self.config),
+        )
+        # Tools are bound to the chat model; the summary model call stays tool-free
+        self.tool_executor = ToolExecutor.from_config(self.config, tools, metrics)
+        self.chat_model = model.bind_tools(tools) if self.tool_executor is not None else model
+        # Part of the response cache key, so tool-bound and bare calls never share entries
+        self.tool_schemas = [convert_to_openai_tool(tool) for tool in tools] if self.tool_executor is not None else []
 
         # Create the custom graph
         self.agent = self._create_graph()
@@ -30,28 +69,134 @@ class chat_agent:
         # Create a new graph
         workflow = StateGraph(State)
 
-        # Add nodes
-        workflow.add_node("start_node", self._start_node)
-        workflow.add_node("agent_node", self._agent_node)
-        workflow.add_node("end_node", self._end_node)
+        # Add the nodes enabled in config.graph, in pipeline order
+        nodes = self._pipeline_nodes()
+        for name, node in nodes:
+            workflow.add_node(name, node)
 
-        # Add edges
-        workflow.add_edge(START, "start_node")
-        workflow.add_edge("start_node", "agent_node")
-        workflow.add_edge("agent_node", "end_node")
-        workflow.add_edge("end_node", END)
+        # The tools node answers the agent's tool calls and hands back to the agent
+        if self.tool_executor is not None:
+            workflow.add_node("tools_node", RunnableLambda(
+                self._timed("tools_node", self._tools_node),
+                afunc=self._atimed("tools_node", self._atools_node),
+                name="tools_node",
+            ))
+            workflow.add_edge("tools_node", "agent_node")
+
+        # Chain them: START -> ... -> END
+        previous = START
+        for name in [name for name, _ in nodes] + [END]:
+            if previous == "agent_node" and self.tool_executor is not None:
+                workflow.add_conditional_edges(previous, self._route_tools, {"tools": "tools_node", "done": name})
+            else:
+                workflow.add_edge(previous, name)
+            previous = name
 
         # Compile the graph with checkpointer
         return workflow.compile(checkpointer=self.checkpointer)
 
+    def _pipeline_nodes(self):
+        """Nodes enabled in config.graph, in execution order"""
+        graph = self.config.graph
+        agent = graph.nodes.get("agent")
+        if agent is not None and not agent.enabled:
+            raise ValueError("graph.nodes.agent can't be disabled")
+
+        nodes = []
+        if self._node_enabled("start"):
+            nodes.append(("start_node", self._timed("start_node", self._start_node)))
+        if graph.context.enabled:
+            nodes.append((
+                "context_node",
+                RunnableLambda(
+                    self._timed("context_node", self._context_node),
+                    afunc=self._atimed("context_node", self._acontext_node),
+                    name="context_node",
+                ),
+            ))
+        nodes.append((
+            "agent_node",
+            RunnableLambda(
+                self._timed("agent_node", self._agent_node),
+                afunc=self._atimed("agent_node", self._aagent_node),
+                name="agent_node",
+            ),
+        ))
+        if self._node_enabled("end"):
+            nodes.append(("end_node", self._timed("end_node", self._end_node)))
+        return nodes
+
+    def _timed(self, name, node):
+        """Wrap a node so its latency and errors are recorded; the signature is kept for LangGraph"""
+        if self.metrics is None:
+            return node
+
+        @functools.wraps(node)
+        def timed(*args, **kwargs):
+            with self.metrics.node(name):
+                return node(*args, **kwargs)
+        return timed
+
+    def _atimed(self, name, node):
+        if self.metrics is None:
+            return node
+
+        @functools.wraps(node)
+        async def timed(*args, **kwargs):
+            with self.metrics.node(name):
+                return await node(*args, **kwargs)
+        return timed
+
+    def _node_enabled(self, name):
+        node = self.config.graph.nodes.get(name)
+        return node is not None and node.enabled
+
     def _start_node(self, state: State):
-        """Starting node - logs the incoming message"""
+        """Starting node - logs the incoming message without updating the state"""
+        if self.config.graph.nodes["start"].log_messages:
+            messages = state["messages"]
+            logging.info(f"Pipeline started with {len(messages)} message(s)")
+        return {}
+
+    def _context_node(self, state: State, config: RunnableConfig):
+        """Context node - keeps the prompt under the token budget"""
+        update, to_summarize = self.context.plan(state)
+        if not to_summarize:
+            return update
+
+        prompt = self.context.summary_prompt(state.get("summary"), to_summarize)
+        summary = message_text(self._invoke_model(prompt, config, "summary"))
+        return self.context.apply(update, to_summarize, summary)
+
+    async def _acontext_node(self, state: State, config: RunnableConfig):
+        """Async context node - keeps the prompt under the token budget"""
+        update, to_summarize = self.context.plan(state)
+        if not to_summarize:
+            return update
+
+        prompt = self.context.summary_prompt(state.get("summary"), to_summarize)
+        summary = message_text(await self._ainvoke_model(prompt, config, "summary"))
+        return self.context.apply(update, to_summarize, summary)
+
+    def _agent_node(self, state: State, config: RunnableConfig):
+        """Agent node - processes the message with the LLM"""
         messages = state["messages"]
-        logging.info(f"Pipeline started with {len(messages)} message(s)")
+
+        # Get the latest human message
+        human_message = messages[-1] if messages else None
+
+        if human_message:
+            # Call the LLM (config carries the callbacks used for token streaming)
+            model = self._turn_model(messages)
+            response = self._call_model(self.context.prompt_messages(state), config, model)
+
+            # Return updated state with AI response
+            return {"messages": [self._final_answer(response, model)]}
+
         return state
 
-    def _agent_node(self, state: State):
-        """Agent node - processes the message with the LLM"""
+    async def _aagent_node(self, state: State, config: RunnableConfig):
+        """Async agent node - processes the message with the LLM without blocking the event loop"""
         messages = state["messages"]
 
         # Get the latest human message
@@ -59,28 +204,386 @@ class chat_agent:
 
         if human_message:
             # Call the LLM
-            response = self.model.invoke(messages)
+            model = self._turn_model(messages)
+            response = await self._acall_model(self.context.prompt_messages(state), config, model)
 
             # Return updated state with AI response
-            return {"messages": [response]}
+            return {"messages": [self._final_answer(response, model)]}
 
         return state
 
+    def _tools_node(self, state: State):
+        """Tools node - runs the tool calls of the last model response concurrently"""
+        return {"messages": self.tool_executor.run(state["messages"][-1].tool_calls)}
+
+    async def _atools_node(self, state: State):
+        """Async tools node"""
+        return {"messages": await self.tool_executor.arun(state["messages"][-1].tool_calls)}
+
+    @staticmethod
+    def _route_tools(state: State):
+        """Go to the tools node while the model asks for tools"""
+        last = state["messages"][-1] if state["messages"] else None
+        return "tools" if getattr(last, "tool_calls", None) else "done"
+
+    def _turn_model(self, messages):
+        """The tool-bound model, or the bare one once the turn used up tools.max_rounds"""
+        if self.tool_executor is None:
+            return self.model
+
+        rounds = 0
+        for msg in reversed(messages):
+            if isinstance(msg, HumanMessage):
+                break
+            if isinstance(msg, AIMessage) and msg.tool_calls:
+                rounds += 1
+        if rounds >= self.config.tools.max_rounds:
+            logging.warning(f"Turn reached {rounds} tool rounds, asking the model to answer")
+            return self.model
+        return self.chat_model
+
+    def _final_answer(self, response, model):
+        """Drop tool calls the model made without tools bound, so the turn ends"""
+        if self.tool_executor is None or model is not self.model or not getattr(response, "tool_calls", None):
+            return response
+        return response.model_copy(update={"tool_calls": []})
+
+    def _call_model(self, messages, config, model=None):
+        """Invoke the model, serving repeated prompts from the response cache"""
+        if self.response_cache is None:
+            return self._invoke_chat_model(messages, config, model)
+
+        tools = self._bound_tools(model)
+        response = self.response_cache.get(messages, tools)
+        if response is None:
+            response = self._invoke_chat_model(messages, config, model)
+            self.response_cache.set(messages, response, tools)
+        return response
+
+    async def _acall_model(self, messages, config, model=None):
+        if self.response_cache is None:
+            return await self._ainvoke_chat_model(messages, config, model)
+
+        tools = self._bound_tools(model)
+        response = await self.response_cache.aget(messages, tools)
+        if response is None:
+            response = await self._ainvoke_chat_model(messages, config, model)
+            await self.response_cache.aset(messages, response, tools)
+        return response
+
+    def _bound_tools(self, model):
+        """Schemas of the tools bound to the model a call goes to"""
+        return self.tool_schemas if model is self.chat_model and model is not self.model else []
+
+    def _invoke_chat_model(self, messages, config, model=None):
+        """Call the model under the agent node's timeout, retry and hedging policy"""
+        return self.model_calls.call(
+            lambda: self._invoke_model(messages, config, "chat", model),
+            "chat",
+            hedge=not self._streaming(config),
+        )
+
+    async def _ainvoke_chat_model(self, messages, config, model=None):
+        return await self.model_calls.acall(
+            lambda: self._ainvoke_model(messages, config, "chat", model),
+            "chat",
+            hedge=not self._streaming(config),
+        )
+
+    @staticmethod
+    def _streaming(config):
+        return bool((config or {}).get("configurable", {}).get(STREAMING_KEY))
+
+    def _invoke_model(self, messages, config, purpose, model=None):
+        """Call the model (self.model unless given), recording latency and token usage"""
+        model = model or self.model
+        if self.metrics is None:
+            return model.invoke(messages, config)
+
+        with self.metrics.llm(self.config.model.name, purpose) as call:
+            response = model.invoke(messages, config)
+            call.record(response)
+        return response
+
+    async def _ainvoke_model(self, messages, config, purpose, model=None):
+        model = model or self.model
+        if self.metrics is None:
+            return await model.ainvoke(messages, config)
+
+        with self.metrics.llm(self.config.model.name, purpose) as call:
+            response = await model.ainvoke(messages, config)
+            call.record(response)
+        return response
+
     def _end_node(self, state: State):
-        """Ending node - logs completion"""
-        messages = state["messages"]
-        logging.info(f"Pipeline completed with {len(messages)} message(s)")
-        return state
+        """Ending node - logs completion without updating the state"""
+        if self.config.graph.nodes["end"].log_completion:
+            messages = state["messages"]
+            logging.info(f"Pipeline completed with {len(messages)} message(s)")
+        return {}
 
-    def handle_message(self, message, thread_id):
+    def handle_message(self, message, thread_id, delta=False):
         if not message or not thread_id:
             return None, ValueError("message and thread_id can't be None")
 
-        result = self.agent.invoke(
-            {"messages": [HumanMessage(content=message)]},
-            {"configurable": {"thread_id": thread_id}},
-        )
+        human_message = HumanMessage(content=message, id=str(uuid.uuid4()))
+        with self._hold(thread_id), self._admit():
+            result = self.agent.invoke(
+                {"messages": [human_message]},
+                {"configurable": {"thread_id": thread_id}},
+                durability=self.config.graph.durability,
+            )
 
+        if delta:
+            return self._new_messages(result, human_message.id), None
         return result, None
-        
 
+    async def ahandle_message(self, message, thread_id, delta=False):
+        if not message or not thread_id:
+            return None, ValueError("message and thread_id can't be None")
+
+        human_message = HumanMessage(content=message, id=str(uuid.uuid4()))
+        async with self._ahold(thread_id), self._aadmit():
+            result = await self.agent.ainvoke(
+                {"messages": [human_message]},
+                {"configurable": {"thread_id": thread_id}},
+                durability=self.config.graph.durability,
+            )
+
+        if delta:
+            return self._new_messages(result, human_message.id), None
+        return result, None
+
+    def stream_message(self, message, thread_id):
+        """Run one turn, yielding ("token", text) events while the model generates
+        and a final ("done", state) event once the turn is checkpointed"""
+        if not message or not thread_id:
+            raise ValueError("message and thread_id can't be None")
+
+        human_message = HumanMessage(content=message, id=str(uuid.uuid4()))
+        final_state = None
+
+        with self._hold(thread_id), self._admit():
+            for mode, chunk in self.agent.stream(
+                {"messages": [human_message]},
+                {"configurable": {"thread_id": thread_id, STREAMING_KEY: True}},
+                durability=self.config.graph.durability,
+                stream_mode=["messages", "values"],
+            ):
+                if mode == "values":
+                    final_state = chunk
+                    continue
+
+                text = self._chunk_text(chunk)
+                if text:
+                    yield "token", text
+
+        yield "done", self._new_messages(final_state, human_message.id)
+
+    async def astream_message(self, message, thread_id):
+        """Async variant of stream_message"""
+        if not message or not thread_id:
+            raise ValueError("message and thread_id can't be None")
+
+        human_message = HumanMessage(content=message, id=str(uuid.uuid4()))
+        final_state = None
+
+        async with self._ahold(thread_id), self._aadmit():
+            async for mode, chunk in self.agent.astream(
+                {"messages": [human_message]},
+                {"configurable": {"thread_id": thread_id, STREAMING_KEY: True}},
+                durability=self.config.graph.durability,
+                stream_mode=["messages", "values"],
+            ):
+                if mode == "values":
+                    final_state = chunk
+                    continue
+
+                text = self._chunk_text(chunk)
+                if text:
+                    yield "token", text
+
+        yield "done", self._new_messages(final_state, human_message.id)
+
+    def handle_batch(self, items, max_concurrency=16):
+        """Run one turn for each {"thread_id", "message"} item.
+
+        Items are grouped into rounds so that each round holds at most one
+        turn per thread; a round runs its turns with bounded concurrency,
+        and turns of the same thread keep their order. Each turn takes its
+        thread lock and then an admission slot, like handle_message, so a
+        busy thread or a full queue only fails that item.
+        Returns one result per item: the turn's new messages or an error.
+        """
+        results, rounds = self._plan_batch(items)
+        turn = RunnableLambda(self._batch_turn, afunc=self._abatch_turn)
+
+        for round_indices in rounds:
+            inputs, configs, human_ids = self._batch_round(items, round_indices, max_concurrency)
+            outputs = turn.batch(inputs, configs, return_exceptions=True)
+            self._collect_batch(results, round_indices, outputs, human_ids)
+
+        return results, None
+
+    async def ahandle_batch(self, items, max_concurrency=16):
+        """Async variant of handle_batch"""
+        results, rounds = self._plan_batch(items)
+        turn = RunnableLambda(self._batch_turn, afunc=self._abatch_turn)
+
+        for round_indices in rounds:
+            inputs, configs, human_ids = self._batch_round(items, round_indices, max_concurrency)
+            outputs = await turn.abatch(inputs, configs, return_exceptions=True)
+            self._collect_batch(results, round_indices, outputs, human_ids)
+
+        return results, None
+
+    def _batch_turn(self, inputs, config: RunnableConfig):
+        thread_id = config["configurable"]["thread_id"]
+        with self._hold(thread_id), self._admit():
+            return self.agent.invoke(inputs, config, durability=self.config.graph.durability)
+
+    async def _abatch_turn(self, inputs, config: RunnableConfig):
+        thread_id = config["configurable"]["thread_id"]
+        async with self._ahold(thread_id), self._aadmit():
+            return await self.agent.ainvoke(inputs, config, durability=self.config.graph.durability)
+
+    @staticmethod
+    def _plan_batch(items):
+        """Validate items and split them into rounds with one turn per thread each"""
+        results = [None] * len(items)
+        rounds = []
+        turns = defaultdict(int)
+
+        for index, item in enumerate(items):
+            thread_id = item.get("thread_id") if isinstance(item, dict) else None
+            message = item.get("message") if isinstance(item, dict) else None
+            if not message or not thread_id:
+                results[index] = {"thread_id": thread_id, "error": "message and thread_id are required"}
+                continue
+            if not isinstance(thread_id, str):
+                results[index] = {"thread_id": thread_id, "error": "thread_id must be a string"}
+                continue
+
+            turn = turns[thread_id]
+            turns[thread_id] += 1
+            if turn == len(rounds):
+                rounds.append([])
+            rounds[turn].append(index)
+
+        return results, rounds
+
+    @staticmethod
+    def _batch_round(items, round_indices, max_concurrency):
+        inputs, configs, human_ids = [], [], []
+        for index in round_indices:
+            human_message = HumanMessage(content=items[index]["message"], id=str(uuid.uuid4()))
+            inputs.append({"messages": [human_message]})
+            configs.append({
+                "configurable": {"thread_id": items[index]["thread_id"]},
+                "max_concurrency": max_concurrency,
+            })
+            human_ids.append(human_message.id)
+        return inputs, configs, human_ids
+
+    def _collect_batch(self, results, round_indices, outputs, human_ids):
+        for index, output, human_id in zip(round_indices, outputs, human_ids):
+            if isinstance(output, Exception):
+                logging.error(f"batch item {index} failed: {output}")
+                results[index] = {"error": str(output)}
+            else:
+                results[index] = self._new_messages(output, human_id)
+
+    @contextmanager
+    def _hold(self, thread_id):
+        """Serialize turns of one thread; other threads are not blocked.
+        The thread's buffered checkpoint writes are committed before the lock is released"""
+        with self.thread_locks.hold(thread_id) if self.thread_locks is not None else nullcontext():
+            try:
+                yield
+            finally:
+                if self.write_behind is not None:
+                    self.write_behind.flush_thread(thread_id)
+
+    @asynccontextmanager
+    async def _ahold(self, thread_id):
+        async with self.thread_locks.ahold(thread_id) if self.thread_locks is not None else nullcontext():
+            try:
+                yield
+            finally:
+                if self.write_behind is not None:
+                    await self.write_behind.aflush_thread(thread_id)
+
+    def _admit(self):
+        """Wait for a concurrency slot; raises OverloadedError when the queue is full"""
+        if self.admission is None:
+            return nullcontext()
+        return self.admission.admit()
+
+    def _aadmit(self):
+        if self.admission is None:
+            return nullcontext()
+        return self.admission.aadmit()
+
+    def get_messages(self, thread_id, cursor=None, limit=50):
+        """Page through a thread's history, newest page first.
+
+        Reads the latest checkpoint directly instead of rebuilding the full
+        graph state, and only the requested page is returned to the caller.
+        """
+        if not thread_id:
+            return None, ValueError("thread_id can't be None")
+
+        checkpoint_tuple = self.checkpointer.get_tuple(self._thread_config(thread_id))
+        return self._page_messages(checkpoint_tuple, cursor, limit)
+
+    async def aget_messages(self, thread_id, cursor=None, limit=50):
+        """Async variant of get_messages"""
+        if not thread_id:
+            return None, ValueError("thread_id can't be None")
+
+        checkpoint_tuple = await self.checkpointer.aget_tuple(self._thread_config(thread_id))
+        return self._page_messages(checkpoint_tuple, cursor, limit)
+
+    @staticmethod
+    def _thread_config(thread_id):
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+
+    @staticmethod
+    def _page_messages(checkpoint_tuple, cursor, limit):
+        """Select up to `limit` messages older than `cursor` (a message id)"""
+        if checkpoint_tuple is None:
+            return {"messages": [], "next_cursor": None}, None
+
+        messages = checkpoint_tuple.checkpoint["channel_values"].get("messages", [])
+
+        end = len(messages)
+        if cursor:
+            for index, msg in enumerate(messages):
+                if getattr(msg, "id", None) == cursor:
+                    end = index
+                    break
+            else:
+                return None, ValueError(f"unknown cursor: {cursor}")
+
+        start = max(0, end - limit)
+        page = messages[start:end]
+        next_cursor = page[0].id if start > 0 and page else None
+
+        return {"messages": page, "next_cursor": next_cursor}, None
+
+    @staticmethod
+    def _chunk_text(chunk):
+        """Extract the text of an LLM token chunk emitted by the agent node"""
+        message_chunk, metadata = chunk
+        if metadata.get("langgraph_node") != "agent_node":
+            return None
+        return message_text(message_chunk)
+
+    @staticmethod
+    def _new_messages(state, human_message_id):
+        """Messages produced by the turn that started with the given human message"""
+        messages = state.get("messages", []) if state else []
+        for index, msg in enumerate(messages):
+            if getattr(msg, "id", None) == human_message_id:
+                return {"messages": messages[index:]}
+        return {"messages": []}
@@ -0,0 +1,128 @@
+import logging
+
+from langchain_core.messages import HumanMessage, SystemMessage
+from langchain_core.messages.utils import count_tokens_approximately, get_buffer_string
+from service.config import ContextConfig
+
+SUMMARY_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation. "
+    "Extend the existing summary with the new messages below. "
+    "Keep facts, decisions, names and open questions; drop small talk. "
+    "Answer with the updated summary only, in at most {max_tokens} tokens."
+)
+
+
+def message_text(message):
+    """Plain text of a message whose content may be a list of parts"""
+    content = message.content
+    if isinstance(content, str):
+        return content
+    return "".join(
+        part.get("text", "") if isinstance(part, dict) else str(part)
+        for part in content
+    )
+
+
+def merge_token_counts(left, right):
+    """Reducer for the per-message token count cache; a None value drops the entry"""
+    merged = dict(left or {})
+    for message_id, count in (right or {}).items():
+        if count is None:
+            merged.pop(message_id, None)
+        else:
+            merged[message_id] = count
+    return merged
+
+
+class ContextWindow:
+    """Keeps the prompt under a token budget by folding old turns into a rolling summary.
+
+    The thread keeps its full history: the state records the summary and the
+    id of the last message it covers, and only the prompt sent to the model
+    drops the summarized messages. Token counts are cached per message id in
+    the checkpointed state, so each turn only counts the messages added since
+    the previous turn.
+    """
+
+    def __init__(self, config: ContextConfig):
+        self.config = config
+
+    def plan(self, state):
+        """Decide which messages must be summarized.
+
+        Returns the state update with newly counted messages and the list of
+        messages to fold into the summary (empty if the prompt fits).
+        """
+        messages = self.unsummarized(state)
+        token_counts = state.get("token_counts") or {}
+
+        new_counts = {
+            msg.id: count_tokens_approximately([msg])
+            for msg in messages
+            if msg.id not in token_counts
+        }
+        counts = {**token_counts, **new_counts}
+        update = {"token_counts": new_counts} if new_counts else {}
+
+        summary_tokens = self.config.summary_max_tokens if state.get("summary") else 0
+        total = summary_tokens + sum(counts[msg.id] for msg in messages)
+        if total <= self.config.max_tokens:
+            return update, []
+
+        # Turns start at a human message; the last K turns are always kept verbatim
+        turn_starts = [i for i, msg in enumerate(messages) if isinstance(msg, HumanMessage)]
+        keep_last_turns = max(1, self.config.keep_last_turns)
+        if len(turn_starts) <= keep_last_turns:
+            return update, []
+        protected = turn_starts[-keep_last_turns]
+
+        # Cut at the earliest turn boundary that brings the prompt under budget
+        budget = self.config.max_tokens - self.config.summary_max_tokens
+        remaining = sum(counts[msg.id] for msg in messages)
+        cut = 0
+        for start in turn_starts[1:] + [protected]:
+            if start > protected:
+                break
+            remaining -= sum(counts[msg.id] for msg in messages[cut:start])
+            cut = start
+            if remaining <= budget:
+                break
+
+        return update, messages[:cut]
+
+    def summary_prompt(self, summary, messages):
+        """Messages asking the model to fold `messages` into the existing summary"""
+        instructions = SUMMARY_INSTRUCTIONS.format(max_tokens=self.config.summary_max_tokens)
+        content = f"Existing summary:\n{summary or '(none)'}\n\nNew messages:\n{get_buffer_string(messages)}"
+        return [SystemMessage(content=instructions), HumanMessage(content=content)]
+
+    def apply(self, update, summarized, summary):
+        """State update folding the summarized messages into the new summary; they stay in the history"""
+        logging.info(f"Context window: summarized {len(summarized)} message(s)")
+        token_counts = dict(update.get("token_counts", {}))
+        token_counts.update({msg.id: None for msg in summarized})
+        return {
+            "summary": summary,
+            "summarized_through": summarized[-1].id,
+            "token_counts": token_counts,
+        }
+
+    @staticmethod
+    def unsummarized(state):
+        """Messages after the last one the summary covers"""
+        messages = state["messages"]
+        summarized_through = state.get("summarized_through")
+        if summarized_through:
+            for i in range(len(messages) - 1, -1, -1):
+                if messages[i].id == summarized_through:
+                    return messages[i + 1:]
+        return messages
+
+    @staticmethod
+    def prompt_messages(state):
+        """Messages to send to the model, prefixed with the rolling summary if any"""
+        messages = ContextWindow.unsummarized(state)
+        summary = state.get("summary")
+        if not summary:
+            return messages
+        return [SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")] + messages
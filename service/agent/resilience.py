@@ -0,0 +1,270 @@
+import time
+import random
+import asyncio
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional
+from service.config import Config, GraphNodeConfig
+
+# Status codes and exception names (google-genai, httpx, grpc) of failures worth retrying
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+TRANSIENT_ERRORS = {
+    "ResourceExhausted", "ServiceUnavailable", "InternalServerError", "DeadlineExceeded",
+    "TooManyRequests", "GatewayTimeout", "BadGateway",
+    "ConnectError", "ConnectTimeout", "ReadError", "ReadTimeout", "RemoteProtocolError",
+}
+
+# Latencies kept for the adaptive hedge delay, and how many are needed before hedging
+LATENCY_WINDOW = 500
+MIN_LATENCY_SAMPLES = 20
+
+
+class ModelTimeoutError(TimeoutError):
+    """Raised when the model does not answer within the node's timeout"""
+
+    def __init__(self, timeout: float):
+        super().__init__(f"model did not respond within {timeout}s")
+        self.timeout = timeout
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether a failed model call may succeed if repeated"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    if isinstance(status, int) and status in TRANSIENT_STATUS:
+        return True
+    return type(error).__name__ in TRANSIENT_ERRORS
+
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies"""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < MIN_LATENCY_SAMPLES:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class ResilientCaller:
+    """Runs model calls under a node's timeout, retry and hedging policy.
+
+    The timeout bounds the whole call, retries included. Transient failures
+    are retried with full-jitter exponential backoff. With hedging on, a
+    second attempt starts when the first has not answered after `hedge_delay`
+    (or the recent `hedge_quantile` latency when hedge_delay is 0), and the
+    first to succeed wins. Sync attempts run on a thread pool so the deadline
+    holds; abandoned ones can't be interrupted and keep their worker until
+    the model answers. When every worker is taken, a first attempt runs on
+    the caller's thread instead (its deadline is then only checked between
+    retries) and a hedge is not sent, rather than queueing behind them.
+    """
+
+    def __init__(self, node: GraphNodeConfig, metrics=None, model_name: str = "", max_workers: int = 32):
+        self.node = node
+        self.metrics = metrics
+        self.model_name = model_name
+        self.latencies = LatencyTracker()
+        self._executor = None
+        self._executor_lock = threading.Lock()
+        self._max_workers = max_workers
+        self._busy = 0
+
+    @staticmethod
+    def pool_size(config: Config) -> int:
+        """Workers for sync attempts: a first attempt and a hedge for every turn a worker process runs at once"""
+        return 2 * (config.app.threads + config.api.batch.get("max_concurrency", 16))
+
+    def call(self, attempt, purpose: str, hedge: bool = True):
+        """Run attempt() (a blocking model call) under the policy"""
+        deadline = self._deadline()
+        for retry in range(self.node.retries + 1):
+            try:
+                return self._run(attempt, purpose, deadline, hedge)
+            except ModelTimeoutError:
+                raise
+            except Exception as e:
+                delay = self._retry_delay(e, retry, deadline, purpose)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+
+    async def acall(self, attempt, purpose: str, hedge: bool = True):
+        """Run attempt() (returning a model call awaitable) under the policy"""
+        deadline = self._deadline()
+        for retry in range(self.node.retries + 1):
+            try:
+                return await self._arun(attempt, purpose, deadline, hedge)
+            except ModelTimeoutError:
+                raise
+            except Exception as e:
+                delay = self._retry_delay(e, retry, deadline, purpose)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+
+    def _run(self, attempt, purpose, deadline, hedge):
+        hedge_delay = self._hedge_delay() if hedge else None
+        if deadline is None and hedge_delay is None:
+            return self._timed(attempt)
+
+        started = time.monotonic()
+        first = self._submit(attempt)
+        if first is None:
+            self._count("busy", purpose)
+            return self._timed(attempt)
+        pending = [first]
+        hedged, reason = False, "cancelled"
+        try:
+            while True:
+                wait_for = self._wait_for(started, deadline, None if hedged else hedge_delay)
+                done, _ = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.remove(future)
+                succeeded = [future for future in done if future.exception() is None]
+                if succeeded:
+                    reason = "hedge_lost"
+                    return succeeded[0].result()
+                if done and not pending:
+                    return done.pop().result()  # every attempt failed: raises
+
+                if deadline is not None and time.monotonic() >= deadline:
+                    reason = "timeout"
+                    self._count("timeout", purpose)
+                    raise ModelTimeoutError(self.node.timeout)
+                if hedge_delay is not None and not hedged and time.monotonic() >= started + hedge_delay:
+                    hedged = True
+                    second = self._submit(attempt)
+                    if second is not None:
+                        self._count("hedge", purpose)
+                        pending.append(second)
+        finally:
+            for future in pending:
+                future.cancel()
+                self._count("abandoned", purpose, reason)
+
+    async def _arun(self, attempt, purpose, deadline, hedge):
+        hedge_delay = self._hedge_delay() if hedge else None
+        if deadline is None and hedge_delay is None:
+            return await self._atimed(attempt)
+
+        started = time.monotonic()
+        pending = {asyncio.ensure_future(self._atimed(attempt))}
+        hedged, reason = False, "cancelled"
+        try:
+            while True:
+                wait_for = self._wait_for(started, deadline, None if hedged else hedge_delay)
+                done, pending = await asyncio.wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+                succeeded = [task for task in done if task.exception() is None]
+                if succeeded:
+                    reason = "hedge_lost"
+                    return succeeded[0].result()
+                if done and not pending:
+                    return done.pop().result()  # every attempt failed: raises
+
+                if deadline is not None and time.monotonic() >= deadline:
+                    reason = "timeout"
+                    self._count("timeout", purpose)
+                    raise ModelTimeoutError(self.node.timeout)
+                if hedge_delay is not None and not hedged and time.monotonic() >= started + hedge_delay:
+                    hedged = True
+                    self._count("hedge", purpose)
+                    pending.add(asyncio.ensure_future(self._atimed(attempt)))
+        finally:
+            for task in pending:
+                task.cancel()
+                self._count("abandoned", purpose, reason)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def _timed(self, attempt):
+        started = time.monotonic()
+        response = attempt()
+        self.latencies.add(time.monotonic() - started)
+        return response
+
+    async def _atimed(self, attempt):
+        started = time.monotonic()
+        response = await attempt()
+        self.latencies.add(time.monotonic() - started)
+        return response
+
+    def _deadline(self) -> Optional[float]:
+        return time.monotonic() + self.node.timeout if self.node.timeout > 0 else None
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.node.hedge:
+            return None
+        if self.node.hedge_delay > 0:
+            return self.node.hedge_delay
+        return self.latencies.quantile(self.node.hedge_quantile)
+
+    @staticmethod
+    def _wait_for(started, deadline, hedge_delay) -> Optional[float]:
+        """Time until the next event: the hedge launch (if still due) or the deadline"""
+        now = time.monotonic()
+        until = [deadline - now] if deadline is not None else []
+        if hedge_delay is not None:
+            until.append(started + hedge_delay - now)
+        return max(0.0, min(until)) if until else None
+
+    def _retry_delay(self, error, retry, deadline, purpose) -> Optional[float]:
+        """Backoff before the next attempt, or None if the error should be raised"""
+        if retry >= self.node.retries or not is_transient(error):
+            return None
+        delay = random.uniform(0, min(self.node.retry_max_backoff, self.node.retry_backoff * 2 ** retry))
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return None
+
+        self._count("retry", purpose)
+        logging.warning(f"model call failed ({type(error).__name__}: {error}), retry {retry + 1} in {delay:.2f}s")
+        return delay
+
+    def _submit(self, attempt):
+        """Start an attempt on a free worker; None if every worker is busy"""
+        with self._executor_lock:
+            if self._busy >= self._max_workers:
+                return None
+            self._busy += 1
+        future = self._get_executor().submit(contextvars.copy_context().run, self._timed, attempt)
+        future.add_done_callback(self._release)
+        return future
+
+    def _release(self, future) -> None:
+        with self._executor_lock:
+            self._busy -= 1
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="model-call")
+        return self._executor
+
+    def _count(self, event, purpose, reason=None):
+        if self.metrics is None:
+            return
+        labels = {"model": self.model_name, "purpose": purpose}
+        if event == "retry":
+            self.metrics.llm_retries.labels(**labels).inc()
+        elif event == "timeout":
+            self.metrics.llm_timeouts.labels(**labels).inc()
+        elif event == "hedge":
+            self.metrics.llm_hedges.labels(**labels).inc()
+        elif event == "busy":
+            self.metrics.llm_busy.labels(**labels).inc()
+        elif event == "abandoned":
+            self.metrics.llm_abandoned.labels(reason=reason, **labels).inc()
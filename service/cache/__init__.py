@@ -0,0 +1,4 @@
+from .lru import LRUCache
+from .response_cache import ResponseCache
+
+__all__ = ['LRUCache', 'ResponseCache']
\ No newline at end of file
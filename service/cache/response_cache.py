@@ -0,0 +1,251 @@
+import json
+import hashlib
+import itertools
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from service.config import Config
+from .lru import LRUCache
+
+try:
+    from psycopg.types.json import Jsonb
+    from psycopg_pool import AsyncConnectionPool, ConnectionPool
+    PSYCOPG_AVAILABLE = True
+except ImportError:
+    PSYCOPG_AVAILABLE = False
+
+# Expired rows are deleted, at most PURGE_BATCH of them, once every PURGE_EVERY stores
+PURGE_EVERY = 1000
+PURGE_BATCH = 1000
+
+
+class PostgresCacheBackend:
+    """Shared cache tier stored in the application's Postgres database"""
+
+    CREATE_TABLE = """
+        CREATE TABLE IF NOT EXISTS llm_response_cache (
+            key TEXT PRIMARY KEY,
+            value JSONB NOT NULL,
+            expires_at TIMESTAMPTZ NOT NULL
+        )
+    """
+    CREATE_INDEX = """
+        CREATE INDEX IF NOT EXISTS llm_response_cache_expires_at_idx
+        ON llm_response_cache (expires_at)
+    """
+    SELECT = "SELECT value FROM llm_response_cache WHERE key = %s AND expires_at > now()"
+    UPSERT = """
+        INSERT INTO llm_response_cache (key, value, expires_at)
+        VALUES (%s, %s, now() + make_interval(secs => %s))
+        ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, expires_at = EXCLUDED.expires_at
+    """
+    PURGE = """
+        DELETE FROM llm_response_cache
+        WHERE ctid IN (SELECT ctid FROM llm_response_cache WHERE expires_at <= now() LIMIT %s)
+    """
+
+    def __init__(self, pool, ttl_seconds: int):
+        self.pool = pool
+        self.ttl_seconds = ttl_seconds
+        self.errors = 0
+        self._stores = itertools.count(1)
+
+    def setup(self) -> None:
+        with self.pool.connection() as conn:
+            conn.execute(self.CREATE_TABLE)
+            conn.execute(self.CREATE_INDEX)
+            conn.execute(self.PURGE, (PURGE_BATCH,))
+
+    async def asetup(self) -> None:
+        async with self.pool.connection() as conn:
+            await conn.execute(self.CREATE_TABLE)
+            await conn.execute(self.CREATE_INDEX)
+            await conn.execute(self.PURGE, (PURGE_BATCH,))
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute(self.SELECT, (key,)).fetchone()
+        except Exception as e:
+            self.errors += 1
+            logging.warning(f"Response cache lookup failed: {e}")
+            return None
+        return row["value"] if row is not None else None
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            async with self.pool.connection() as conn:
+                cursor = await conn.execute(self.SELECT, (key,))
+                row = await cursor.fetchone()
+        except Exception as e:
+            self.errors += 1
+            logging.warning(f"Response cache lookup failed: {e}")
+            return None
+        return row["value"] if row is not None else None
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        try:
+            with self.pool.connection() as conn:
+                conn.execute(self.UPSERT, (key, Jsonb(value), self.ttl_seconds))
+                if next(self._stores) % PURGE_EVERY == 0:
+                    conn.execute(self.PURGE, (PURGE_BATCH,))
+        except Exception as e:
+            self.errors += 1
+            logging.warning(f"Response cache store failed: {e}")
+
+    async def aset(self, key: str, value: Dict[str, Any]) -> None:
+        try:
+            async with self.pool.connection() as conn:
+                await conn.execute(self.UPSERT, (key, Jsonb(value), self.ttl_seconds))
+                if next(self._stores) % PURGE_EVERY == 0:
+                    await conn.execute(self.PURGE, (PURGE_BATCH,))
+        except Exception as e:
+            self.errors += 1
+            logging.warning(f"Response cache store failed: {e}")
+
+
+class ResponseCache:
+    """Cache of model responses keyed by model name, parameters, bound tools and prompt.
+
+    Lookups go to the in-process LRU first and then to the optional shared
+    Postgres tier; a shared hit is copied into the local tier. Hits (per
+    tier), misses and local evictions are counted in the Prometheus metrics.
+    """
+
+    def __init__(self, model_name: str, parameters: Dict[str, Any], local: LRUCache,
+                 shared: Optional[PostgresCacheBackend] = None, metrics=None):
+        self.local = local
+        self.shared = shared
+        self.metrics = metrics
+        self._prefix = json.dumps(
+            {"model": model_name, "parameters": parameters},
+            sort_keys=True,
+            default=str,
+        )
+
+    @staticmethod
+    def from_config(config: Config, connection_pool=None, metrics=None) -> Optional["ResponseCache"]:
+        """Create the response cache configured for this deployment, or None if disabled"""
+        cache_config = config.cache
+        if not cache_config.enabled:
+            return None
+
+        temperature = config.model.parameters.get("temperature", 0) or 0
+        if temperature > 0 and not cache_config.force:
+            logging.info(f"Response cache disabled: temperature is {temperature} (set cache.force to override)")
+            return None
+
+        local = LRUCache(max_entries=cache_config.max_entries, ttl_seconds=cache_config.ttl_seconds)
+
+        shared = None
+        if cache_config.backend == "postgres":
+            if PSYCOPG_AVAILABLE and isinstance(connection_pool, (ConnectionPool, AsyncConnectionPool)):
+                shared = PostgresCacheBackend(connection_pool, cache_config.ttl_seconds)
+            else:
+                logging.warning("Postgres response cache requires the pooled Postgres checkpointer, using local cache only")
+        elif cache_config.backend != "local":
+            logging.warning(f"Unknown response cache backend: {cache_config.backend}, using local cache only")
+
+        logging.info(f"Response cache enabled: backend={cache_config.backend if shared else 'local'}, "
+                     f"max_entries={cache_config.max_entries}, ttl={cache_config.ttl_seconds}s")
+        return ResponseCache(config.model.name, config.model.parameters, local, shared, metrics)
+
+    def setup(self) -> None:
+        """Create the shared cache table if needed"""
+        if self.shared is not None:
+            self.shared.setup()
+
+    async def asetup(self) -> None:
+        if self.shared is not None:
+            await self.shared.asetup()
+
+    def key(self, messages: List[BaseMessage], tools: Optional[Sequence[Dict[str, Any]]] = None) -> str:
+        """Hash of the normalized prompt and the schemas of the tools bound to the model;
+        message ids and whitespace differences are ignored"""
+        normalized = [
+            {
+                "type": msg.type,
+                "content": self._normalize_content(msg.content),
+                "name": getattr(msg, "name", None),
+                "tool_calls": [
+                    {"name": call["name"], "args": call["args"]}
+                    for call in getattr(msg, "tool_calls", None) or []
+                ],
+            }
+            for msg in messages
+        ]
+        payload = json.dumps({"messages": normalized, "tools": tools or []}, sort_keys=True, default=str)
+        return hashlib.sha256((self._prefix + payload).encode("utf-8")).hexdigest()
+
+    def get(self, messages: List[BaseMessage], tools: Optional[Sequence[Dict[str, Any]]] = None) -> Optional[BaseMessage]:
+        key = self.key(messages, tools)
+        value = self.local.get(key)
+        if value is not None:
+            self._count_hit("local")
+        elif self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self._count_hit("shared")
+                self._set_local(key, value)
+        if value is None:
+            self._count_miss()
+        return self._load(value)
+
+    async def aget(self, messages: List[BaseMessage],
+                   tools: Optional[Sequence[Dict[str, Any]]] = None) -> Optional[BaseMessage]:
+        key = self.key(messages, tools)
+        value = self.local.get(key)
+        if value is not None:
+            self._count_hit("local")
+        elif self.shared is not None:
+            value = await self.shared.aget(key)
+            if value is not None:
+                self._count_hit("shared")
+                self._set_local(key, value)
+        if value is None:
+            self._count_miss()
+        return self._load(value)
+
+    def set(self, messages: List[BaseMessage], response: BaseMessage,
+            tools: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        key = self.key(messages, tools)
+        value = message_to_dict(response)
+        self._set_local(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value)
+
+    async def aset(self, messages: List[BaseMessage], response: BaseMessage,
+                   tools: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        key = self.key(messages, tools)
+        value = message_to_dict(response)
+        self._set_local(key, value)
+        if self.shared is not None:
+            await self.shared.aset(key, value)
+
+    def _set_local(self, key: str, value: Dict[str, Any]) -> None:
+        evicted = self.local.set(key, value)
+        if evicted and self.metrics is not None:
+            self.metrics.response_cache_evictions.inc(evicted)
+
+    def _count_hit(self, tier: str) -> None:
+        if self.metrics is not None:
+            self.metrics.response_cache_hits.labels(tier=tier).inc()
+
+    def _count_miss(self) -> None:
+        if self.metrics is not None:
+            self.metrics.response_cache_misses.inc()
+
+    @staticmethod
+    def _normalize_content(content) -> Any:
+        if isinstance(content, str):
+            return " ".join(content.split())
+        return content
+
+    @staticmethod
+    def _load(value: Optional[Dict[str, Any]]) -> Optional[BaseMessage]:
+        if value is None:
+            return None
+        message = messages_from_dict([value])[0]
+        # A fresh id lets add_messages append the cached reply instead of replacing an older one
+        message.id = None
+        return message
@@ -0,0 +1,266 @@
+import os
+import glob
+import time
+import pickle
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional, Sequence
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata, CheckpointTuple
+from langgraph.checkpoint.memory import MemorySaver
+from .slots import claim_slot, try_lock
+
+SPILL_PATTERN = "thread-*.ckpt"
+
+
+class _ThreadUsage:
+    __slots__ = ("bytes", "last_access", "write_keys", "blob_keys")
+
+    def __init__(self):
+        self.bytes = 0
+        self.last_access = time.monotonic()
+        self.write_keys = set()
+        self.blob_keys = set()
+
+
+class BoundedMemorySaver(MemorySaver):
+    """MemorySaver with a memory budget.
+
+    Threads are tracked in LRU order with the size of their serialized
+    checkpoints, writes and blobs. When the byte or thread budget is exceeded,
+    or a thread has been idle for `idle_ttl_seconds`, the least recently used
+    threads are evicted. With `spill_dir` set, evicted threads are written to
+    a local file and transparently loaded back on their next access, so
+    running over budget costs latency instead of state.
+
+    `list` without a thread id only covers threads currently in memory.
+    """
+
+    def __init__(self, max_bytes: int = 0, max_threads: int = 0, idle_ttl_seconds: float = 0,
+                 spill_dir: Optional[str] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.max_bytes = max_bytes or None
+        self.max_threads = max_threads or None
+        self.idle_ttl_seconds = idle_ttl_seconds or None
+        self.spill_dir = spill_dir
+
+        self._usage: "OrderedDict[str, _ThreadUsage]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.RLock()
+
+        self.evictions = 0
+        self.spills = 0
+        self.reloads = 0
+
+        self._slot_lock = None
+        if spill_dir:
+            # Each process spills to its own slot, so workers sharing spill_dir keep their threads.
+            # Spills of this slot and of slots no live process holds belong to a previous process' memory
+            os.makedirs(spill_dir, exist_ok=True)
+            slot, self._slot_lock = claim_slot(spill_dir)
+            self.spill_dir = os.path.join(spill_dir, slot)
+            self._clear_spills(self.spill_dir)
+            for slot_path in glob.glob(os.path.join(spill_dir, "slot-*")):
+                lock_file = try_lock(slot_path) if slot_path != self.spill_dir else None
+                if lock_file is not None:
+                    self._clear_spills(slot_path)
+                    lock_file.close()
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            usage = self._touch(thread_id, create=False)
+            checkpoint_tuple = super().get_tuple(config)
+            if usage is None:
+                # MemorySaver's defaultdict storage adds an empty entry on lookup
+                self.storage.pop(thread_id, None)
+            return checkpoint_tuple
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        with self._lock:
+            usage = self._touch(config["configurable"]["thread_id"], create=False) if config else None
+            # Materialize while holding the lock, eviction mutates the storage
+            items = list(super().list(config, filter=filter, before=before, limit=limit))
+            if config and usage is None:
+                self.storage.pop(config["configurable"]["thread_id"], None)
+        return iter(items)
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+
+        with self._lock:
+            usage = self._touch(thread_id)
+            next_config = super().put(config, checkpoint, metadata, new_versions)
+
+            saved_checkpoint, saved_metadata, _ = self.storage[thread_id][checkpoint_ns][checkpoint["id"]]
+            added = len(saved_checkpoint[1]) + len(saved_metadata[1])
+            for channel, version in new_versions.items():
+                key = (thread_id, checkpoint_ns, channel, version)
+                if key not in usage.blob_keys:
+                    usage.blob_keys.add(key)
+                    added += len(self.blobs[key][1])
+            self._grow(usage, added)
+
+            self._enforce_limits(keep=thread_id)
+            return next_config
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        outer_key = (thread_id, config["configurable"].get("checkpoint_ns", ""), config["configurable"]["checkpoint_id"])
+
+        with self._lock:
+            usage = self._touch(thread_id)
+            before = self._writes_size(outer_key)
+            super().put_writes(config, writes, task_id, task_path)
+            usage.write_keys.add(outer_key)
+            self._grow(usage, self._writes_size(outer_key) - before)
+
+            self._enforce_limits(keep=thread_id)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock:
+            self._drop(thread_id)
+            path = self._spill_path(thread_id)
+            if path and os.path.exists(path):
+                os.remove(path)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "threads": len(self._usage),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+                "spills": self.spills,
+                "reloads": self.reloads,
+            }
+
+    def _touch(self, thread_id: str, create: bool = True) -> Optional[_ThreadUsage]:
+        """Mark the thread as recently used, loading it back from disk if it was spilled.
+
+        Reads pass create=False: a thread that is neither in memory nor
+        spilled is not tracked, so looking up unknown ids can't evict others.
+        """
+        usage = self._usage.get(thread_id)
+        if usage is None:
+            if not create and not self._is_spilled(thread_id):
+                self._expire_idle(keep=thread_id)
+                return None
+            usage = self._usage[thread_id] = _ThreadUsage()
+            self._reload(thread_id, usage)
+        else:
+            usage.last_access = time.monotonic()
+            self._usage.move_to_end(thread_id)
+
+        self._expire_idle(keep=thread_id)
+        return usage
+
+    def _grow(self, usage: _ThreadUsage, added: int) -> None:
+        usage.bytes += added
+        self._bytes += added
+
+    def _writes_size(self, outer_key) -> int:
+        return sum(len(write[2][1]) for write in self.writes.get(outer_key, {}).values())
+
+    def _expire_idle(self, keep: str) -> None:
+        if self.idle_ttl_seconds is None:
+            return
+        deadline = time.monotonic() - self.idle_ttl_seconds
+        for thread_id, usage in list(self._usage.items()):
+            if usage.last_access > deadline:
+                break
+            if thread_id != keep:
+                self._evict(thread_id)
+
+    def _enforce_limits(self, keep: str) -> None:
+        while self._over_limit():
+            oldest = next(iter(self._usage))
+            if oldest == keep:
+                # Never evict the thread being written to
+                break
+            self._evict(oldest)
+
+    def _over_limit(self) -> bool:
+        if self.max_threads is not None and len(self._usage) > self.max_threads:
+            return True
+        if self.max_bytes is not None and self._bytes > self.max_bytes:
+            return True
+        return False
+
+    def _evict(self, thread_id: str) -> None:
+        if self.spill_dir:
+            self._spill(thread_id)
+        self._drop(thread_id)
+        self.evictions += 1
+
+    def _drop(self, thread_id: str) -> None:
+        """Remove a thread from memory using the tracked keys, without scanning other threads"""
+        usage = self._usage.pop(thread_id, None)
+        self.storage.pop(thread_id, None)
+        if usage is None:
+            return
+        for key in usage.write_keys:
+            self.writes.pop(key, None)
+        for key in usage.blob_keys:
+            self.blobs.pop(key, None)
+        self._bytes -= usage.bytes
+
+    def _spill(self, thread_id: str) -> None:
+        usage = self._usage[thread_id]
+        state = {
+            "storage": dict(self.storage.get(thread_id, {})),
+            "writes": {key: self.writes[key] for key in usage.write_keys if key in self.writes},
+            "blobs": {key: self.blobs[key] for key in usage.blob_keys if key in self.blobs},
+            "bytes": usage.bytes,
+        }
+        path = self._spill_path(thread_id)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "wb") as file:
+                pickle.dump(state, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+            self.spills += 1
+        except OSError as e:
+            logging.error(f"Failed to spill thread {thread_id} to {path}: {e}")
+
+    def _reload(self, thread_id: str, usage: _ThreadUsage) -> None:
+        path = self._spill_path(thread_id)
+        if not path or not os.path.exists(path):
+            return
+
+        try:
+            with open(path, "rb") as file:
+                state = pickle.load(file)
+        except (OSError, pickle.UnpicklingError) as e:
+            logging.error(f"Failed to reload thread {thread_id} from {path}: {e}")
+            return
+        os.remove(path)
+
+        for checkpoint_ns, checkpoints in state["storage"].items():
+            self.storage[thread_id][checkpoint_ns].update(checkpoints)
+        self.writes.update(state["writes"])
+        self.blobs.update(state["blobs"])
+        usage.write_keys.update(state["writes"])
+        usage.blob_keys.update(state["blobs"])
+        self._grow(usage, state["bytes"])
+        self.reloads += 1
+
+    def _is_spilled(self, thread_id: str) -> bool:
+        path = self._spill_path(thread_id)
+        return path is not None and os.path.exists(path)
+
+    @staticmethod
+    def _clear_spills(directory: str) -> None:
+        for path in glob.glob(os.path.join(directory, SPILL_PATTERN)):
+            os.remove(path)
+
+    def _spill_path(self, thread_id: str) -> Optional[str]:
+        if not self.spill_dir:
+            return None
+        digest = hashlib.sha256(thread_id.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.spill_dir, f"thread-{digest}.ckpt")
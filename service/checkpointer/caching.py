@@ -0,0 +1,204 @@
+import logging
+from typing import Any, Dict, Optional, Sequence
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from service.cache import LRUCache
+from .delegating import DelegatingCheckpointSaver
+from .write_behind import WriteBehindCheckpointSaver
+
+# Latest checkpoint id of a thread, and whether it has pending writes
+SELECT_HEAD = """
+    SELECT c.checkpoint_id,
+           EXISTS (
+               SELECT 1 FROM checkpoint_writes w
+               WHERE w.thread_id = c.thread_id AND w.checkpoint_ns = c.checkpoint_ns
+                 AND w.checkpoint_id = c.checkpoint_id
+           ) AS has_writes
+    FROM checkpoints c
+    WHERE c.thread_id = %s AND c.checkpoint_ns = %s
+    ORDER BY c.checkpoint_id DESC
+    LIMIT 1
+"""
+
+
+class CachingCheckpointSaver(DelegatingCheckpointSaver):
+    """Keeps the latest checkpoint of hot threads in memory, writing through to the inner store.
+
+    Entries are stored serialized, bounded by total bytes in an LRU, so a
+    cached checkpoint can't be mutated by later graph steps. Writes always go
+    to the inner store first; pending writes invalidate the cached entry.
+
+    Invalidation across instances:
+    - "validate": a hit is confirmed with an index-only lookup of the
+      thread's latest checkpoint id before being served, so a turn handled by
+      another instance is never missed (requires the Postgres backend). Over
+      write-behind, a thread with buffered writes is validated against the
+      buffer instead, which is newer than the store;
+    - "ttl": hits are trusted for `ttl_seconds`, for deployments with sticky
+      routing by thread_id.
+    """
+
+    def __init__(self, inner: BaseCheckpointSaver, max_bytes: int, ttl_seconds: Optional[float] = None,
+                 invalidation: str = "validate"):
+        super().__init__(inner)
+        self.cache = LRUCache(max_bytes=max_bytes, ttl_seconds=ttl_seconds)
+        self.invalidation = invalidation
+        self.write_behind = inner if isinstance(inner, WriteBehindCheckpointSaver) else None
+        self.stale = 0
+
+        if invalidation == "validate" and self.conn is None:
+            logging.warning("Checkpoint cache validation needs a Postgres backend, falling back to ttl invalidation")
+            self.invalidation = "ttl"
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        key = self._key(config)
+        entry = self.cache.get(key)
+        if entry is not None and self._matches(entry, config):
+            if self.invalidation != "validate" or self._is_current(entry, key):
+                return self._load(entry)
+
+        checkpoint_tuple = self.inner.get_tuple(config)
+        if checkpoint_tuple is not None and "checkpoint_id" not in config["configurable"]:
+            self._store(key, checkpoint_tuple)
+        return checkpoint_tuple
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        key = self._key(config)
+        entry = self.cache.get(key)
+        if entry is not None and self._matches(entry, config):
+            if self.invalidation != "validate" or await self._ais_current(entry, key):
+                return self._load(entry)
+
+        checkpoint_tuple = await self.inner.aget_tuple(config)
+        if checkpoint_tuple is not None and "checkpoint_id" not in config["configurable"]:
+            self._store(key, checkpoint_tuple)
+        return checkpoint_tuple
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        next_config = self.inner.put(config, checkpoint, metadata, new_versions)
+        self._store_put(config, next_config, checkpoint, metadata)
+        return next_config
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        next_config = await self.inner.aput(config, checkpoint, metadata, new_versions)
+        self._store_put(config, next_config, checkpoint, metadata)
+        return next_config
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        self.cache.delete(self._key(config))
+        self.inner.put_writes(config, writes, task_id, task_path)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        self.cache.delete(self._key(config))
+        await self.inner.aput_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._evict_thread(thread_id)
+        self.inner.delete_thread(thread_id)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        self._evict_thread(thread_id)
+        await self.inner.adelete_thread(thread_id)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        stats["stale"] = self.stale
+        stats["hit_ratio"] = round((stats["hits"] - self.stale) / lookups, 4) if lookups else 0.0
+        return stats
+
+    @staticmethod
+    def _key(config: RunnableConfig):
+        configurable = config["configurable"]
+        return configurable["thread_id"], configurable.get("checkpoint_ns", "")
+
+    @staticmethod
+    def _matches(entry, config: RunnableConfig) -> bool:
+        checkpoint_id = config["configurable"].get("checkpoint_id")
+        return checkpoint_id is None or checkpoint_id == entry["checkpoint_id"]
+
+    def _is_current(self, entry, key) -> bool:
+        head = self.write_behind.head(key) if self.write_behind is not None else None
+        if head is not None:
+            return self._check_head(entry, key, head)
+        with self.conn_for(key[0]).connection() as conn:
+            row = conn.execute(SELECT_HEAD, key).fetchone()
+        return self._check_head(entry, key, row)
+
+    async def _ais_current(self, entry, key) -> bool:
+        head = self.write_behind.head(key) if self.write_behind is not None else None
+        if head is not None:
+            return self._check_head(entry, key, head)
+        async with self.conn_for(key[0]).connection() as conn:
+            cursor = await conn.execute(SELECT_HEAD, key)
+            row = await cursor.fetchone()
+        return self._check_head(entry, key, row)
+
+    def _check_head(self, entry, key, row) -> bool:
+        if row is not None and row["checkpoint_id"] == entry["checkpoint_id"] and not row["has_writes"]:
+            return True
+        # Another instance moved the thread on (or left pending writes)
+        self.stale += 1
+        self.cache.delete(key)
+        return False
+
+    def _store(self, key, checkpoint_tuple: CheckpointTuple) -> None:
+        if checkpoint_tuple.pending_writes:
+            return
+        self._store_entry(
+            key,
+            checkpoint_tuple.config,
+            checkpoint_tuple.checkpoint,
+            checkpoint_tuple.metadata,
+            checkpoint_tuple.parent_config,
+        )
+
+    def _store_put(self, config: RunnableConfig, next_config: RunnableConfig, checkpoint: Checkpoint,
+                   metadata: CheckpointMetadata) -> None:
+        parent_config = None
+        if config["configurable"].get("checkpoint_id"):
+            thread_id, checkpoint_ns = self._key(config)
+            parent_config = {
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": config["configurable"]["checkpoint_id"],
+                }
+            }
+        self._store_entry(self._key(next_config), next_config, checkpoint, metadata, parent_config)
+
+    def _store_entry(self, key, config, checkpoint, metadata, parent_config) -> None:
+        typed_checkpoint = self.serde.dumps_typed(checkpoint)
+        typed_metadata = self.serde.dumps_typed(metadata)
+        entry = {
+            "checkpoint_id": config["configurable"]["checkpoint_id"],
+            "config": config,
+            "parent_config": parent_config,
+            "checkpoint": typed_checkpoint,
+            "metadata": typed_metadata,
+        }
+        self.cache.set(key, entry, size=len(typed_checkpoint[1]) + len(typed_metadata[1]))
+
+    def _load(self, entry) -> CheckpointTuple:
+        return CheckpointTuple(
+            config=entry["config"],
+            checkpoint=self.serde.loads_typed(entry["checkpoint"]),
+            metadata=self.serde.loads_typed(entry["metadata"]),
+            parent_config=entry["parent_config"],
+            pending_writes=[],
+        )
+
+    def _evict_thread(self, thread_id: str) -> None:
+        for key in self.cache.keys():
+            if key[0] == thread_id:
+                self.cache.delete(key)
@@ -1,9 +1,27 @@
 import logging
+from dataclasses import replace
 from langgraph.checkpoint.memory import MemorySaver
-from service.config import Config
+from service.config import Config, ConfigLoader, PostgresShardConfig
+from service.metrics import get_metrics
+from .bounded_memory import BoundedMemorySaver
+from .caching import CachingCheckpointSaver
+from .instrumented import InstrumentedCheckpointSaver
+from .serializer import create_serializer
+from .sharding import ShardedCheckpointSaver
+from .sqlite import SqliteCheckpointSaver, SqliteConnectionPool
+from .write_behind import WriteBehindCheckpointSaver
+from .postgres_pool import (
+    POOL_AVAILABLE,
+    create_async_connection_pool,
+    create_connection_pool,
+    get_pool_stats,
+    is_async_connection_pool,
+    is_connection_pool,
+)
 
 try:
     from langgraph.checkpoint.postgres import PostgresSaver
+    from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
     POSTGRES_AVAILABLE = True
 except ImportError:
     POSTGRES_AVAILABLE = False
@@ -21,43 +39,463 @@ class CheckpointerFactory:
             # Auto mode: use debug flag to decide
             if config.app.debug:
                 logging.info("Using MemorySaver (DEBUG mode)")
-                return MemorySaver()
+                return CheckpointerFactory._create_memory_saver(config)
             else:
                 logging.info("Using PostgresSaver (production mode)")
                 return CheckpointerFactory._create_postgres_saver(config)
         elif checkpoint_type == "memory":
             logging.info("Using MemorySaver (configured)")
-            return MemorySaver()
+            return CheckpointerFactory._create_memory_saver(config)
         elif checkpoint_type == "postgres":
             logging.info("Using PostgresSaver (configured)")
             return CheckpointerFactory._create_postgres_saver(config)
+        elif checkpoint_type == "sqlite":
+            logging.info(f"Using SqliteCheckpointSaver ({config.checkpoint.sqlite.path})")
+            return CheckpointerFactory._create_sqlite_saver(config)
         else:
             logging.warning(f"Unknown checkpoint type: {checkpoint_type}, falling back to MemorySaver")
-            return MemorySaver()
+            return CheckpointerFactory._create_memory_saver(config)
+
+    @staticmethod
+    async def acreate(config: Config):
+        """Create checkpointer for the async serving mode.
+
+        Must be awaited from the event loop that serves requests, since the
+        async connection pool is bound to it.
+        """
+        checkpoint_type = config.checkpoint.type
+
+        if checkpoint_type == "postgres" or (checkpoint_type == "auto" and not config.app.debug):
+            logging.info("Using AsyncPostgresSaver")
+            return await CheckpointerFactory._create_async_postgres_saver(config)
+
+        # MemorySaver and SqliteCheckpointSaver support both sync and async access
+        return CheckpointerFactory.create(config)
+
+    @staticmethod
+    def _create_memory_saver(config: Config):
+        """Create MemorySaver, bounded if memory limits are configured"""
+        memory = config.checkpoint.memory
+        serde = create_serializer(config.checkpoint.serializer)
+        if not (memory.max_bytes or memory.max_threads or memory.idle_ttl_seconds):
+            return CheckpointerFactory._instrument(MemorySaver(serde=serde), config)
+
+        logging.info(f"Bounding MemorySaver: max_bytes={memory.max_bytes}, max_threads={memory.max_threads}, "
+                     f"idle_ttl={memory.idle_ttl_seconds}s, spill_dir={memory.spill_dir}")
+        checkpointer = BoundedMemorySaver(
+            max_bytes=memory.max_bytes,
+            max_threads=memory.max_threads,
+            idle_ttl_seconds=memory.idle_ttl_seconds,
+            spill_dir=memory.spill_dir,
+            serde=serde,
+        )
+        return CheckpointerFactory._instrument(checkpointer, config)
+
+    @staticmethod
+    def _create_sqlite_saver(config: Config):
+        """Create SqliteCheckpointSaver or fallback to MemorySaver"""
+        try:
+            pool = SqliteConnectionPool(config.checkpoint.sqlite)
+        except Exception as e:
+            logging.error(f"Failed to open SQLite database {config.checkpoint.sqlite.path}: {e}, falling back to MemorySaver")
+            return CheckpointerFactory._create_memory_saver(config)
+
+        try:
+            checkpointer = SqliteCheckpointSaver(pool, serde=create_serializer(config.checkpoint.serializer))
+            checkpointer.setup()
+            return CheckpointerFactory._start(CheckpointerFactory._wrap(checkpointer, config))
+        except Exception as e:
+            pool.close()
+            logging.error(f"Failed to set up SQLite checkpointer: {e}, falling back to MemorySaver")
+            return CheckpointerFactory._create_memory_saver(config)
 
     @staticmethod
     def _create_postgres_saver(config: Config):
-        """Create PostgresSaver or fallback to MemorySaver"""
-        if not POSTGRES_AVAILABLE:
+        """Create pooled PostgresSaver or fallback to MemorySaver"""
+        if config.checkpoint.postgres.shards:
+            return CheckpointerFactory._create_sharded_saver(config)
+
+        if not POSTGRES_AVAILABLE or not POOL_AVAILABLE:
             logging.warning("PostgresSaver not available, falling back to MemorySaver")
-            return MemorySaver()
+            return CheckpointerFactory._create_memory_saver(config)
 
         # Get connection string from config
-        from service.config import ConfigLoader
-        config_loader = ConfigLoader()
-        config_loader.load()  # Ensure config is loaded
-        connection_string = config_loader.get_postgres_connection_string()
+        connection_string = ConfigLoader.build_postgres_connection_string(config.checkpoint.postgres)
 
         if not connection_string:
             logging.warning("PostgreSQL configuration incomplete, falling back to MemorySaver")
-            return MemorySaver()
+            return CheckpointerFactory._create_memory_saver(config)
 
         try:
-            logging.info("Using PostgresSaver (production mode)")
-            return PostgresSaver.from_conn_string(connection_string) # type: ignore
+            pool = create_connection_pool(config.checkpoint.postgres, connection_string)
         except Exception as e:
             logging.error(f"Failed to connect to PostgreSQL: {e}, falling back to MemorySaver")
-            return MemorySaver()
+            return CheckpointerFactory._create_memory_saver(config)
+
+        try:
+            checkpointer = PostgresSaver(pool, serde=create_serializer(config.checkpoint.serializer)) # type: ignore
+            checkpointer.setup()
+            return CheckpointerFactory._start(CheckpointerFactory._wrap(checkpointer, config))
+        except Exception as e:
+            pool.close()
+            logging.error(f"Failed to set up PostgreSQL checkpointer: {e}, falling back to MemorySaver")
+            return CheckpointerFactory._create_memory_saver(config)
+
+    @staticmethod
+    async def _create_async_postgres_saver(config: Config):
+        """Create pooled AsyncPostgresSaver or fallback to MemorySaver"""
+        if config.checkpoint.postgres.shards:
+            return await CheckpointerFactory._create_async_sharded_saver(config)
+
+        if not POSTGRES_AVAILABLE or not POOL_AVAILABLE:
+            logging.warning("AsyncPostgresSaver not available, falling back to MemorySaver")
+            return CheckpointerFactory._create_memory_saver(config)
+
+        connection_string = ConfigLoader.build_postgres_connection_string(config.checkpoint.postgres)
+
+        if not connection_string:
+            logging.warning("PostgreSQL configuration incomplete, falling back to MemorySaver")
+            return CheckpointerFactory._create_memory_saver(config)
+
+        try:
+            pool = await create_async_connection_pool(config.checkpoint.postgres, connection_string)
+        except Exception as e:
+            logging.error(f"Failed to connect to PostgreSQL: {e}, falling back to MemorySaver")
+            return CheckpointerFactory._create_memory_saver(config)
+
+        try:
+            checkpointer = AsyncPostgresSaver(pool, serde=create_serializer(config.checkpoint.serializer)) # type: ignore
+            await checkpointer.setup()
+            checkpointer = CheckpointerFactory._wrap(checkpointer, config)
+            write_behind = CheckpointerFactory._find(checkpointer, WriteBehindCheckpointSaver)
+            if write_behind is not None:
+                await write_behind.astart()
+            return checkpointer
+        except Exception as e:
+            await pool.close()
+            logging.error(f"Failed to set up PostgreSQL checkpointer: {e}, falling back to MemorySaver")
+            return CheckpointerFactory._create_memory_saver(config)
+
+    @staticmethod
+    def create_shards(config: Config) -> ShardedCheckpointSaver:
+        """Open every shard of checkpoint.postgres.shards; raises if one can't be set up"""
+        serde = create_serializer(config.checkpoint.serializer)
+        shards = {}
+        try:
+            for shard in ConfigLoader.build_postgres_shards(config.checkpoint.postgres):
+                shards[shard.name] = CheckpointerFactory._open_shard(shard, config, serde)
+        except Exception:
+            for checkpointer in shards.values():
+                CheckpointerFactory.close(checkpointer)
+            raise
+        return CheckpointerFactory._sharded(shards, config)
+
+    @staticmethod
+    async def acreate_shards(config: Config) -> ShardedCheckpointSaver:
+        """Async variant of create_shards: Postgres shards get async connection pools"""
+        serde = create_serializer(config.checkpoint.serializer)
+        shards = {}
+        try:
+            for shard in ConfigLoader.build_postgres_shards(config.checkpoint.postgres):
+                shards[shard.name] = await CheckpointerFactory._aopen_shard(shard, config, serde)
+        except Exception:
+            for checkpointer in shards.values():
+                await CheckpointerFactory.aclose(checkpointer)
+            raise
+        return CheckpointerFactory._sharded(shards, config)
+
+    @staticmethod
+    def _open_shard(shard: PostgresShardConfig, config: Config, serde):
+        if shard.sqlite_path:
+            return CheckpointerFactory._open_sqlite_shard(shard, config, serde)
+
+        pool = create_connection_pool(shard.postgres, CheckpointerFactory._shard_connection_string(shard))
+        try:
+            checkpointer = PostgresSaver(pool, serde=serde) # type: ignore
+            checkpointer.setup()
+        except Exception:
+            pool.close()
+            raise
+        return checkpointer
+
+    @staticmethod
+    async def _aopen_shard(shard: PostgresShardConfig, config: Config, serde):
+        if shard.sqlite_path:
+            return CheckpointerFactory._open_sqlite_shard(shard, config, serde)
+
+        pool = await create_async_connection_pool(shard.postgres, CheckpointerFactory._shard_connection_string(shard))
+        try:
+            checkpointer = AsyncPostgresSaver(pool, serde=serde) # type: ignore
+            await checkpointer.setup()
+        except Exception:
+            await pool.close()
+            raise
+        return checkpointer
+
+    @staticmethod
+    def _open_sqlite_shard(shard: PostgresShardConfig, config: Config, serde):
+        """Local stand-in for a Postgres shard"""
+        pool = SqliteConnectionPool(replace(config.checkpoint.sqlite, path=shard.sqlite_path))
+        try:
+            checkpointer = SqliteCheckpointSaver(pool, serde=serde)
+            checkpointer.setup()
+        except Exception:
+            pool.close()
+            raise
+        return checkpointer
+
+    @staticmethod
+    def _shard_connection_string(shard: PostgresShardConfig) -> str:
+        if not POSTGRES_AVAILABLE or not POOL_AVAILABLE:
+            raise RuntimeError("PostgresSaver not available")
+        connection_string = ConfigLoader.build_postgres_connection_string(shard.postgres)
+        if not connection_string:
+            raise RuntimeError(f"PostgreSQL configuration incomplete for shard {shard.name}")
+        return connection_string
+
+    @staticmethod
+    def _sharded(shards, config: Config) -> ShardedCheckpointSaver:
+        joining = [shard.name for shard in ConfigLoader.build_postgres_shards(config.checkpoint.postgres)
+                   if shard.joining]
+        return ShardedCheckpointSaver(shards, joining, config.checkpoint.postgres.virtual_nodes, get_metrics(config))
+
+    @staticmethod
+    def _create_sharded_saver(config: Config):
+        """Create ShardedCheckpointSaver or fallback to MemorySaver"""
+        try:
+            checkpointer = CheckpointerFactory.create_shards(config)
+        except Exception as e:
+            logging.error(f"Failed to open checkpoint shards: {e}, falling back to MemorySaver")
+            return CheckpointerFactory._create_memory_saver(config)
+
+        CheckpointerFactory._log_shards(checkpointer)
+        try:
+            return CheckpointerFactory._start(CheckpointerFactory._wrap(checkpointer, config))
+        except Exception as e:
+            CheckpointerFactory.close(checkpointer)
+            logging.error(f"Failed to set up sharded checkpointer: {e}, falling back to MemorySaver")
+            return CheckpointerFactory._create_memory_saver(config)
+
+    @staticmethod
+    async def _create_async_sharded_saver(config: Config):
+        """Create ShardedCheckpointSaver over async shards or fallback to MemorySaver"""
+        try:
+            checkpointer = await CheckpointerFactory.acreate_shards(config)
+        except Exception as e:
+            logging.error(f"Failed to open checkpoint shards: {e}, falling back to MemorySaver")
+            return CheckpointerFactory._create_memory_saver(config)
+
+        CheckpointerFactory._log_shards(checkpointer)
+        try:
+            checkpointer = CheckpointerFactory._wrap(checkpointer, config)
+            write_behind = CheckpointerFactory._find(checkpointer, WriteBehindCheckpointSaver)
+            if write_behind is not None:
+                await write_behind.astart()
+            return checkpointer
+        except Exception as e:
+            await CheckpointerFactory.aclose(checkpointer)
+            logging.error(f"Failed to set up sharded checkpointer: {e}, falling back to MemorySaver")
+            return CheckpointerFactory._create_memory_saver(config)
+
+    @staticmethod
+    def _log_shards(sharded: ShardedCheckpointSaver) -> None:
+        shards = ", ".join(f"{name} (joining)" if name in sharded.joining else name for name in sharded.shards)
+        logging.info(f"Sharding checkpoints by thread_id across {shards}")
+
+    @staticmethod
+    def _wrap(checkpointer, config: Config):
+        """Add the configured layers on top of a storage backend"""
+        write_behind = config.checkpoint.write_behind
+        if write_behind.enabled:
+            logging.info(f"Buffering checkpoint writes ({write_behind.durability} durability, "
+                         f"group commit every {write_behind.flush_interval_ms}ms or {write_behind.max_batch} writes)")
+            checkpointer = WriteBehindCheckpointSaver(
+                checkpointer,
+                durability=write_behind.durability,
+                journal_dir=write_behind.journal_dir,
+                flush_interval=write_behind.flush_interval_ms / 1000,
+                max_batch=write_behind.max_batch,
+                max_pending=write_behind.max_pending,
+                max_attempts=write_behind.max_attempts,
+                metrics=get_metrics(config),
+            )
+
+        cache = config.checkpoint.cache
+        if cache.enabled:
+            logging.info(f"Caching checkpoints in memory (max {cache.max_bytes} bytes, {cache.invalidation} invalidation)")
+            checkpointer = CachingCheckpointSaver(checkpointer, cache.max_bytes, cache.ttl_seconds, cache.invalidation)
+        return CheckpointerFactory._instrument(checkpointer, config)
+
+    @staticmethod
+    def _start(checkpointer):
+        """Start the background flusher of a write-behind layer, if any"""
+        write_behind = CheckpointerFactory._find(checkpointer, WriteBehindCheckpointSaver)
+        if write_behind is not None:
+            write_behind.start()
+        return checkpointer
+
+    @staticmethod
+    def _instrument(checkpointer, config: Config):
+        """Record checkpoint metrics as seen by the graph (cache hits included)"""
+        metrics = get_metrics(config)
+        if metrics is None:
+            return checkpointer
+        return InstrumentedCheckpointSaver(checkpointer, metrics)
+
+    @staticmethod
+    def _find(checkpointer, saver_class):
+        """Find a layer of the given class in a stack of wrapped checkpointers"""
+        while checkpointer is not None:
+            if isinstance(checkpointer, saver_class):
+                return checkpointer
+            checkpointer = getattr(checkpointer, "inner", None)
+        return None
+
+    @staticmethod
+    def get_cache_stats(checkpointer):
+        """Get checkpoint cache statistics, or None if checkpoints are not cached"""
+        cache = CheckpointerFactory._find(checkpointer, CachingCheckpointSaver)
+        return cache.stats() if cache else None
+
+    @staticmethod
+    def get_memory_stats(checkpointer):
+        """Get bounded MemorySaver statistics, or None if memory is not bounded"""
+        memory = CheckpointerFactory._find(checkpointer, BoundedMemorySaver)
+        return memory.stats() if memory else None
+
+    @staticmethod
+    def get_write_behind(checkpointer):
+        """Get the write-behind layer, or None if checkpoint writes are not buffered"""
+        return CheckpointerFactory._find(checkpointer, WriteBehindCheckpointSaver)
+
+    @staticmethod
+    def get_write_behind_stats(checkpointer):
+        """Get write-behind buffer statistics, or None if checkpoint writes are not buffered"""
+        write_behind = CheckpointerFactory._find(checkpointer, WriteBehindCheckpointSaver)
+        return write_behind.stats() if write_behind else None
+
+    @staticmethod
+    def get_shard_stats(checkpointer):
+        """Get shard routing statistics, or None if checkpoints are not sharded"""
+        sharded = CheckpointerFactory._find(checkpointer, ShardedCheckpointSaver)
+        return sharded.stats() if sharded else None
+
+    @staticmethod
+    def publish_stats(checkpointer, metrics) -> None:
+        """Publish the checkpointer's layer and connection pool statistics on /metrics, refreshed at every scrape"""
+        if metrics is None:
+            return
+
+        def publish():
+            layers = {
+                "cache": CheckpointerFactory.get_cache_stats(checkpointer),
+                "memory": CheckpointerFactory.get_memory_stats(checkpointer),
+                "write_behind": CheckpointerFactory.get_write_behind_stats(checkpointer),
+                "sharding": CheckpointerFactory.get_shard_stats(checkpointer),
+            }
+            for layer, stats in layers.items():
+                for stat, value in (stats or {}).items():
+                    if isinstance(value, (list, tuple, set)):
+                        value = len(value)
+                    if isinstance(value, (int, float)):
+                        metrics.checkpoint_stats.labels(layer=layer, stat=stat).set(value)
+
+            pools = CheckpointerFactory.get_pool_stats(checkpointer)
+            if CheckpointerFactory._find(checkpointer, ShardedCheckpointSaver) is None:
+                pools = {"default": pools}
+            for shard, stats in (pools or {}).items():
+                for stat, value in (stats or {}).items():
+                    metrics.pool_stats.labels(shard=shard, stat=stat).set(value)
+
+        metrics.on_scrape("checkpointer", publish)
+
+    @staticmethod
+    def get_connection_pool(checkpointer):
+        """Get the checkpointer's connection pool, so other components can share it"""
+        conn = getattr(checkpointer, "conn", None)
+        return conn if is_connection_pool(conn) else None
+
+    @staticmethod
+    def get_pool_stats(checkpointer):
+        """Get connection pool statistics, or None if the checkpointer is not pooled (per shard when sharded)"""
+        sharded = CheckpointerFactory._find(checkpointer, ShardedCheckpointSaver)
+        if sharded is not None:
+            return {name: CheckpointerFactory.get_pool_stats(shard) for name, shard in sharded.shards.items()}
+        sqlite = CheckpointerFactory._find(checkpointer, SqliteCheckpointSaver)
+        if sqlite is not None:
+            return sqlite.pool.stats()
+        return get_pool_stats(getattr(checkpointer, "conn", None))
+
+    @staticmethod
+    def close(checkpointer):
+        """Release resources held by the checkpointer, committing buffered writes first"""
+        write_behind = CheckpointerFactory._find(checkpointer, WriteBehindCheckpointSaver)
+        if write_behind is not None:
+            write_behind.close()
+        sharded = CheckpointerFactory._find(checkpointer, ShardedCheckpointSaver)
+        if sharded is not None:
+            for shard in sharded.shards.values():
+                CheckpointerFactory.close(shard)
+            return
+        sqlite = CheckpointerFactory._find(checkpointer, SqliteCheckpointSaver)
+        if sqlite is not None:
+            sqlite.pool.close()
+        conn = getattr(checkpointer, "conn", None)
+        if is_connection_pool(conn) and not is_async_connection_pool(conn):
+            conn.close()
+
+    @staticmethod
+    async def aclose(checkpointer):
+        """Release resources held by an async checkpointer"""
+        write_behind = CheckpointerFactory._find(checkpointer, WriteBehindCheckpointSaver)
+        if write_behind is not None:
+            await write_behind.aclose()
+        sharded = CheckpointerFactory._find(checkpointer, ShardedCheckpointSaver)
+        if sharded is not None:
+            for shard in sharded.shards.values():
+                await CheckpointerFactory.aclose(shard)
+            return
+        conn = getattr(checkpointer, "conn", None)
+        if is_async_connection_pool(conn):
+            await conn.close()
+        else:
+            CheckpointerFactory.close(checkpointer)
+
+    @staticmethod
+    def check(checkpointer):
+        """Verify that the checkpoint store is reachable (every shard); raises if it is not"""
+        sharded = CheckpointerFactory._find(checkpointer, ShardedCheckpointSaver)
+        if sharded is not None:
+            for shard in sharded.shards.values():
+                CheckpointerFactory.check(shard)
+            return
+
+        sqlite = CheckpointerFactory._find(checkpointer, SqliteCheckpointSaver)
+        if sqlite is not None:
+            with sqlite.pool.connection() as conn:
+                conn.execute("SELECT 1").fetchone()
+            return
+
+        conn = getattr(checkpointer, "conn", None)
+        if is_connection_pool(conn) and not is_async_connection_pool(conn):
+            with conn.connection() as connection:
+                connection.execute("SELECT 1")
+
+    @staticmethod
+    async def acheck(checkpointer):
+        """Async variant of check"""
+        sharded = CheckpointerFactory._find(checkpointer, ShardedCheckpointSaver)
+        if sharded is not None:
+            for shard in sharded.shards.values():
+                await CheckpointerFactory.acheck(shard)
+            return
+
+        conn = getattr(checkpointer, "conn", None)
+        if is_async_connection_pool(conn):
+            async with conn.connection() as connection:
+                await connection.execute("SELECT 1")
+        else:
+            CheckpointerFactory.check(checkpointer)
 
     @staticmethod
     def is_postgres_available():
@@ -68,15 +506,15 @@ class CheckpointerFactory:
     def get_checkpointer_type(config: Config):
         """Get the type of checkpointer that would be created"""
         checkpoint_type = config.checkpoint.type
+        shards = config.checkpoint.postgres.shards
+        if shards and (checkpoint_type == "postgres" or (checkpoint_type == "auto" and not config.app.debug)):
+            return f"ShardedCheckpointSaver ({len(shards)} shards)"
 
         if checkpoint_type == "auto":
             if config.app.debug:
                 return "MemorySaver (debug)"
             elif POSTGRES_AVAILABLE:
-                from service.config import ConfigLoader
-                config_loader = ConfigLoader()
-                config_loader.load()  # Ensure config is loaded
-                if config_loader.get_postgres_connection_string():
+                if ConfigLoader.build_postgres_connection_string(config.checkpoint.postgres):
                     return "PostgresSaver (auto)"
                 else:
                     return "MemorySaver (fallback)"
@@ -89,5 +527,7 @@ class CheckpointerFactory:
                 return "PostgresSaver (configured)"
             else:
                 return "MemorySaver (postgres unavailable)"
+        elif checkpoint_type == "sqlite":
+            return "SqliteCheckpointSaver (configured)"
         else:
             return "MemorySaver (unknown type)"
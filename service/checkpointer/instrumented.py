@@ -0,0 +1,47 @@
+from typing import Any, Optional, Sequence
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from service.metrics import Metrics
+from .delegating import DelegatingCheckpointSaver
+
+
+class InstrumentedCheckpointSaver(DelegatingCheckpointSaver):
+    """Records latency, in-flight and error metrics for checkpoint reads and writes"""
+
+    def __init__(self, inner: BaseCheckpointSaver, metrics: Metrics):
+        super().__init__(inner)
+        self.metrics = metrics
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        with self.metrics.checkpoint("get"):
+            return self.inner.get_tuple(config)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        with self.metrics.checkpoint("get"):
+            return await self.inner.aget_tuple(config)
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        with self.metrics.checkpoint("put"):
+            return self.inner.put(config, checkpoint, metadata, new_versions)
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        with self.metrics.checkpoint("put"):
+            return await self.inner.aput(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        with self.metrics.checkpoint("put_writes"):
+            self.inner.put_writes(config, writes, task_id, task_path)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        with self.metrics.checkpoint("put_writes"):
+            await self.inner.aput_writes(config, writes, task_id, task_path)
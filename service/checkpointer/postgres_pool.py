@@ -0,0 +1,121 @@
+import logging
+from typing import Any, Dict, Optional
+from service.config import PostgresConfig
+
+try:
+    from psycopg.rows import dict_row
+    from psycopg_pool import AsyncConnectionPool, ConnectionPool
+    POOL_AVAILABLE = True
+except ImportError:
+    POOL_AVAILABLE = False
+
+
+# Connection settings required by PostgresSaver
+CONNECTION_KWARGS = {
+    "autocommit": True,
+    "prepare_threshold": 0,
+    "row_factory": dict_row if POOL_AVAILABLE else None,
+}
+
+
+def create_connection_pool(postgres: PostgresConfig, connection_string: str, name: str = "checkpoint") -> "ConnectionPool":
+    """Create and warm up a connection pool sized from the postgres config.
+
+    The pool keeps `pool_size` connections open and grows up to
+    `pool_size + max_overflow` under load. Connections are checked before
+    being handed out, so connections dropped by the server are replaced
+    transparently instead of failing a request.
+    """
+    if not POOL_AVAILABLE:
+        raise RuntimeError("psycopg_pool is not installed")
+
+    pool = ConnectionPool(
+        conninfo=connection_string,
+        min_size=postgres.pool_size,
+        max_size=postgres.pool_size + postgres.max_overflow,
+        timeout=postgres.pool_timeout,
+        max_idle=postgres.pool_max_idle,
+        check=ConnectionPool.check_connection,
+        kwargs=CONNECTION_KWARGS,
+        name=name,
+        open=False,
+    )
+
+    # Warm up: block until the minimum number of connections is established
+    try:
+        pool.open(wait=True, timeout=postgres.pool_timeout)
+    except Exception:
+        pool.close()
+        raise
+
+    logging.info(
+        f"PostgreSQL {name} pool ready: min_size={postgres.pool_size}, "
+        f"max_size={postgres.pool_size + postgres.max_overflow}"
+    )
+    return pool
+
+
+async def create_async_connection_pool(postgres: PostgresConfig, connection_string: str,
+                                       name: str = "checkpoint-async") -> "AsyncConnectionPool":
+    """Create and warm up an asyncio connection pool sized from the postgres config.
+
+    Must be awaited from the event loop that will use the pool.
+    """
+    if not POOL_AVAILABLE:
+        raise RuntimeError("psycopg_pool is not installed")
+
+    pool = AsyncConnectionPool(
+        conninfo=connection_string,
+        min_size=postgres.pool_size,
+        max_size=postgres.pool_size + postgres.max_overflow,
+        timeout=postgres.pool_timeout,
+        max_idle=postgres.pool_max_idle,
+        check=AsyncConnectionPool.check_connection,
+        kwargs=CONNECTION_KWARGS,
+        name=name,
+        open=False,
+    )
+
+    try:
+        await pool.open(wait=True, timeout=postgres.pool_timeout)
+    except Exception:
+        await pool.close()
+        raise
+
+    logging.info(
+        f"PostgreSQL {name} pool ready: min_size={postgres.pool_size}, "
+        f"max_size={postgres.pool_size + postgres.max_overflow}"
+    )
+    return pool
+
+
+def is_connection_pool(conn: Any) -> bool:
+    """Check whether the given connection object is a connection pool"""
+    return POOL_AVAILABLE and isinstance(conn, (ConnectionPool, AsyncConnectionPool))
+
+
+def is_async_connection_pool(conn: Any) -> bool:
+    """Check whether the given connection object is an asyncio connection pool"""
+    return POOL_AVAILABLE and isinstance(conn, AsyncConnectionPool)
+
+
+def get_pool_stats(pool: Any) -> Optional[Dict[str, int]]:
+    """Return a summary of the pool usage statistics"""
+    if not is_connection_pool(pool):
+        return None
+
+    stats = pool.get_stats()
+    size = stats.get("pool_size", 0)
+    available = stats.get("pool_available", 0)
+    return {
+        "min_size": stats.get("pool_min", 0),
+        "max_size": stats.get("pool_max", 0),
+        "size": size,
+        "available": available,
+        "in_use": size - available,
+        "waiting": stats.get("requests_waiting", 0),
+        "requests": stats.get("requests_num", 0),
+        "timeouts": stats.get("requests_timeouts", 0),
+        "errors": stats.get("requests_errors", 0),
+        "connections_lost": stats.get("connections_lost", 0),
+    }
@@ -0,0 +1,130 @@
+"""Move checkpoint threads to the shard that owns them on the hash ring.
+
+Adding a shard online:
+1. add it to checkpoint.postgres.shards with `joining: true` and roll the
+   config out to every instance; threads the new shard takes over are
+   moved to it whenever they are accessed while the old shard holds them;
+2. run `python -m service.checkpointer.rebalance` to move the other ones;
+3. once it reports nothing left to move, drop `joining: true` and roll out.
+
+Threads are moved one at a time (copied, then deleted from their old
+shard), so the tool can be interrupted and run again at any point.
+"""
+import sys
+import time
+import logging
+import argparse
+from typing import Dict, Iterator
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from service.config import ConfigLoader
+from .checkpointer_factory import CheckpointerFactory
+from .postgres_pool import is_connection_pool
+from .sharding import ShardedCheckpointSaver
+from .sqlite import SqliteCheckpointSaver
+
+try:
+    from langgraph.checkpoint.postgres import PostgresSaver
+    POSTGRES_AVAILABLE = True
+except ImportError:
+    POSTGRES_AVAILABLE = False
+
+# Thread ids of a Postgres shard, in pages (keyset pagination)
+SELECT_THREAD_IDS = """
+    SELECT DISTINCT thread_id FROM checkpoints
+    WHERE thread_id > %s
+    ORDER BY thread_id
+    LIMIT %s
+"""
+
+
+def thread_ids(checkpointer: BaseCheckpointSaver, batch_size: int = 1000) -> Iterator[str]:
+    """Ids of the threads stored by a checkpointer"""
+    if POSTGRES_AVAILABLE and isinstance(checkpointer, PostgresSaver) and is_connection_pool(checkpointer.conn):
+        last = ""
+        while True:
+            with checkpointer.conn.connection() as conn:
+                rows = conn.execute(SELECT_THREAD_IDS, (last, batch_size)).fetchall()
+            for row in rows:
+                yield row["thread_id"]
+            if len(rows) < batch_size:
+                return
+            last = rows[-1]["thread_id"]
+    elif isinstance(checkpointer, SqliteCheckpointSaver):
+        with checkpointer.pool.connection() as conn:
+            rows = conn.execute("SELECT DISTINCT thread_id FROM checkpoints ORDER BY thread_id").fetchall()
+        yield from (row[0] for row in rows)
+    else:
+        yield from sorted({item.config["configurable"]["thread_id"] for item in checkpointer.list(None)})
+
+
+class ShardRebalancer:
+    """Finds threads stored on a shard other than their owner and moves them"""
+
+    def __init__(self, sharded: ShardedCheckpointSaver, dry_run: bool = False, pause: float = 0.0,
+                 batch_size: int = 1000):
+        self.sharded = sharded
+        self.dry_run = dry_run
+        self.pause = pause
+        self.batch_size = batch_size
+
+    def run(self) -> Dict[str, int]:
+        """One pass over every shard; returns counts of scanned, misplaced, moved and failed threads"""
+        report = {"scanned": 0, "misplaced": 0, "moved": 0, "checkpoints": 0, "failed": 0}
+        started = time.monotonic()
+
+        for name, shard in self.sharded.shards.items():
+            for thread_id in thread_ids(shard, self.batch_size):
+                report["scanned"] += 1
+                owner = self.sharded.owner(thread_id)
+                if owner == name:
+                    continue
+                report["misplaced"] += 1
+                if self.dry_run:
+                    logging.info(f"Would move thread {thread_id} from shard {name} to {owner}")
+                    continue
+
+                try:
+                    report["checkpoints"] += self.sharded.move_thread(thread_id, name)
+                    report["moved"] += 1
+                except Exception as e:
+                    report["failed"] += 1
+                    logging.error(f"Failed to move thread {thread_id} from shard {name} to {owner}: {e}")
+                if self.pause:
+                    time.sleep(self.pause)
+
+        report["seconds"] = round(time.monotonic() - started, 3)
+        logging.info(f"Shard rebalance: {report}")
+        return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Move checkpoint threads to their shard after adding one")
+    parser.add_argument("--config", default="config/config.yaml", help="path to config.yaml")
+    parser.add_argument("--dry-run", action="store_true", help="only count the threads that would move")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between moves, to limit load")
+    parser.add_argument("--batch-size", type=int, default=1000, help="thread ids read per query")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    config = ConfigLoader(args.config).load()
+    if not config.checkpoint.postgres.shards:
+        print("checkpoint.postgres.shards is not set, nothing to rebalance")
+        return 1
+
+    sharded = CheckpointerFactory.create_shards(config)
+    try:
+        report = ShardRebalancer(sharded, args.dry_run, args.pause, args.batch_size).run()
+    finally:
+        CheckpointerFactory.close(sharded)
+
+    verb = "would move" if args.dry_run else "moved"
+    count = report["misplaced"] if args.dry_run else report["moved"]
+    print(f"scanned {report['scanned']} threads, {verb} {count} ({report['checkpoints']} checkpoints), "
+          f"{report['failed']} failed in {report['seconds']}s")
+    if not args.dry_run and not report["failed"] and sharded.joining:
+        print(f"nothing left to move: {', '.join(sorted(sharded.joining))} can stop being marked joining")
+    return 1 if report["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+import os
+import sys
+import time
+import logging
+import argparse
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from service.config import Config, ConfigLoader, PostgresConfig, PostgresShardConfig, RetentionConfig
+
+try:
+    import psycopg
+    from psycopg.rows import dict_row
+    PSYCOPG_AVAILABLE = True
+except ImportError:
+    PSYCOPG_AVAILABLE = False
+
+
+MIGRATION_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "migrations", "002_checkpoint_retention.sql"
+)
+
+# Only one instance prunes at a time
+RETENTION_LOCK_KEY = 7358201946
+
+# Threads with more checkpoints than we keep
+SELECT_OVERFULL_THREADS = """
+    SELECT thread_id, checkpoint_ns
+    FROM checkpoints
+    GROUP BY thread_id, checkpoint_ns
+    HAVING count(*) > %(keep)s
+"""
+
+# checkpoint_id of the N-th newest checkpoint of a thread
+SELECT_CUTOFF = """
+    SELECT checkpoint_id
+    FROM checkpoints
+    WHERE thread_id = %(thread_id)s AND checkpoint_ns = %(checkpoint_ns)s
+    ORDER BY checkpoint_id DESC
+    OFFSET %(offset)s LIMIT 1
+"""
+
+DELETE_OLD_CHECKPOINTS = """
+    DELETE FROM checkpoints
+    WHERE ctid IN (
+        SELECT ctid FROM checkpoints
+        WHERE thread_id = %(thread_id)s AND checkpoint_ns = %(checkpoint_ns)s AND checkpoint_id < %(cutoff)s
+        LIMIT %(batch)s
+    )
+    RETURNING pg_column_size(checkpoints.*) AS bytes
+"""
+
+DELETE_OLD_WRITES = """
+    DELETE FROM checkpoint_writes
+    WHERE ctid IN (
+        SELECT ctid FROM checkpoint_writes
+        WHERE thread_id = %(thread_id)s AND checkpoint_ns = %(checkpoint_ns)s AND checkpoint_id < %(cutoff)s
+        LIMIT %(batch)s
+    )
+    RETURNING pg_column_size(checkpoint_writes.*) AS bytes
+"""
+
+# Blobs of a thread that no remaining checkpoint references. Only versions
+# older than the oldest referenced one are removed: channel versions grow
+# monotonically, so blobs of a checkpoint being written right now are kept.
+DELETE_ORPHAN_BLOBS = """
+    DELETE FROM checkpoint_blobs
+    WHERE ctid IN (
+        SELECT b.ctid FROM checkpoint_blobs b
+        WHERE b.thread_id = %(thread_id)s AND b.checkpoint_ns = %(checkpoint_ns)s
+          AND NOT EXISTS (
+              SELECT 1 FROM checkpoints c
+              WHERE c.thread_id = b.thread_id AND c.checkpoint_ns = b.checkpoint_ns
+                AND c.checkpoint->'channel_versions'->>b.channel = b.version
+          )
+          AND b.version < (
+              SELECT min(c.checkpoint->'channel_versions'->>b.channel) FROM checkpoints c
+              WHERE c.thread_id = b.thread_id AND c.checkpoint_ns = b.checkpoint_ns
+          )
+        LIMIT %(batch)s
+    )
+    RETURNING pg_column_size(checkpoint_blobs.*) AS bytes
+"""
+
+SELECT_EXPIRED_THREADS = """
+    SELECT thread_id
+    FROM checkpoints
+    GROUP BY thread_id
+    HAVING max(checkpoint->>'ts') < %(expired_before)s
+    LIMIT %(batch)s
+"""
+
+DELETE_THREAD_ROWS = """
+    DELETE FROM {table}
+    WHERE ctid IN (
+        SELECT ctid FROM {table} WHERE thread_id = %(thread_id)s LIMIT %(batch)s
+    )
+    RETURNING pg_column_size({table}.*) AS bytes
+"""
+
+
+class CheckpointRetention:
+    """Prunes the PostgresSaver tables.
+
+    - keeps only the newest `keep_last` checkpoints (and their writes and
+      blobs) of every thread;
+    - deletes every row of threads idle for longer than `thread_ttl_hours`.
+
+    Deletes run in batches of `batch_size` rows so that locks stay short.
+    Reported bytes are the on-disk size of the deleted rows; Postgres reuses
+    that space once (auto)vacuum has processed the tables.
+    """
+
+    def __init__(self, conn, config: RetentionConfig):
+        self.conn = conn
+        self.config = config
+
+    @staticmethod
+    def from_config(config: Config, postgres: Optional[PostgresConfig] = None) -> "CheckpointRetention":
+        """Open a dedicated connection to the checkpoint database (or to the given shard)"""
+        if not PSYCOPG_AVAILABLE:
+            raise RuntimeError("psycopg is not installed")
+
+        connection_string = ConfigLoader.build_postgres_connection_string(postgres or config.checkpoint.postgres)
+        if not connection_string:
+            raise RuntimeError("PostgreSQL configuration incomplete")
+
+        conn = psycopg.connect(connection_string, autocommit=True, row_factory=dict_row)
+        return CheckpointRetention(conn, config.checkpoint.retention)
+
+    @staticmethod
+    def shards(config: Config) -> List[PostgresShardConfig]:
+        """The Postgres databases holding checkpoints: a single "default" one unless sharded"""
+        return [shard for shard in ConfigLoader.build_postgres_shards(config.checkpoint.postgres)
+                if shard.sqlite_path is None]
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def migrate(self) -> None:
+        """Create the indexes used by the retention queries"""
+        with open(MIGRATION_FILE) as file:
+            script = file.read()
+
+        for statement in script.split(";"):
+            lines = [line for line in statement.splitlines() if line.strip() and not line.strip().startswith("--")]
+            if lines:
+                # CREATE INDEX CONCURRENTLY must run outside a transaction block
+                self.conn.execute("\n".join(lines))
+        logging.info("Checkpoint retention indexes are in place")
+
+    def prune(self) -> Optional[Dict[str, int]]:
+        """Run one retention pass; returns None if another instance is already pruning"""
+        locked = self.conn.execute("SELECT pg_try_advisory_lock(%s) AS locked", (RETENTION_LOCK_KEY,)).fetchone()
+        if not locked["locked"]:
+            logging.info("Checkpoint retention already running elsewhere, skipping")
+            return None
+
+        try:
+            report = {"threads_expired": 0, "threads_pruned": 0, "rows": 0, "bytes": 0}
+            started = time.monotonic()
+
+            if self.config.thread_ttl_hours > 0:
+                self._expire_threads(report)
+            if self.config.keep_last > 0:
+                self._prune_threads(report)
+
+            report["seconds"] = round(time.monotonic() - started, 3)
+            logging.info(f"Checkpoint retention: {report}")
+            return report
+        finally:
+            self.conn.execute("SELECT pg_advisory_unlock(%s)", (RETENTION_LOCK_KEY,))
+
+    def _prune_threads(self, report: Dict[str, int]) -> None:
+        threads = self.conn.execute(SELECT_OVERFULL_THREADS, {"keep": self.config.keep_last}).fetchall()
+
+        for thread in threads:
+            params = {
+                "thread_id": thread["thread_id"],
+                "checkpoint_ns": thread["checkpoint_ns"],
+                "batch": self.config.batch_size,
+            }
+            cutoff = self.conn.execute(SELECT_CUTOFF, {**params, "offset": self.config.keep_last - 1}).fetchone()
+            if cutoff is None:
+                continue
+
+            params["cutoff"] = cutoff["checkpoint_id"]
+            self._delete_batched(DELETE_OLD_CHECKPOINTS, params, report)
+            self._delete_batched(DELETE_OLD_WRITES, params, report)
+            self._delete_batched(DELETE_ORPHAN_BLOBS, params, report)
+            report["threads_pruned"] += 1
+
+    def _expire_threads(self, report: Dict[str, int]) -> None:
+        expired_before = self._timestamp(hours=self.config.thread_ttl_hours)
+
+        while True:
+            threads = self.conn.execute(
+                SELECT_EXPIRED_THREADS, {"expired_before": expired_before, "batch": self.config.batch_size}
+            ).fetchall()
+            if not threads:
+                return
+
+            for thread in threads:
+                params = {"thread_id": thread["thread_id"], "batch": self.config.batch_size}
+                # Checkpoints last, so a half-deleted thread is still found on the next pass
+                for table in ("checkpoint_writes", "checkpoint_blobs", "checkpoints"):
+                    self._delete_batched(DELETE_THREAD_ROWS.format(table=table), params, report)
+                report["threads_expired"] += 1
+
+    def _delete_batched(self, query: str, params: dict, report: Dict[str, int]) -> None:
+        while True:
+            rows = self.conn.execute(query, params).fetchall()
+            report["rows"] += len(rows)
+            report["bytes"] += sum(row["bytes"] or 0 for row in rows)
+            if len(rows) < self.config.batch_size:
+                return
+
+    @staticmethod
+    def _timestamp(hours: float) -> str:
+        # Same ISO format LangGraph writes into checkpoint->>'ts', so text comparison is ordered
+        return (datetime.now(timezone.utc) - timedelta(hours=hours)).isoformat()
+
+
+class RetentionWorker(threading.Thread):
+    """Background thread running a retention pass every `interval_seconds`"""
+
+    def __init__(self, config: Config):
+        super().__init__(name="checkpoint-retention", daemon=True)
+        self.config = config
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def start_from_config(config: Config) -> Optional["RetentionWorker"]:
+        """Start the worker if retention is enabled and the store is Postgres"""
+        if not config.checkpoint.retention.enabled:
+            return None
+        shards = CheckpointRetention.shards(config)
+        if not PSYCOPG_AVAILABLE or not shards or not all(
+                ConfigLoader.build_postgres_connection_string(shard.postgres) for shard in shards):
+            logging.warning("Checkpoint retention needs a Postgres connection, not starting")
+            return None
+
+        worker = RetentionWorker(config)
+        worker.start()
+        return worker
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self) -> None:
+        interval = self.config.checkpoint.retention.interval_seconds
+        while not self._stop_event.wait(interval):
+            for shard in CheckpointRetention.shards(self.config):
+                try:
+                    retention = CheckpointRetention.from_config(self.config, shard.postgres)
+                    try:
+                        retention.prune()
+                    finally:
+                        retention.close()
+                except Exception as e:
+                    logging.error(f"Checkpoint retention failed on shard {shard.name}: {e}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Prune old LangGraph checkpoints from Postgres")
+    parser.add_argument("--config", default="config/config.yaml", help="path to config.yaml")
+    parser.add_argument("--migrate", action="store_true", help="create the retention indexes first")
+    parser.add_argument("--keep-last", type=int, help="override checkpoint.retention.keep_last")
+    parser.add_argument("--thread-ttl-hours", type=float, help="override checkpoint.retention.thread_ttl_hours")
+    parser.add_argument("--batch-size", type=int, help="override checkpoint.retention.batch_size")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    config = ConfigLoader(args.config).load()
+    retention_config = config.checkpoint.retention
+    if args.keep_last is not None:
+        retention_config.keep_last = args.keep_last
+    if args.thread_ttl_hours is not None:
+        retention_config.thread_ttl_hours = args.thread_ttl_hours
+    if args.batch_size is not None:
+        retention_config.batch_size = args.batch_size
+
+    status = 0
+    for shard in CheckpointRetention.shards(config):
+        retention = CheckpointRetention.from_config(config, shard.postgres)
+        try:
+            if args.migrate:
+                retention.migrate()
+            report = retention.prune()
+        finally:
+            retention.close()
+
+        if report is None:
+            status = 1
+            continue
+        print(f"{shard.name}: deleted {report['rows']} rows ({report['bytes']} bytes), "
+              f"pruned {report['threads_pruned']} threads, expired {report['threads_expired']} threads "
+              f"in {report['seconds']}s")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+import zlib
+import logging
+from typing import Any, Tuple
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from service.config import SerializerConfig
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+COMPRESSED_SUFFIX = "+"
+
+
+class CompactSerializer(JsonPlusSerializer):
+    """msgpack encoding with compression of large values.
+
+    Values that encode to `threshold_bytes` or more are compressed and stored
+    under a "<type>+<codec>" tag (e.g. "msgpack+zstd"); smaller ones keep the
+    plain tags of JsonPlusSerializer. Reading dispatches on the tag, so rows
+    written before compression was enabled, or with another codec, still load.
+    """
+
+    def __init__(self, compression: str = "zstd", threshold_bytes: int = 1024, level: int = 3, **kwargs):
+        super().__init__(**kwargs)
+        if compression == "zstd" and not ZSTD_AVAILABLE:
+            logging.warning("zstandard is not installed, compressing checkpoints with zlib")
+            compression = "zlib"
+        if compression not in ("zstd", "zlib", "none"):
+            raise ValueError(f"Unknown checkpoint compression: {compression}")
+
+        self.compression = compression
+        self.threshold_bytes = threshold_bytes
+        self.level = level
+
+    def dumps_typed(self, obj: Any) -> Tuple[str, bytes]:
+        type_, data = super().dumps_typed(obj)
+        if self.compression == "none" or type_ in ("null", "bytes", "bytearray") or len(data) < self.threshold_bytes:
+            return type_, data
+
+        compressed = self._compress(data)
+        if len(compressed) >= len(data):
+            return type_, data
+        return f"{type_}{COMPRESSED_SUFFIX}{self.compression}", compressed
+
+    def loads_typed(self, data: Tuple[str, bytes]) -> Any:
+        type_, payload = data
+        if COMPRESSED_SUFFIX in type_:
+            type_, codec = type_.split(COMPRESSED_SUFFIX, 1)
+            payload = self._decompress(codec, payload)
+        return super().loads_typed((type_, payload))
+
+    def _compress(self, data: bytes) -> bytes:
+        if self.compression == "zstd":
+            # zstd contexts are not thread safe, and cheap enough to create per call
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+        return zlib.compress(data, self.level)
+
+    @staticmethod
+    def _decompress(codec: str, data: bytes) -> bytes:
+        if codec == "zlib":
+            return zlib.decompress(data)
+        if codec == "zstd":
+            if not ZSTD_AVAILABLE:
+                raise RuntimeError("checkpoint was compressed with zstd but zstandard is not installed")
+            return zstandard.ZstdDecompressor().decompress(data)
+        raise ValueError(f"Unknown checkpoint compression: {codec}")
+
+
+def create_serializer(config: SerializerConfig):
+    """The serializer configured under checkpoint.serializer, or None for the library default"""
+    if config.type == "jsonplus":
+        return None
+    if config.type == "compact":
+        return CompactSerializer(config.compression, config.threshold_bytes, config.level)
+    logging.warning(f"Unknown checkpoint serializer: {config.type}, using the default")
+    return None
@@ -0,0 +1,308 @@
+import bisect
+import hashlib
+import logging
+from collections import defaultdict
+from contextlib import nullcontext
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Sequence
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+
+
+class HashRing:
+    """Consistent hash ring over shard names.
+
+    Every shard is placed at `virtual_nodes` points; a key belongs to the
+    first point at or after its hash. Adding a shard only moves the keys
+    the new shard takes over (about 1/N of them), and placement depends on
+    shard names alone, not on their order in the config.
+    """
+
+    def __init__(self, names: Sequence[str], virtual_nodes: int = 160):
+        if not names:
+            raise ValueError("A hash ring needs at least one shard")
+        points = sorted((self._hash(f"{name}#{i}"), name) for name in names for i in range(max(1, virtual_nodes)))
+        self._hashes = [point for point, _ in points]
+        self._names = [name for _, name in points]
+
+    def owner(self, key: str) -> str:
+        """The shard a key belongs to"""
+        index = bisect.bisect_left(self._hashes, self._hash(key))
+        return self._names[index % len(self._names)]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        # Stable across processes, unlike hash()
+        return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+def copy_thread(source: BaseCheckpointSaver, target: BaseCheckpointSaver, thread_id: str) -> int:
+    """Copy every checkpoint of a thread, with its pending writes, to another checkpointer.
+
+    Checkpoints are written oldest first and puts are upserts, so copying
+    a thread twice, or while it is written to on the target, is safe.
+    Returns the number of checkpoints copied.
+    """
+    checkpoint_tuples = sorted(source.list({"configurable": {"thread_id": thread_id}}),
+                               key=lambda checkpoint_tuple: checkpoint_tuple.checkpoint["id"])
+    for checkpoint_tuple in checkpoint_tuples:
+        target.put(_put_config(checkpoint_tuple), checkpoint_tuple.checkpoint, checkpoint_tuple.metadata,
+                   checkpoint_tuple.checkpoint["channel_versions"])
+        for task_id, writes in _writes_by_task(checkpoint_tuple).items():
+            target.put_writes(checkpoint_tuple.config, writes, task_id)
+    return len(checkpoint_tuples)
+
+
+async def acopy_thread(source: BaseCheckpointSaver, target: BaseCheckpointSaver, thread_id: str) -> int:
+    """Async variant of copy_thread"""
+    checkpoint_tuples = sorted([item async for item in source.alist({"configurable": {"thread_id": thread_id}})],
+                               key=lambda checkpoint_tuple: checkpoint_tuple.checkpoint["id"])
+    for checkpoint_tuple in checkpoint_tuples:
+        await target.aput(_put_config(checkpoint_tuple), checkpoint_tuple.checkpoint, checkpoint_tuple.metadata,
+                          checkpoint_tuple.checkpoint["channel_versions"])
+        for task_id, writes in _writes_by_task(checkpoint_tuple).items():
+            await target.aput_writes(checkpoint_tuple.config, writes, task_id)
+    return len(checkpoint_tuples)
+
+
+def _put_config(checkpoint_tuple: CheckpointTuple) -> RunnableConfig:
+    if checkpoint_tuple.parent_config is not None:
+        return checkpoint_tuple.parent_config
+    configurable = checkpoint_tuple.config["configurable"]
+    return {"configurable": {"thread_id": configurable["thread_id"],
+                             "checkpoint_ns": configurable.get("checkpoint_ns", "")}}
+
+
+def _writes_by_task(checkpoint_tuple: CheckpointTuple) -> Dict[str, List[tuple]]:
+    writes = defaultdict(list)
+    for task_id, channel, value in checkpoint_tuple.pending_writes or []:
+        writes[task_id].append((channel, value))
+    return writes
+
+
+class ShardedCheckpointSaver(BaseCheckpointSaver):
+    """Spreads threads over several checkpointers, consistent-hashed on thread_id.
+
+    Every call for a thread goes to the shard that owns it. Listing without
+    a thread id queries every shard. `conn` is the first shard's connection,
+    so components sharing the checkpointer's pool (response cache, locks,
+    idempotency keys, jobs) keep their tables on that shard.
+
+    Adding a shard online: shards marked joining take part in routing, and
+    a thread one of them takes over is moved from its previous shard (the
+    owner on the ring without the joining shards) when it is accessed while
+    the previous shard still holds it; the thread is deleted there only
+    once fully copied, so an interrupted move is resumed by the next access.
+    `python -m service.checkpointer.rebalance` moves the threads nobody
+    touches; once it reports nothing left to move, the shard can stop
+    being marked joining.
+    """
+
+    def __init__(self, shards: Dict[str, BaseCheckpointSaver], joining: Iterable[str] = (),
+                 virtual_nodes: int = 160, metrics=None):
+        if not shards:
+            raise ValueError("ShardedCheckpointSaver needs at least one shard")
+        self.shards = dict(shards)
+        self.primary = next(iter(self.shards))
+        super().__init__(serde=self.shards[self.primary].serde)
+
+        self.joining = set(joining)
+        self.ring = HashRing(list(self.shards), virtual_nodes)
+        stable = [name for name in self.shards if name not in self.joining]
+        self.previous_ring = HashRing(stable, virtual_nodes) if self.joining else None
+        self.metrics = metrics
+        self.moved = 0
+
+    @property
+    def conn(self) -> Any:
+        """The first shard's connection (or pool)"""
+        return getattr(self.shards[self.primary], "conn", None)
+
+    @property
+    def config_specs(self) -> list:
+        return self.shards[self.primary].config_specs
+
+    def owner(self, thread_id: str) -> str:
+        """Name of the shard a thread belongs to"""
+        return self.ring.owner(thread_id)
+
+    def previous_owner(self, thread_id: str) -> Optional[str]:
+        """Name of the shard a thread may still have to be moved from, while shards are joining"""
+        if self.previous_ring is None:
+            return None
+        previous = self.previous_ring.owner(thread_id)
+        return previous if previous != self.ring.owner(thread_id) else None
+
+    def shard_for(self, thread_id: str) -> BaseCheckpointSaver:
+        """The checkpointer storing a thread"""
+        return self.shards[self.owner(thread_id)]
+
+    def conn_for(self, thread_id: str) -> Any:
+        """The connection (or pool) of the shard storing a thread"""
+        return getattr(self.shard_for(thread_id), "conn", None)
+
+    def move_thread(self, thread_id: str, source: str) -> int:
+        """Move a thread from the given shard to its owner; returns the number of checkpoints moved"""
+        target = self.owner(thread_id)
+        if source == target:
+            return 0
+        with self._measure(target, "move"):
+            moved = copy_thread(self.shards[source], self.shards[target], thread_id)
+            if moved:
+                self.shards[source].delete_thread(thread_id)
+        self._moved(thread_id, source, target, moved)
+        return moved
+
+    async def amove_thread(self, thread_id: str, source: str) -> int:
+        """Async variant of move_thread"""
+        target = self.owner(thread_id)
+        if source == target:
+            return 0
+        with self._measure(target, "move"):
+            moved = await acopy_thread(self.shards[source], self.shards[target], thread_id)
+            if moved:
+                await self.shards[source].adelete_thread(thread_id)
+        self._moved(thread_id, source, target, moved)
+        return moved
+
+    def settle(self, thread_id: str) -> None:
+        """Finish moving a thread whose previous shard still holds it.
+
+        Checked on every access while shards are joining, not only when the
+        new owner has nothing: a move that failed halfway leaves older
+        checkpoints on the new owner, and the previous shard keeps the
+        thread until it is fully copied.
+        """
+        previous = self.previous_owner(thread_id)
+        if previous is not None and self._holds(self.shards[previous], thread_id):
+            self.move_thread(thread_id, previous)
+
+    async def asettle(self, thread_id: str) -> None:
+        """Async variant of settle"""
+        previous = self.previous_owner(thread_id)
+        if previous is not None and await self._aholds(self.shards[previous], thread_id):
+            await self.amove_thread(thread_id, previous)
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        self.settle(thread_id)
+        name = self.owner(thread_id)
+        with self._measure(name, "get"):
+            return self.shards[name].get_tuple(config)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        if config is None:
+            results = []
+            for name, shard in self.shards.items():
+                with self._measure(name, "list"):
+                    results.extend(shard.list(None, filter=filter, before=before, limit=limit))
+            return iter(self._newest_first(results, limit))
+
+        thread_id = config["configurable"]["thread_id"]
+        self.settle(thread_id)
+        name = self.owner(thread_id)
+        with self._measure(name, "list"):
+            return iter(list(self.shards[name].list(config, filter=filter, before=before, limit=limit)))
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        name = self.owner(config["configurable"]["thread_id"])
+        with self._measure(name, "put"):
+            return self.shards[name].put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        name = self.owner(config["configurable"]["thread_id"])
+        with self._measure(name, "put_writes"):
+            self.shards[name].put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        for name in self._holders(thread_id):
+            with self._measure(name, "delete"):
+                self.shards[name].delete_thread(thread_id)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        await self.asettle(thread_id)
+        name = self.owner(thread_id)
+        with self._measure(name, "get"):
+            return await self.shards[name].aget_tuple(config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        if config is None:
+            results = []
+            for name, shard in self.shards.items():
+                with self._measure(name, "list"):
+                    results.extend([item async for item in shard.alist(None, filter=filter, before=before,
+                                                                       limit=limit)])
+            for item in self._newest_first(results, limit):
+                yield item
+            return
+
+        thread_id = config["configurable"]["thread_id"]
+        await self.asettle(thread_id)
+        name = self.owner(thread_id)
+        with self._measure(name, "list"):
+            results = [item async for item in self.shards[name].alist(config, filter=filter, before=before,
+                                                                      limit=limit)]
+        for item in results:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        name = self.owner(config["configurable"]["thread_id"])
+        with self._measure(name, "put"):
+            return await self.shards[name].aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        name = self.owner(config["configurable"]["thread_id"])
+        with self._measure(name, "put_writes"):
+            await self.shards[name].aput_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        for name in self._holders(thread_id):
+            with self._measure(name, "delete"):
+                await self.shards[name].adelete_thread(thread_id)
+
+    def get_next_version(self, current: Any, channel: None) -> Any:
+        return self.shards[self.primary].get_next_version(current, channel)
+
+    def stats(self) -> Dict[str, Any]:
+        """Shard names and threads moved by this process"""
+        return {"shards": list(self.shards), "joining": sorted(self.joining), "moved": self.moved}
+
+    def _holds(self, shard: BaseCheckpointSaver, thread_id: str) -> bool:
+        return next(iter(shard.list({"configurable": {"thread_id": thread_id}}, limit=1)), None) is not None
+
+    async def _aholds(self, shard: BaseCheckpointSaver, thread_id: str) -> bool:
+        async for _ in shard.alist({"configurable": {"thread_id": thread_id}}, limit=1):
+            return True
+        return False
+
+    def _holders(self, thread_id: str) -> List[str]:
+        previous = self.previous_owner(thread_id)
+        return [self.owner(thread_id)] + ([previous] if previous is not None else [])
+
+    def _moved(self, thread_id: str, source: str, target: str, moved: int) -> None:
+        if not moved:
+            return
+        self.moved += 1
+        if self.metrics is not None:
+            self.metrics.shard_moves.labels(shard=target).inc()
+        logging.info(f"Moved thread {thread_id} ({moved} checkpoints) from shard {source} to {target}")
+
+    def _measure(self, name: str, operation: str):
+        return self.metrics.shard(name, operation) if self.metrics is not None else nullcontext()
+
+    @staticmethod
+    def _newest_first(results: List[CheckpointTuple], limit: Optional[int]) -> List[CheckpointTuple]:
+        results.sort(key=lambda checkpoint_tuple: checkpoint_tuple.checkpoint["id"], reverse=True)
+        return results[:limit] if limit else results
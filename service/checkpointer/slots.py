@@ -0,0 +1,35 @@
+import os
+import itertools
+from typing import Any, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # no slot locking: one process per directory
+    fcntl = None
+
+
+def claim_slot(directory: str) -> Tuple[str, Any]:
+    """Claim a `slot-N` subdirectory no other live process holds; returns its name and lock file.
+
+    The slot stays claimed while the lock file is open, so the workers of a
+    server sharing one directory each get their own.
+    """
+    for n in itertools.count():
+        slot_path = os.path.join(directory, f"slot-{n}")
+        os.makedirs(slot_path, exist_ok=True)
+        lock_file = try_lock(slot_path)
+        if lock_file is not None:
+            return f"slot-{n}", lock_file
+
+
+def try_lock(slot_path: str) -> Optional[Any]:
+    """Lock a slot directory; None if a live process holds it"""
+    lock_file = open(os.path.join(slot_path, "lock"), "a")
+    if fcntl is None:
+        return lock_file
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
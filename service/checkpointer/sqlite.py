@@ -0,0 +1,402 @@
+import os
+import queue
+import random
+import asyncio
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, Optional, Sequence
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from service.config import SqliteConfig
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS checkpoints (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        parent_checkpoint_id TEXT,
+        checkpoint_type TEXT NOT NULL,
+        checkpoint BLOB NOT NULL,
+        metadata_type TEXT NOT NULL,
+        metadata BLOB NOT NULL,
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS checkpoint_blobs (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        channel TEXT NOT NULL,
+        version TEXT NOT NULL,
+        type TEXT NOT NULL,
+        blob BLOB,
+        PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS checkpoint_writes (
+        thread_id TEXT NOT NULL,
+        checkpoint_ns TEXT NOT NULL DEFAULT '',
+        checkpoint_id TEXT NOT NULL,
+        task_id TEXT NOT NULL,
+        idx INTEGER NOT NULL,
+        channel TEXT NOT NULL,
+        type TEXT NOT NULL,
+        blob BLOB NOT NULL,
+        task_path TEXT NOT NULL DEFAULT '',
+        PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+    ) WITHOUT ROWID
+    """,
+]
+
+SELECT_CHECKPOINTS = """
+    SELECT checkpoint_ns, checkpoint_id, parent_checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata
+    FROM checkpoints
+    WHERE thread_id = ? AND checkpoint_ns = ?
+"""
+
+SELECT_BLOBS = """
+    SELECT type, blob
+    FROM checkpoint_blobs
+    WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?
+"""
+
+SELECT_WRITES = """
+    SELECT task_id, channel, type, blob
+    FROM checkpoint_writes
+    WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?
+    ORDER BY task_path, task_id, idx
+"""
+
+UPSERT_BLOBS = """
+    INSERT OR IGNORE INTO checkpoint_blobs (thread_id, checkpoint_ns, channel, version, type, blob)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+UPSERT_CHECKPOINT = """
+    INSERT OR REPLACE INTO checkpoints
+        (thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, checkpoint_type, checkpoint, metadata_type, metadata)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_WRITES = """
+    INSERT OR IGNORE INTO checkpoint_writes
+        (thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, blob, task_path)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Special writes (errors, interrupts) replace the previous value
+UPSERT_WRITES = INSERT_WRITES.replace("INSERT OR IGNORE", "INSERT OR REPLACE")
+
+
+class SqliteConnectionPool:
+    """Connections to one SQLite database file in WAL mode.
+
+    WAL lets readers run concurrently with the single writer, so reads are
+    spread over `pool_size` connections while all writes go through one
+    dedicated connection, serialized by a lock instead of by SQLITE_BUSY
+    retries.
+    """
+
+    def __init__(self, config: SqliteConfig):
+        self.config = config
+        directory = os.path.dirname(os.path.abspath(config.path))
+        os.makedirs(directory, exist_ok=True)
+
+        self._writer = self._connect()
+        self._writer_lock = threading.RLock()
+        self._in_transaction = False
+        self._readers: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        for _ in range(max(1, config.pool_size)):
+            self._readers.put(self._connect())
+        self._connections = [self._writer] + list(self._readers.queue)
+        self._lock = threading.Lock()
+        self.waiting = 0
+        self.requests = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # Transactions are opened explicitly, so that one put is one commit
+        conn = sqlite3.connect(
+            self.config.path,
+            timeout=self.config.busy_timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={self.config.synchronous}")
+        conn.execute(f"PRAGMA cache_size=-{self.config.cache_size_kb}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a reader connection"""
+        with self._lock:
+            self.requests += 1
+        try:
+            conn = self._readers.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                self.waiting += 1
+            try:
+                conn = self._readers.get(timeout=self.config.busy_timeout)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run statements on the writer connection in a single committed transaction.
+
+        A transaction opened inside another one on the same thread joins it,
+        so several puts can be group-committed.
+        """
+        with self._writer_lock:
+            if self._in_transaction:
+                yield self._writer
+                return
+
+            self._writer.execute("BEGIN IMMEDIATE")
+            self._in_transaction = True
+            try:
+                yield self._writer
+            except BaseException:
+                self._writer.execute("ROLLBACK")
+                raise
+            else:
+                self._writer.execute("COMMIT")
+            finally:
+                self._in_transaction = False
+
+    def close(self) -> None:
+        for conn in self._connections:
+            conn.close()
+
+    def stats(self) -> Dict[str, int]:
+        available = self._readers.qsize()
+        with self._lock:
+            return {
+                "size": len(self._connections),
+                "available": available,
+                "in_use": len(self._connections) - 1 - available,
+                "waiting": self.waiting,
+                "requests": self.requests,
+            }
+
+
+class SqliteCheckpointSaver(BaseCheckpointSaver):
+    """Checkpointer storing threads in a local SQLite database.
+
+    Intended for single-node deployments that need state to survive restarts
+    without running a database server. Every put writes the checkpoint and
+    all its channel blobs in one transaction, and a put_writes call inserts
+    all its writes in one transaction, so a turn costs a handful of commits;
+    with WAL and synchronous=NORMAL those commits don't fsync. Commits are
+    not batched across calls here: checkpoint.write_behind group-commits
+    many of them in one transaction through the pool's nested transactions.
+
+    The async methods run the same statements in a worker thread.
+    """
+
+    def __init__(self, pool: SqliteConnectionPool, serde=None):
+        super().__init__(serde=serde)
+        self.pool = pool
+
+    def setup(self) -> None:
+        """Create the checkpoint tables if needed"""
+        with self.pool.transaction() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+
+        query = SELECT_CHECKPOINTS
+        params = [thread_id, checkpoint_ns]
+        if checkpoint_id:
+            query += " AND checkpoint_id = ?"
+            params.append(checkpoint_id)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+
+        with self.pool.connection() as conn:
+            row = conn.execute(query, params).fetchone()
+            if row is None:
+                return None
+            return self._load_tuple(conn, thread_id, row)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        query = """
+            SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id,
+                   checkpoint_type, checkpoint, metadata_type, metadata
+            FROM checkpoints
+        """
+        where, params = [], []
+        if config:
+            where.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            if checkpoint_ns is not None:
+                where.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                where.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before and (before_id := get_checkpoint_id(before)):
+            where.append("checkpoint_id < ?")
+            params.append(before_id)
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY checkpoint_id DESC"
+
+        # Metadata is serialized, so filtering happens here rather than in SQL
+        results = []
+        with self.pool.connection() as conn:
+            for row in conn.execute(query, params).fetchall():
+                if limit is not None and len(results) >= limit:
+                    break
+                metadata = self.serde.loads_typed((row[6], row[7]))
+                if filter and not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+                results.append(self._load_tuple(conn, row[0], row[1:]))
+        return iter(results)
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        parent_id = config["configurable"].get("checkpoint_id")
+
+        stored = checkpoint.copy()
+        values = stored.pop("channel_values")
+        blobs = []
+        for channel, version in new_versions.items():
+            typed = self.serde.dumps_typed(values[channel]) if channel in values else ("empty", b"")
+            blobs.append((thread_id, checkpoint_ns, channel, str(version), typed[0], typed[1]))
+        checkpoint_type, checkpoint_bytes = self.serde.dumps_typed(stored)
+        metadata_type, metadata_bytes = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+
+        with self.pool.transaction() as conn:
+            if blobs:
+                conn.executemany(UPSERT_BLOBS, blobs)
+            conn.execute(UPSERT_CHECKPOINT, (
+                thread_id, checkpoint_ns, checkpoint["id"], parent_id,
+                checkpoint_type, checkpoint_bytes, metadata_type, metadata_bytes,
+            ))
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            typed = self.serde.dumps_typed(value)
+            rows.append((
+                thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx),
+                channel, typed[0], typed[1], task_path,
+            ))
+
+        query = UPSERT_WRITES if all(channel in WRITES_IDX_MAP for channel, _ in writes) else INSERT_WRITES
+        with self.pool.transaction() as conn:
+            conn.executemany(query, rows)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self.pool.transaction() as conn:
+            for table in ("checkpoints", "checkpoint_blobs", "checkpoint_writes"):
+                conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[Dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> AsyncIterator[CheckpointTuple]:
+        items = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        # Same zero-padded format as MemorySaver and PostgresSaver, so versions sort as text
+        if current is None:
+            current_version = 0
+        elif isinstance(current, int):
+            current_version = current
+        else:
+            current_version = int(current.split(".")[0])
+        return f"{current_version + 1:032}.{random.random():016}"
+
+    def _load_tuple(self, conn: sqlite3.Connection, thread_id: str, row) -> CheckpointTuple:
+        checkpoint_ns, checkpoint_id, parent_id, checkpoint_type, checkpoint_bytes, metadata_type, metadata_bytes = row
+        checkpoint = self.serde.loads_typed((checkpoint_type, checkpoint_bytes))
+
+        channel_values = {}
+        for channel, version in checkpoint["channel_versions"].items():
+            blob = conn.execute(SELECT_BLOBS, (thread_id, checkpoint_ns, channel, str(version))).fetchone()
+            if blob is not None and blob[0] != "empty":
+                channel_values[channel] = self.serde.loads_typed(blob)
+
+        writes = conn.execute(SELECT_WRITES, (thread_id, checkpoint_ns, checkpoint_id)).fetchall()
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={**checkpoint, "channel_values": channel_values},
+            metadata=self.serde.loads_typed((metadata_type, metadata_bytes)),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_id,
+                    }
+                }
+                if parent_id
+                else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+        )
@@ -0,0 +1,797 @@
+import os
+import glob
+import time
+import atexit
+import struct
+import asyncio
+import logging
+import itertools
+import threading
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from .delegating import DelegatingCheckpointSaver
+from .postgres_pool import is_async_connection_pool, is_connection_pool
+from .sharding import ShardedCheckpointSaver
+from .slots import claim_slot, try_lock
+from .sqlite import SqliteCheckpointSaver
+
+try:
+    from langgraph.checkpoint.postgres import PostgresSaver
+    from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+    POSTGRES_AVAILABLE = True
+except ImportError:
+    POSTGRES_AVAILABLE = False
+
+DURABILITY = ("memory", "journal", "fsync")
+
+# Journal record: payload length, type length, then the type and the payload
+RECORD_HEADER = struct.Struct(">IH")
+SEGMENT_PATTERN = "*.log"
+# Writes that could not be committed, kept out of the replayed slots
+DEAD_LETTER_DIR = "dead-letter"
+
+# Seconds a writer waits for room in a full buffer before failing
+FULL_BUFFER_TIMEOUT = 30
+RETRY_BACKOFF = 0.5
+MAX_RETRY_BACKOFF = 10
+
+
+class CheckpointJournal:
+    """Append-only log of buffered checkpoint writes, so they survive a crash until committed.
+
+    Each process claims a slot directory (with flock), so the workers of a
+    server can share journal_dir. Records are appended to numbered segment
+    files; the flusher rotates to a new segment before each commit and
+    deletes the segments whose records are all committed. Segments left
+    behind by a process that died are replayed by the next one to start.
+    """
+
+    def __init__(self, directory: str, fsync: bool = False):
+        self.directory = directory
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+
+        self.slot, self._lock_file = claim_slot(directory)
+        self.path = os.path.join(directory, self.slot)
+        self._previous = self._segment_paths(self.path)
+        self.segment = self._sequence(self._previous[-1]) + 1 if self._previous else 0
+        self._segments: "deque[int]" = deque()
+        self._held: Dict[str, Any] = {}
+        self._open_segment()
+
+    def append(self, typed: Tuple[str, bytes]) -> int:
+        """Append a serialized record; returns the segment it went to"""
+        type_bytes = typed[0].encode()
+        self._file.write(RECORD_HEADER.pack(len(typed[1]), len(type_bytes)) + type_bytes + typed[1])
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._written += 1
+        return self.segment
+
+    def rotate(self) -> None:
+        """Start a new segment, so the current one can be deleted once committed"""
+        if not self._written:
+            return
+        self._file.close()
+        self.segment += 1
+        self._open_segment()
+
+    def discard_before(self, segment: int) -> None:
+        """Delete this process' segments older than the given one"""
+        while self._segments and self._segments[0] < segment:
+            self._remove(self._segment_path(self.path, self._segments.popleft()))
+
+    def leftovers(self) -> List[str]:
+        """Segments left by a previous run: this slot's, and those of slots no live process holds.
+
+        The slots are held until forget(), so two processes never replay the same segments.
+        """
+        paths = list(self._previous)
+        for slot_path in sorted(glob.glob(os.path.join(self.directory, "slot-*"))):
+            name = os.path.basename(slot_path)
+            if name == self.slot or name in self._held:
+                continue
+            lock_file = try_lock(slot_path)
+            if lock_file is None:
+                continue
+            self._held[name] = lock_file
+            paths.extend(self._segment_paths(slot_path))
+        return paths
+
+    def forget(self, paths: Sequence[str]) -> None:
+        """Delete replayed segments and release the slots they came from"""
+        for path in paths:
+            self._remove(path)
+        self._previous = []
+        self._release_held()
+
+    @staticmethod
+    def write(path: str, records: Sequence[Tuple[str, bytes]]) -> None:
+        """Write serialized records to a new segment file, in the format read() expects"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as f:
+            for typed in records:
+                type_bytes = typed[0].encode()
+                f.write(RECORD_HEADER.pack(len(typed[1]), len(type_bytes)) + type_bytes + typed[1])
+            f.flush()
+            os.fsync(f.fileno())
+
+    @staticmethod
+    def read(path: str) -> Iterator[Tuple[str, bytes]]:
+        """Records of a segment, stopping at a torn tail left by a crash mid-append"""
+        with open(path, "rb") as f:
+            data = f.read()
+        offset = 0
+        while offset + RECORD_HEADER.size <= len(data):
+            payload_size, type_size = RECORD_HEADER.unpack_from(data, offset)
+            start = offset + RECORD_HEADER.size
+            end = start + type_size + payload_size
+            if end > len(data):
+                logging.warning(f"Ignoring a truncated record at the end of {path}")
+                return
+            yield data[start:start + type_size].decode(), data[start + type_size:end]
+            offset = end
+
+    def close(self, discard: bool = False) -> None:
+        """Close the journal; with discard, delete its segments (everything was committed)"""
+        self._file.close()
+        if discard:
+            self.discard_before(self.segment + 1)
+        self._release_held()
+        self._lock_file.close()
+
+    def _release_held(self) -> None:
+        for lock_file in self._held.values():
+            lock_file.close()
+        self._held = {}
+
+    def _open_segment(self) -> None:
+        self._file = open(self._segment_path(self.path, self.segment), "ab", buffering=0)
+        self._segments.append(self.segment)
+        self._written = 0
+
+    @staticmethod
+    def _segment_path(slot_path: str, segment: int) -> str:
+        return os.path.join(slot_path, f"{segment:012d}.log")
+
+    @staticmethod
+    def _segment_paths(slot_path: str) -> List[str]:
+        return sorted(glob.glob(os.path.join(slot_path, SEGMENT_PATTERN)))
+
+    @staticmethod
+    def _sequence(path: str) -> int:
+        return int(os.path.basename(path).split(".")[0])
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class WriteBehindCheckpointSaver(DelegatingCheckpointSaver):
+    """Acknowledges checkpoint writes once buffered and group-commits them in the background.
+
+    put and put_writes return as soon as the write is buffered in memory
+    (and appended to the journal); a flusher commits the buffer every
+    flush_interval seconds, or as soon as max_batch writes are waiting, in
+    one transaction per batch. A read of a checkpoint still in the buffer is
+    answered from it; any other read of a thread with buffered writes
+    flushes first, so this process never reads older state than it wrote.
+    Other instances only see committed checkpoints.
+
+    Durability of acknowledged writes: "memory" loses the buffer on a
+    crash, "journal" survives a process crash, "fsync" also survives a power
+    loss at the cost of an fsync per write. close() commits everything
+    buffered; journal segments that could not be committed are replayed on
+    the next start (puts and writes are upserts, so replaying is safe).
+
+    A batch that fails max_attempts commits in a row is retried one write at
+    a time, and the writes that still fail are moved to a dead-letter segment
+    under journal_dir/dead-letter (never replayed) so they stop blocking the
+    writes behind them.
+    """
+
+    def __init__(self, inner: BaseCheckpointSaver, durability: str = "journal",
+                 journal_dir: str = "data/checkpoint-journal", flush_interval: float = 0.05,
+                 max_batch: int = 256, max_pending: int = 10000, max_attempts: int = 5, metrics=None):
+        super().__init__(inner)
+        if durability not in DURABILITY:
+            raise ValueError(f"Unknown write-behind durability: {durability} (use {', '.join(DURABILITY)})")
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self.max_batch = max(1, max_batch)
+        self.max_pending = max(self.max_batch, max_pending)
+        self.max_attempts = max(1, max_attempts)
+        self.dead_letter_dir = os.path.join(journal_dir, DEAD_LETTER_DIR)
+        self.metrics = metrics
+        self.journal = CheckpointJournal(journal_dir, fsync=durability == "fsync") if durability != "memory" else None
+
+        # Buffered writes in commit order, and per (thread_id, checkpoint_ns):
+        # the buffered checkpoints with their writes, and the count of buffered writes
+        self._pending: "deque[Dict[str, Any]]" = deque()
+        self._overlay: Dict[Tuple[str, str], "OrderedDict[str, Dict[str, Any]]"] = {}
+        self._unflushed: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._aflush_lock: Optional[asyncio.Lock] = None
+
+        self._thread: Optional[threading.Thread] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._closed = False
+
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self.dead_lettered = 0
+        # Failed commits in a row of the batch at the head of the buffer
+        self._head: Optional[Dict[str, Any]] = None
+        self._attempts = 0
+
+    # Reads
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        buffered, checkpoint_tuple = self._buffered(config)
+        if buffered:
+            return checkpoint_tuple
+        if self._key(config) in self._unflushed:
+            self.flush()
+        return self.inner.get_tuple(config)
+
+    def list(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None,
+             before: Optional[RunnableConfig] = None, limit: Optional[int] = None) -> Iterator[CheckpointTuple]:
+        if self._has_unflushed(config):
+            self.flush()
+        return self.inner.list(config, filter=filter, before=before, limit=limit)
+
+    def delete_thread(self, thread_id: str) -> None:
+        if self._has_unflushed({"configurable": {"thread_id": thread_id}}):
+            self.flush()
+        return self.inner.delete_thread(thread_id)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        buffered, checkpoint_tuple = self._buffered(config)
+        if buffered:
+            return checkpoint_tuple
+        if self._key(config) in self._unflushed:
+            await self.aflush()
+        return await self.inner.aget_tuple(config)
+
+    async def alist(self, config: Optional[RunnableConfig], *, filter: Optional[dict[str, Any]] = None,
+                    before: Optional[RunnableConfig] = None, limit: Optional[int] = None):
+        if self._has_unflushed(config):
+            await self.aflush()
+        async for item in self.inner.alist(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        if self._has_unflushed({"configurable": {"thread_id": thread_id}}):
+            await self.aflush()
+        return await self.inner.adelete_thread(thread_id)
+
+    # Writes
+
+    def put(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+            new_versions: ChannelVersions) -> RunnableConfig:
+        op, entry = self._put_op(config, checkpoint, metadata, new_versions)
+        while not self._buffer(op, entry):
+            self._wait_for_room()
+        return self._checkpoint_config(config, checkpoint["id"])
+
+    def put_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str = "") -> None:
+        op = self._writes_op(config, writes, task_id, task_path)
+        while not self._buffer(op):
+            self._wait_for_room()
+
+    async def aput(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                   new_versions: ChannelVersions) -> RunnableConfig:
+        op, entry = self._put_op(config, checkpoint, metadata, new_versions)
+        await self._abuffer(op, entry)
+        return self._checkpoint_config(config, checkpoint["id"])
+
+    async def aput_writes(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                          task_path: str = "") -> None:
+        await self._abuffer(self._writes_op(config, writes, task_id, task_path))
+
+    # Flushing
+
+    def flush(self) -> int:
+        """Commit the writes buffered so far; returns how many were committed"""
+        if self._async_inner():
+            raise RuntimeError("The inner checkpointer is async, use aflush()")
+        committed = 0
+        with self._flush_lock:
+            with self._lock:
+                target = len(self._pending)
+            while committed < target:
+                batch = self._take_batch()
+                if not batch:
+                    break
+                try:
+                    with self._measure():
+                        self._commit([self.serde.loads_typed(op["record"]) for op in batch])
+                except Exception as e:
+                    if not self._exhausted(batch):
+                        raise
+                    self._release(batch, self._bury(self._commit_each(batch), e))
+                else:
+                    self._release(batch)
+                committed += len(batch)
+        return committed
+
+    async def aflush(self) -> int:
+        """Async variant of flush"""
+        if not self._async_inner():
+            return await asyncio.to_thread(self.flush)
+        if self._aflush_lock is None:
+            self._aflush_lock = asyncio.Lock()
+        committed = 0
+        async with self._aflush_lock:
+            with self._lock:
+                target = len(self._pending)
+            while committed < target:
+                batch = self._take_batch()
+                if not batch:
+                    break
+                try:
+                    with self._measure():
+                        await self._acommit([self.serde.loads_typed(op["record"]) for op in batch])
+                except Exception as e:
+                    if not self._exhausted(batch):
+                        raise
+                    self._release(batch, self._bury(await self._acommit_each(batch), e))
+                else:
+                    self._release(batch)
+                committed += len(batch)
+        return committed
+
+    def flush_thread(self, thread_id: str) -> int:
+        """Commit the buffered writes if some belong to the thread, so other processes see its last turn"""
+        if not self._has_unflushed({"configurable": {"thread_id": thread_id}}):
+            return 0
+        return self.flush()
+
+    async def aflush_thread(self, thread_id: str) -> int:
+        """Async variant of flush_thread"""
+        if not self._has_unflushed({"configurable": {"thread_id": thread_id}}):
+            return 0
+        return await self.aflush()
+
+    def start(self) -> "WriteBehindCheckpointSaver":
+        """Replay what a previous run left in the journal, then start the flusher thread"""
+        paths, batches = self._leftovers()
+        for records in batches:
+            self._commit(records)
+        self._forget(paths, batches)
+
+        self._thread = threading.Thread(target=self._run, name="checkpoint-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+        return self
+
+    async def astart(self) -> "WriteBehindCheckpointSaver":
+        """Async variant of start: with an async backend the flusher is a task on the running loop"""
+        if not self._async_inner():
+            return await asyncio.to_thread(self.start)
+
+        paths, batches = self._leftovers()
+        for records in batches:
+            await self._acommit(records)
+        self._forget(paths, batches)
+
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._arun())
+        return self
+
+    def close(self) -> None:
+        """Stop the flusher and commit everything still buffered"""
+        if self._closed:
+            return
+        self._closed = True
+        with self._lock:
+            self._stopping = True
+            self._lock.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        try:
+            self.flush()
+        except Exception as e:
+            self._lost_on_shutdown(e)
+        finally:
+            self._close_journal()
+
+    async def aclose(self) -> None:
+        """Async variant of close"""
+        if not self._async_inner():
+            return await asyncio.to_thread(self.close)
+        if self._closed:
+            return
+        self._closed = True
+        self._stopping = True
+        if self._task is not None:
+            self._wake.set()
+            await self._task
+        try:
+            await self.aflush()
+        except Exception as e:
+            self._lost_on_shutdown(e)
+        finally:
+            self._close_journal()
+
+    def stats(self) -> Dict[str, Any]:
+        """Buffer and flush statistics"""
+        with self._lock:
+            return {
+                "durability": self.durability,
+                "pending": len(self._pending),
+                "threads": len(self._unflushed),
+                "flushed": self.flushed,
+                "batches": self.batches,
+                "failures": self.failures,
+                "dead_lettered": self.dead_lettered,
+            }
+
+    def _run(self) -> None:
+        backoff = RETRY_BACKOFF
+        while True:
+            with self._lock:
+                self._lock.wait_for(lambda: self._stopping or len(self._pending) >= self.max_batch,
+                                    self.flush_interval)
+                if self._stopping:
+                    return
+            try:
+                self.flush()
+                backoff = RETRY_BACKOFF
+            except Exception as e:
+                self.failures += 1
+                logging.error(f"Checkpoint flush failed, retrying in {backoff}s: {e}")
+                with self._lock:
+                    self._lock.wait_for(lambda: self._stopping, backoff)
+                backoff = min(backoff * 2, MAX_RETRY_BACKOFF)
+
+    async def _arun(self) -> None:
+        backoff = RETRY_BACKOFF
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._stopping:
+                return
+            try:
+                await self.aflush()
+                backoff = RETRY_BACKOFF
+            except Exception as e:
+                self.failures += 1
+                logging.error(f"Checkpoint flush failed, retrying in {backoff}s: {e}")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_RETRY_BACKOFF)
+
+    def _commit(self, records: List[Dict[str, Any]], inner: Optional[BaseCheckpointSaver] = None) -> None:
+        """Apply a batch of writes to the inner store, in one transaction (per shard) where the store allows it"""
+        inner = inner if inner is not None else self.inner
+        if isinstance(inner, ShardedCheckpointSaver):
+            for shard, shard_records in self._by_shard(inner, records):
+                self._commit(shard_records, shard)
+        elif isinstance(inner, SqliteCheckpointSaver):
+            with inner.pool.transaction():
+                for record in records:
+                    self._apply(inner, record)
+        elif POSTGRES_AVAILABLE and isinstance(inner, PostgresSaver) and is_connection_pool(inner.conn):
+            with inner.conn.connection() as conn, conn.transaction():
+                saver = PostgresSaver(conn, serde=inner.serde)
+                for record in records:
+                    self._apply(saver, record)
+        else:
+            for record in records:
+                self._apply(inner, record)
+
+    async def _acommit(self, records: List[Dict[str, Any]], inner: Optional[BaseCheckpointSaver] = None) -> None:
+        inner = inner if inner is not None else self.inner
+        if isinstance(inner, ShardedCheckpointSaver):
+            for shard, shard_records in self._by_shard(inner, records):
+                await self._acommit(shard_records, shard)
+        elif is_async_connection_pool(inner.conn):
+            async with inner.conn.connection() as conn, conn.transaction():
+                saver = AsyncPostgresSaver(conn, serde=inner.serde)
+                for record in records:
+                    await self._aapply(saver, record)
+        else:
+            for record in records:
+                await self._aapply(inner, record)
+
+    def _commit_each(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Commit a batch one write at a time; returns the writes that failed"""
+        failed = []
+        for op in batch:
+            try:
+                self._commit([self.serde.loads_typed(op["record"])])
+            except Exception:
+                failed.append(op)
+        return failed
+
+    async def _acommit_each(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        failed = []
+        for op in batch:
+            try:
+                await self._acommit([self.serde.loads_typed(op["record"])])
+            except Exception:
+                failed.append(op)
+        return failed
+
+    def _exhausted(self, batch: List[Dict[str, Any]]) -> bool:
+        """Count a failed commit of the batch; True once it has failed max_attempts times in a row"""
+        with self._lock:
+            if self._head is not batch[0]:
+                self._head, self._attempts = batch[0], 0
+            self._attempts += 1
+            return self._attempts >= self.max_attempts
+
+    def _bury(self, failed: List[Dict[str, Any]], error: Exception) -> int:
+        """Move writes that keep failing to a dead-letter segment; returns how many"""
+        if not failed:
+            return 0
+        path = os.path.join(self.dead_letter_dir, f"{time.time_ns()}-{os.getpid()}.log")
+        CheckpointJournal.write(path, [op["record"] for op in failed])
+        threads = sorted({op["key"][0] for op in failed})
+        logging.error(f"Dead-lettered {len(failed)} checkpoint write(s) of thread(s) {', '.join(threads)} "
+                      f"after {self.max_attempts} failed commits, kept in {path}: {error}")
+        return len(failed)
+
+    @staticmethod
+    def _by_shard(sharded: ShardedCheckpointSaver, records: List[Dict[str, Any]]):
+        """Split a batch by the shard of each thread, keeping the order of each thread's writes"""
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for record in records:
+            groups.setdefault(sharded.owner(record["config"]["configurable"]["thread_id"]), []).append(record)
+        return [(sharded.shards[name], shard_records) for name, shard_records in groups.items()]
+
+    @staticmethod
+    def _apply(saver: BaseCheckpointSaver, record: Dict[str, Any]) -> None:
+        if record["kind"] == "put":
+            saver.put(record["config"], record["checkpoint"], record["metadata"], record["new_versions"])
+        else:
+            saver.put_writes(record["config"], [tuple(write) for write in record["writes"]],
+                             record["task_id"], record["task_path"])
+
+    @staticmethod
+    async def _aapply(saver: BaseCheckpointSaver, record: Dict[str, Any]) -> None:
+        if record["kind"] == "put":
+            await saver.aput(record["config"], record["checkpoint"], record["metadata"], record["new_versions"])
+        else:
+            await saver.aput_writes(record["config"], [tuple(write) for write in record["writes"]],
+                                    record["task_id"], record["task_path"])
+
+    # Buffer
+
+    def _put_op(self, config: RunnableConfig, checkpoint: Checkpoint, metadata: CheckpointMetadata,
+                new_versions: ChannelVersions) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        # Serialized now: the graph keeps mutating its checkpoint after put returns
+        record = self.serde.dumps_typed({
+            "kind": "put",
+            "config": self._portable(config),
+            "checkpoint": checkpoint,
+            "metadata": metadata,
+            "new_versions": new_versions,
+        })
+        op = {"key": self._key(config), "checkpoint_id": checkpoint["id"], "record": record}
+        return op, {"record": record, "writes": [], "ops": 0}
+
+    def _writes_op(self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str,
+                   task_path: str) -> Dict[str, Any]:
+        record = self.serde.dumps_typed({
+            "kind": "writes",
+            "config": self._portable(config),
+            "writes": [list(write) for write in writes],
+            "task_id": task_id,
+            "task_path": task_path,
+        })
+        return {"key": self._key(config), "checkpoint_id": config["configurable"]["checkpoint_id"], "record": record}
+
+    def _buffer(self, op: Dict[str, Any], entry: Optional[Dict[str, Any]] = None) -> bool:
+        """Buffer a write (and journal it); False if the buffer is full"""
+        key, checkpoint_id = op["key"], op["checkpoint_id"]
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                return False
+            op["segment"] = self.journal.append(op["record"]) if self.journal is not None else None
+            self._pending.append(op)
+            self._unflushed[key] = self._unflushed.get(key, 0) + 1
+
+            entries = self._overlay.setdefault(key, OrderedDict())
+            if entry is not None:
+                previous = entries.pop(checkpoint_id, None)
+                if previous is not None:
+                    entry["writes"], entry["ops"] = previous["writes"], previous["ops"]
+                entries[checkpoint_id] = entry
+            elif checkpoint_id in entries:
+                entries[checkpoint_id]["writes"].append(op["record"])
+            if checkpoint_id in entries:
+                entries[checkpoint_id]["ops"] += 1
+            if not entries:
+                del self._overlay[key]
+
+            if len(self._pending) >= self.max_batch:
+                self._lock.notify_all()
+            self._report()
+        return True
+
+    async def _abuffer(self, op: Dict[str, Any], entry: Optional[Dict[str, Any]] = None) -> None:
+        waited = 0.0
+        while not self._buffer(op, entry):
+            if waited >= FULL_BUFFER_TIMEOUT:
+                raise TimeoutError(f"Checkpoint write buffer full ({self.max_pending} writes) for {waited:.0f}s")
+            await asyncio.sleep(self.flush_interval)
+            waited += self.flush_interval
+        if self._wake is not None and len(self._pending) >= self.max_batch:
+            self._wake.set()
+
+    def _wait_for_room(self) -> None:
+        with self._lock:
+            if not self._lock.wait_for(lambda: len(self._pending) < self.max_pending, FULL_BUFFER_TIMEOUT):
+                raise TimeoutError(f"Checkpoint write buffer full ({self.max_pending} writes) "
+                                   f"for {FULL_BUFFER_TIMEOUT}s")
+
+    def _take_batch(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            batch = list(itertools.islice(self._pending, self.max_batch))
+            if batch and self.journal is not None:
+                self.journal.rotate()
+        return batch
+
+    def _release(self, batch: List[Dict[str, Any]], dead_lettered: int = 0) -> None:
+        """Drop a committed (or dead-lettered) batch from the buffer and its segments from the journal"""
+        with self._lock:
+            for op in batch:
+                self._pending.popleft()
+                key, checkpoint_id = op["key"], op["checkpoint_id"]
+                entries = self._overlay.get(key)
+                if entries is not None and checkpoint_id in entries:
+                    entries[checkpoint_id]["ops"] -= 1
+                    if entries[checkpoint_id]["ops"] <= 0:
+                        del entries[checkpoint_id]
+                    if not entries:
+                        del self._overlay[key]
+                self._unflushed[key] -= 1
+                if not self._unflushed[key]:
+                    del self._unflushed[key]
+
+            self.flushed += len(batch) - dead_lettered
+            self.dead_lettered += dead_lettered
+            self.batches += 1
+            self._head, self._attempts = None, 0
+            if self.journal is not None:
+                self.journal.discard_before(self._pending[0]["segment"] if self._pending else self.journal.segment)
+            self._lock.notify_all()
+            self._report()
+
+    def _buffered(self, config: RunnableConfig) -> Tuple[bool, Optional[CheckpointTuple]]:
+        """The checkpoint a read asks for, if it is still in the buffer"""
+        checkpoint_id = get_checkpoint_id(config)
+        with self._lock:
+            entries = self._overlay.get(self._key(config))
+            if not entries:
+                return False, None
+            entry = entries.get(checkpoint_id) if checkpoint_id else entries[next(reversed(entries))]
+            if entry is None:
+                return False, None
+            record, writes = entry["record"], list(entry["writes"])
+
+        put = self.serde.loads_typed(record)
+        configurable = put["config"]["configurable"]
+        pending_writes = []
+        for typed in writes:
+            write = self.serde.loads_typed(typed)
+            pending_writes.extend((write["task_id"], channel, value) for channel, value in write["writes"])
+
+        parent_id = configurable.get("checkpoint_id")
+        return True, CheckpointTuple(
+            config=self._checkpoint_config(put["config"], put["checkpoint"]["id"]),
+            checkpoint=put["checkpoint"],
+            metadata=get_checkpoint_metadata(put["config"], put["metadata"]),
+            parent_config=self._checkpoint_config(put["config"], parent_id) if parent_id else None,
+            pending_writes=pending_writes,
+        )
+
+    def head(self, key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+        """A (thread_id, checkpoint_ns)'s latest buffered checkpoint id and whether it has pending
+        writes, like the committed head in the store; None when nothing of it is buffered"""
+        with self._lock:
+            if key not in self._unflushed:
+                return None
+            entries = self._overlay.get(key)
+            if not entries:
+                # Only writes to an already committed checkpoint are buffered
+                return {"checkpoint_id": None, "has_writes": True}
+            checkpoint_id = next(reversed(entries))
+            return {"checkpoint_id": checkpoint_id, "has_writes": bool(entries[checkpoint_id]["writes"])}
+
+    def _has_unflushed(self, config: Optional[RunnableConfig]) -> bool:
+        with self._lock:
+            if config is None:
+                return bool(self._unflushed)
+            thread_id = config["configurable"].get("thread_id")
+            return any(key[0] == thread_id for key in self._unflushed)
+
+    def _leftovers(self) -> Tuple[List[str], List[List[Dict[str, Any]]]]:
+        """Journal segments of a previous run, and their records in batches"""
+        if self.journal is None:
+            return [], []
+        paths = self.journal.leftovers()
+        records = [self.serde.loads_typed(typed) for path in paths for typed in CheckpointJournal.read(path)]
+        return paths, [records[i:i + self.max_batch] for i in range(0, len(records), self.max_batch)]
+
+    def _forget(self, paths: List[str], batches: List[List[Dict[str, Any]]]) -> None:
+        if self.journal is None:
+            return
+        self.journal.forget(paths)
+        replayed = sum(len(records) for records in batches)
+        if replayed:
+            logging.info(f"Replayed {replayed} checkpoint write(s) left in the journal by a previous run")
+
+    def _lost_on_shutdown(self, error: Exception) -> None:
+        pending = len(self._pending)
+        if self.journal is not None:
+            logging.error(f"Failed to flush {pending} checkpoint write(s) on shutdown: {error}; "
+                          "they stay in the journal and are replayed on the next start")
+        else:
+            logging.error(f"Failed to flush {pending} checkpoint write(s) on shutdown, they are lost: {error}")
+
+    def _close_journal(self) -> None:
+        if self.journal is not None:
+            self.journal.close(discard=not self._pending)
+
+    def _async_inner(self) -> bool:
+        inner = self.inner
+        if isinstance(inner, ShardedCheckpointSaver):
+            inner = inner.shards[inner.primary]
+        return POSTGRES_AVAILABLE and isinstance(inner, AsyncPostgresSaver)
+
+    def _measure(self):
+        return self.metrics.checkpoint("flush") if self.metrics is not None else nullcontext()
+
+    def _report(self) -> None:
+        if self.metrics is not None:
+            self.metrics.checkpoint_pending.set(len(self._pending))
+
+    @staticmethod
+    def _key(config: RunnableConfig) -> Tuple[str, str]:
+        return config["configurable"]["thread_id"], config["configurable"].get("checkpoint_ns", "")
+
+    @staticmethod
+    def _portable(config: RunnableConfig) -> RunnableConfig:
+        """The parts of a config the store keeps; runtime objects in it are not serializable"""
+        portable = {}
+        for section in ("configurable", "metadata"):
+            values = config.get(section) or {}
+            portable[section] = {
+                key: value for key, value in values.items()
+                if not key.startswith("__") and (value is None or isinstance(value, (str, int, float, bool)))
+            }
+        return portable
+
+    @staticmethod
+    def _checkpoint_config(config: RunnableConfig, checkpoint_id: str) -> RunnableConfig:
+        return {
+            "configurable": {
+                "thread_id": config["configurable"]["thread_id"],
+                "checkpoint_ns": config["configurable"].get("checkpoint_ns", ""),
+                "checkpoint_id": checkpoint_id,
+            }
+        }
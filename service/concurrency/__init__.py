@@ -0,0 +1,5 @@
+from .thread_locks import ThreadBusyError, ThreadLockManager, PostgresThreadLockManager
+from .admission import OverloadedError, AdmissionController, TokenBucketLimiter
+
+__all__ = ['ThreadBusyError', 'ThreadLockManager', 'PostgresThreadLockManager',
+           'OverloadedError', 'AdmissionController', 'TokenBucketLimiter']
\ No newline at end of file
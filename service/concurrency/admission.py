@@ -0,0 +1,178 @@
+import math
+import time
+import asyncio
+import threading
+from collections import OrderedDict
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+from service.config import Config
+
+
+class OverloadedError(Exception):
+    """Raised when a request is turned away; retry_after is a hint in whole seconds"""
+
+    def __init__(self, reason: str, retry_after: float):
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+        super().__init__(f"server overloaded ({reason}), retry after {self.retry_after}s")
+
+
+class AdmissionController:
+    """Bounds the turns running at once, with a bounded queue in front.
+
+    A turn runs when fewer than `max_concurrent` are in flight; otherwise it
+    waits, unless `max_queue` turns are already waiting, in which case it is
+    rejected at once. Waiting longer than `queue_timeout` also rejects it.
+    Each turn of a batch is admitted on its own. Sync and async admission
+    keep separate state, as a process serves in one mode only.
+    """
+
+    def __init__(self, max_concurrent: int, max_queue: int = 0, queue_timeout: float = 10.0, metrics=None):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.metrics = metrics
+        self._in_flight = 0
+        self._waiting = 0
+        self._condition = threading.Condition()
+        self._async_condition = None
+        # Moving average of a turn's duration, for Retry-After
+        self._turn_seconds = 1.0
+
+    @staticmethod
+    def from_config(config: Config, metrics=None) -> Optional["AdmissionController"]:
+        """Create the admission controller, or None if concurrency is not limited"""
+        admission = config.concurrency.admission
+        if admission.max_concurrent <= 0:
+            return None
+        return AdmissionController(admission.max_concurrent, admission.max_queue, admission.queue_timeout, metrics)
+
+    def check(self) -> None:
+        """Reject now if a new turn would be turned away, without taking a slot"""
+        if self._in_flight >= self.max_concurrent and self._waiting >= self.max_queue:
+            raise self._reject("queue_full")
+
+    @contextmanager
+    def admit(self):
+        """Hold a slot for the duration of the block"""
+        with self._condition:
+            if not self._has_room():
+                self._enqueue()
+                try:
+                    admitted = self._condition.wait_for(self._has_room, self.queue_timeout)
+                finally:
+                    self._dequeue()
+                if not admitted:
+                    raise self._reject("queue_timeout")
+            self._in_flight += 1
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._in_flight -= 1
+                self._observe(time.monotonic() - started)
+                self._condition.notify_all()
+
+    @asynccontextmanager
+    async def aadmit(self):
+        """Async variant of admit for the event-loop serving mode"""
+        if self._async_condition is None:
+            self._async_condition = asyncio.Condition()
+        condition = self._async_condition
+
+        async with condition:
+            if not self._has_room():
+                self._enqueue()
+                try:
+                    await asyncio.wait_for(condition.wait_for(self._has_room), self.queue_timeout)
+                except asyncio.TimeoutError:
+                    raise self._reject("queue_timeout")
+                finally:
+                    self._dequeue()
+            self._in_flight += 1
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            async with condition:
+                self._in_flight -= 1
+                self._observe(time.monotonic() - started)
+                condition.notify_all()
+
+    def stats(self):
+        return {"in_flight": self._in_flight, "waiting": self._waiting, "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue}
+
+    def _has_room(self) -> bool:
+        return self._in_flight < self.max_concurrent
+
+    def _enqueue(self):
+        if self._waiting >= self.max_queue:
+            raise self._reject("queue_full")
+        self._waiting += 1
+        if self.metrics is not None:
+            self.metrics.admission_waiting.inc()
+
+    def _dequeue(self):
+        self._waiting -= 1
+        if self.metrics is not None:
+            self.metrics.admission_waiting.dec()
+
+    def _observe(self, seconds: float):
+        self._turn_seconds = 0.9 * self._turn_seconds + 0.1 * seconds
+
+    def _reject(self, reason: str) -> OverloadedError:
+        if self.metrics is not None:
+            self.metrics.admission_rejections.labels(reason=reason).inc()
+        # Time for the queue ahead to drain through the available slots
+        return OverloadedError(reason, self._turn_seconds * (self._waiting + 1) / self.max_concurrent)
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets: `rate` requests per second with bursts up to `burst`.
+
+    Only the `max_keys` most recently seen keys keep a bucket; a key seen
+    again after being dropped starts with a full bucket.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100000, metrics=None):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.metrics = metrics
+        self._buckets = OrderedDict()  # key -> (tokens, updated)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def from_config(config: Config, metrics=None) -> Optional["TokenBucketLimiter"]:
+        """Create the rate limiter, or None if disabled"""
+        rate_limit = config.concurrency.rate_limit
+        if not rate_limit.enabled:
+            return None
+        return TokenBucketLimiter(rate_limit.rate, rate_limit.burst, rate_limit.max_keys, metrics)
+
+    def acquire(self, key: str, cost: float = 1) -> None:
+        """Take `cost` tokens from the key's bucket; raises OverloadedError if there are not enough.
+
+        A cost above `burst` could never be paid and raises ValueError.
+        """
+        if cost > self.burst:
+            raise ValueError(f"cost {cost} exceeds the rate limit burst ({self.burst})")
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+
+        if not allowed:
+            if self.metrics is not None:
+                self.metrics.admission_rejections.labels(reason="rate_limited").inc()
+            raise OverloadedError("rate_limited", (cost - tokens) / self.rate if self.rate > 0 else 60)
@@ -0,0 +1,248 @@
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import replace
+from typing import Dict, Optional
+from service.config import Config, PostgresConfig
+from service.checkpointer.postgres_pool import create_async_connection_pool, create_connection_pool
+
+
+class ThreadBusyError(Exception):
+    """Raised when a conversation thread stays locked by another request for too long"""
+
+    def __init__(self, thread_id: str, timeout: float):
+        super().__init__(f"thread {thread_id} is busy (waited {timeout}s)")
+        self.thread_id = thread_id
+        self.timeout = timeout
+
+
+class FairLock:
+    """A mutex that hands ownership to waiters in arrival (FIFO) order"""
+
+    def __init__(self):
+        self._mutex = threading.Lock()
+        self._locked = False
+        self._waiters = deque()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        with self._mutex:
+            if not self._locked and not self._waiters:
+                self._locked = True
+                return True
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+
+        if waiter.wait(timeout):
+            return True
+
+        with self._mutex:
+            if waiter.is_set():
+                # Ownership was handed over just as the wait timed out
+                return True
+            self._waiters.remove(waiter)
+            return False
+
+    def release(self) -> None:
+        with self._mutex:
+            if self._waiters:
+                # Hand ownership directly to the oldest waiter
+                self._waiters.popleft().set()
+            else:
+                self._locked = False
+
+
+class _LockEntry:
+    __slots__ = ("lock", "users")
+
+    def __init__(self, lock):
+        self.lock = lock
+        self.users = 0
+
+
+class ThreadLockManager:
+    """Serializes requests for the same conversation thread within one process.
+
+    Requests for one thread_id wait for each other in arrival order, while
+    different threads run in parallel. A lock only exists while some request
+    holds or waits for it, so memory stays proportional to the number of
+    in-flight threads, not to the number of threads ever seen.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout
+        self._locks: Dict[str, _LockEntry] = {}
+        self._guard = threading.Lock()
+        self._async_locks: Dict[str, _LockEntry] = {}
+
+    @staticmethod
+    def from_config(config: Config, connection_pool=None) -> Optional["ThreadLockManager"]:
+        """Create the thread lock manager configured for this deployment, or None if disabled"""
+        mode = config.concurrency.thread_lock
+        timeout = config.concurrency.lock_timeout
+
+        if mode == "none":
+            return None
+        if mode == "postgres":
+            if connection_pool is not None:
+                postgres = PostgresThreadLockManager.pool_config(config)
+                return PostgresThreadLockManager(
+                    create_connection_pool(postgres, connection_pool.conninfo, name="thread-locks"), timeout)
+            logging.warning("Postgres thread locks require the pooled Postgres checkpointer, using local locks")
+        elif mode != "local":
+            logging.warning(f"Unknown thread lock mode: {mode}, using local locks")
+        return ThreadLockManager(timeout)
+
+    @staticmethod
+    async def afrom_config(config: Config, connection_pool=None) -> Optional["ThreadLockManager"]:
+        """Async variant of from_config: Postgres locks get an asyncio pool"""
+        if config.concurrency.thread_lock == "postgres" and connection_pool is not None:
+            postgres = PostgresThreadLockManager.pool_config(config)
+            pool = await create_async_connection_pool(postgres, connection_pool.conninfo, name="thread-locks-async")
+            return PostgresThreadLockManager(pool, config.concurrency.lock_timeout)
+        return ThreadLockManager.from_config(config, connection_pool)
+
+    def close(self) -> None:
+        """Release the resources held by the lock manager"""
+
+    async def aclose(self) -> None:
+        """Async variant of close"""
+
+    @contextmanager
+    def hold(self, thread_id: str):
+        """Hold the thread's lock for the duration of the block"""
+        with self._guard:
+            entry = self._locks.get(thread_id)
+            if entry is None:
+                entry = self._locks[thread_id] = _LockEntry(FairLock())
+            entry.users += 1
+
+        try:
+            if not entry.lock.acquire(self.timeout):
+                raise ThreadBusyError(thread_id, self.timeout)
+            try:
+                yield
+            finally:
+                entry.lock.release()
+        finally:
+            with self._guard:
+                entry.users -= 1
+                if entry.users == 0:
+                    del self._locks[thread_id]
+
+    @asynccontextmanager
+    async def ahold(self, thread_id: str):
+        """Async variant of hold for the event-loop serving mode"""
+        entry = self._async_locks.get(thread_id)
+        if entry is None:
+            entry = self._async_locks[thread_id] = _LockEntry(asyncio.Lock())
+        entry.users += 1
+
+        try:
+            try:
+                await asyncio.wait_for(entry.lock.acquire(), self.timeout)
+            except asyncio.TimeoutError:
+                raise ThreadBusyError(thread_id, self.timeout)
+            try:
+                yield
+            finally:
+                entry.lock.release()
+        finally:
+            entry.users -= 1
+            if entry.users == 0:
+                del self._async_locks[thread_id]
+
+    def __len__(self) -> int:
+        return len(self._locks) + len(self._async_locks)
+
+
+class PostgresThreadLockManager(ThreadLockManager):
+    """Serializes requests for the same thread across instances with Postgres advisory locks.
+
+    Requests in one process first queue on the local lock, so only one
+    connection per thread is spent waiting on the database. The advisory
+    lock is session-level and is released before the connection goes back
+    to the pool; if the instance dies, Postgres releases it with the session.
+
+    A lock keeps its connection for the whole turn, so locks get a pool of
+    their own (see pool_config) rather than the checkpointer's: a turn never
+    waits for a checkpoint connection held by another turn's lock.
+    """
+
+    POLL_INTERVAL = 0.05
+    MAX_POLL_INTERVAL = 1.0
+
+    def __init__(self, pool, timeout: Optional[float] = None):
+        super().__init__(timeout)
+        self.pool = pool
+
+    @staticmethod
+    def pool_config(config: Config) -> PostgresConfig:
+        """Settings of the lock pool: the checkpoint pool's, sized for the turns a process runs at once.
+
+        Turns take their lock before their admission slot, so queued turns
+        hold a connection too. Without an explicit lock_pool_size the pool
+        grows up to admission.max_concurrent + max_queue connections, or
+        app.threads plus a batch's concurrency when admission is unlimited.
+        """
+        concurrency = config.concurrency
+        size = concurrency.lock_pool_size
+        if size <= 0 and concurrency.admission.max_concurrent > 0:
+            size = concurrency.admission.max_concurrent + concurrency.admission.max_queue
+        if size <= 0:
+            size = config.app.threads + config.api.batch.get("max_concurrency", 16)
+        postgres = config.checkpoint.postgres
+        kept_open = min(size, postgres.pool_size)
+        return replace(postgres, pool_size=kept_open, max_overflow=size - kept_open)
+
+    def close(self) -> None:
+        self.pool.close()
+
+    async def aclose(self) -> None:
+        await self.pool.close()
+
+    @staticmethod
+    def lock_key(thread_id: str) -> int:
+        """Signed 64-bit advisory lock key for a thread id"""
+        digest = hashlib.blake2b(str(thread_id).encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big", signed=True)
+
+    @contextmanager
+    def hold(self, thread_id: str):
+        started = time.monotonic()
+        with super().hold(thread_id):
+            key = self.lock_key(thread_id)
+            with self.pool.connection() as conn:
+                interval = self.POLL_INTERVAL
+                while not conn.execute("SELECT pg_try_advisory_lock(%s) AS locked", (key,)).fetchone()["locked"]:
+                    if self.timeout is not None and time.monotonic() - started > self.timeout:
+                        raise ThreadBusyError(thread_id, self.timeout)
+                    time.sleep(interval)
+                    interval = min(interval * 2, self.MAX_POLL_INTERVAL)
+                try:
+                    yield
+                finally:
+                    conn.execute("SELECT pg_advisory_unlock(%s)", (key,))
+
+    @asynccontextmanager
+    async def ahold(self, thread_id: str):
+        started = time.monotonic()
+        async with super().ahold(thread_id):
+            key = self.lock_key(thread_id)
+            async with self.pool.connection() as conn:
+                interval = self.POLL_INTERVAL
+                while True:
+                    cursor = await conn.execute("SELECT pg_try_advisory_lock(%s) AS locked", (key,))
+                    if (await cursor.fetchone())["locked"]:
+                        break
+                    if self.timeout is not None and time.monotonic() - started > self.timeout:
+                        raise ThreadBusyError(thread_id, self.timeout)
+                    await asyncio.sleep(interval)
+                    interval = min(interval * 2, self.MAX_POLL_INTERVAL)
+                try:
+                    yield
+                finally:
+                    await conn.execute("SELECT pg_advisory_unlock(%s)", (key,))
@@ -1,3 +1,3 @@
-from .config_loader import ConfigLoader, Config
+from .config_loader import ConfigLoader, Config, PostgresConfig, PostgresShardConfig, SqliteConfig, ContextConfig, RetentionConfig, MemoryConfig, SerializerConfig, LoggingConfig, GraphNodeConfig, JobsConfig, IdempotencyConfig, WriteBehindConfig
 
-__all__ = ['ConfigLoader', 'Config']
\ No newline at end of file
+__all__ = ['ConfigLoader', 'Config', 'PostgresConfig', 'PostgresShardConfig', 'SqliteConfig', 'ContextConfig', 'RetentionConfig', 'MemoryConfig', 'SerializerConfig', 'LoggingConfig', 'GraphNodeConfig', 'JobsConfig', 'IdempotencyConfig', 'WriteBehindConfig']
\ No newline at end of file
@@ -1,8 +1,8 @@
 import os
 import yaml
 import logging
-from typing import Dict, Any, Optional
-from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
+from dataclasses import dataclass, field, replace
 
 
 @dataclass
@@ -11,6 +11,10 @@ class AppConfig:
     version: str = "1.0.0"
     debug: bool = True
     port: int = 3000
+    mode: str = "sync"  # sync (Flask, WSGI), async (Quart, ASGI)
+    workers: int = 2  # gunicorn worker processes (override with WEB_CONCURRENCY)
+    threads: int = 8  # request threads per worker in sync mode (override with THREADS)
+    worker_timeout: int = 120  # seconds before a silent worker is restarted; covers slow LLM calls
 
 
 @dataclass
@@ -34,30 +38,180 @@ class PostgresConfig:
     connection_string_env: str = "POSTGRES_CONNECTION_STRING"
     pool_size: int = 10
     max_overflow: int = 20
+    pool_timeout: float = 30.0
+    pool_max_idle: float = 600.0
+    # Thread-sharded storage: each entry names a shard and overrides the settings above
+    shards: List[Dict[str, Any]] = field(default_factory=list)
+    virtual_nodes: int = 160  # points per shard on the consistent hash ring
+
+
+@dataclass
+class PostgresShardConfig:
+    name: str  # placement on the hash ring derives from the name, so a shard must never be renamed
+    postgres: PostgresConfig
+    joining: bool = False  # being added: threads it takes over are moved from their previous shard on access
+    sqlite_path: Optional[str] = None  # local stand-in: store this shard in a SQLite file instead
+
+
+@dataclass
+class RetentionConfig:
+    enabled: bool = False  # run the background pruning job in the app
+    keep_last: int = 20  # checkpoints kept per thread, 0 keeps all
+    thread_ttl_hours: float = 0  # delete threads idle for longer, 0 disables
+    batch_size: int = 1000
+    interval_seconds: int = 3600
+
+
+@dataclass
+class CheckpointCacheConfig:
+    enabled: bool = False
+    max_bytes: int = 64 * 1024 * 1024
+    ttl_seconds: float = 300
+    invalidation: str = "validate"  # validate (check latest id in Postgres), ttl (trust entries for ttl_seconds)
+
+
+@dataclass
+class WriteBehindConfig:
+    enabled: bool = False
+    durability: str = "journal"  # memory (lost on crash), journal (survives a process crash), fsync (and power loss)
+    journal_dir: str = "data/checkpoint-journal"
+    flush_interval_ms: int = 50  # how long writes may wait to be group-committed
+    max_batch: int = 256  # checkpoint writes per transaction
+    max_pending: int = 10000  # writers block once this many writes are buffered
+    max_attempts: int = 5  # failed commits of a batch before the writes that keep failing are dead-lettered
+    flush_on_release: bool = True  # commit a thread's writes before its turn releases the thread lock
+
+
+@dataclass
+class SqliteConfig:
+    path: str = "data/checkpoints.sqlite"
+    pool_size: int = 4  # reader connections; writes share one connection
+    busy_timeout: float = 30.0  # seconds to wait for a lock or a free connection
+    synchronous: str = "NORMAL"  # NORMAL (no fsync per commit in WAL mode), FULL (fsync every commit)
+    cache_size_kb: int = 16384  # page cache per connection
+
+
+@dataclass
+class MemoryConfig:
+    max_bytes: int = 0  # serialized checkpoint bytes kept in memory, 0 is unbounded
+    max_threads: int = 0  # threads kept in memory, 0 is unbounded
+    idle_ttl_seconds: float = 0  # evict threads idle for longer, 0 disables
+    spill_dir: Optional[str] = None  # write evicted threads here instead of dropping them
+
+
+@dataclass
+class SerializerConfig:
+    type: str = "jsonplus"  # jsonplus (library default), compact (msgpack, compressed above threshold_bytes)
+    compression: str = "zstd"  # zstd (needs zstandard, else zlib), zlib, none
+    threshold_bytes: int = 1024  # values encoding to fewer bytes are stored uncompressed
+    level: int = 3
 
 
 @dataclass
 class CheckpointConfig:
-    type: str = "auto"  # auto, memory, postgres
+    type: str = "auto"  # auto, memory, postgres, sqlite
     postgres: PostgresConfig = field(default_factory=PostgresConfig)
+    sqlite: SqliteConfig = field(default_factory=SqliteConfig)
+    memory: MemoryConfig = field(default_factory=MemoryConfig)
+    retention: RetentionConfig = field(default_factory=RetentionConfig)
+    cache: CheckpointCacheConfig = field(default_factory=CheckpointCacheConfig)
+    serializer: SerializerConfig = field(default_factory=SerializerConfig)
+    write_behind: WriteBehindConfig = field(default_factory=WriteBehindConfig)
+
+
+@dataclass
+class CacheConfig:
+    enabled: bool = False
+    backend: str = "local"  # local, postgres (local LRU in front of a shared Postgres table)
+    max_entries: int = 1000
+    ttl_seconds: int = 3600
+    force: bool = False  # cache even when model temperature > 0
+
+
+@dataclass
+class AdmissionConfig:
+    max_concurrent: int = 0  # turns running at once per process, 0 is unlimited
+    max_queue: int = 64  # turns waiting for a slot; more are rejected with 429
+    queue_timeout: float = 10.0  # seconds a turn may wait for a slot
+
+
+@dataclass
+class RateLimitConfig:
+    enabled: bool = False
+    key: str = "client"  # client (client_header, else remote address), thread
+    rate: float = 1.0  # requests per second per key
+    burst: int = 10
+    client_header: str = "X-Client-Id"
+    max_keys: int = 100000  # buckets kept in memory (least recently seen are dropped)
+
+
+@dataclass
+class ConcurrencyConfig:
+    thread_lock: str = "local"  # none, local (per process), postgres (advisory locks across instances)
+    lock_timeout: float = 60.0
+    lock_pool_size: int = 0  # connections for postgres locks, 0 sizes it from admission or app.threads
+    admission: AdmissionConfig = field(default_factory=AdmissionConfig)
+    rate_limit: RateLimitConfig = field(default_factory=RateLimitConfig)
 
 
 @dataclass
 class APIConfig:
     endpoints: Dict[str, str] = field(default_factory=lambda: {
         "message": "/message",
-        "health": "/health"
+        "health": "/health",
+        "metrics": "/metrics"
     })
     cors: Dict[str, Any] = field(default_factory=lambda: {
         "enabled": False,
         "origins": ["*"]
     })
+    response_mode: str = "full"  # full (whole thread), delta (messages of this turn only)
+    pagination: Dict[str, int] = field(default_factory=lambda: {
+        "default_limit": 50,
+        "max_limit": 200
+    })
+    batch: Dict[str, int] = field(default_factory=lambda: {
+        "max_items": 1000,
+        "max_concurrency": 16
+    })
+
+
+@dataclass
+class MetricsConfig:
+    enabled: bool = True  # needs prometheus_client; served on api.endpoints.metrics
+
+
+@dataclass
+class JobsConfig:
+    enabled: bool = False  # POST /message?async=true returns 202 and a job id, GET /jobs/<id> the result
+    workers: int = 4  # turns run in the background at once per process
+    max_queue: int = 1000  # jobs waiting per process; more are rejected with 429
+    result_ttl: float = 3600  # seconds finished jobs stay readable
+    max_wait: float = 30  # longest long poll (GET /jobs/<id>?wait=seconds)
+    store: str = "memory"  # memory, sqlite (queued jobs survive restarts, shared by the workers of a node)
+    sqlite_path: str = "data/jobs.sqlite"
+
+
+@dataclass
+class IdempotencyConfig:
+    enabled: bool = True  # honour Idempotency-Key headers on POST /message
+    header: str = "Idempotency-Key"
+    backend: str = "memory"  # memory (per process), postgres (shared table in the checkpoint database)
+    max_entries: int = 1000  # responses kept in memory
+    ttl_seconds: int = 86400  # how long a finished request's response is replayed
+    wait_timeout: float = 60  # seconds a retry waits for the running request before 409
+    claim_ttl: float = 300  # postgres: seconds before a crashed instance's running key is released
 
 
 @dataclass
 class ToolsConfig:
     enabled: list = field(default_factory=list)
-    # Dynamic tool configurations will be added here
+    settings: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # per-tool sections, keyed by tool name
+    max_workers: int = 8  # tool calls running at once per process
+    timeout: float = 30  # seconds per tool call; a tool's section may set its own
+    max_rounds: int = 5  # model -> tools round trips per turn before the model must answer
+    cache_max_entries: int = 1000  # memoized results of tools whose section sets cache: true
+    cache_ttl_seconds: int = 300
 
 
 @dataclass
@@ -65,6 +219,13 @@ class LoggingConfig:
     level: str = "INFO"
     format: str = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
     file: Optional[str] = None
+    json: bool = False  # one JSON object per line, with request_id and thread_id
+    queue: bool = False  # hand records to a background thread instead of writing inline
+    queue_size: int = 10000  # records beyond this are dropped rather than blocking requests
+    payload: str = "truncate"  # full, truncate, omit (request bodies in the logs)
+    max_payload_chars: int = 200
+    redact_keys: list = field(default_factory=lambda: ["password", "api_key", "token", "authorization", "secret"])
+    debug_sample_rate: float = 1.0  # fraction of requests whose DEBUG lines are kept
 
 
 @dataclass
@@ -72,16 +233,32 @@ class GraphNodeConfig:
     enabled: bool = True
     log_messages: bool = False
     log_completion: bool = False
-    timeout: int = 30
+    timeout: float = 30  # seconds for the node's model call, retries included (0 disables)
+    retries: int = 2  # extra attempts after a transient failure (429, 5xx, connection errors)
+    retry_backoff: float = 0.5  # base of the full-jitter exponential backoff, in seconds
+    retry_max_backoff: float = 8.0
+    hedge: bool = False  # start a second attempt when the first is slow; the first answer wins
+    hedge_delay: float = 0  # seconds before hedging, 0 uses the recent hedge_quantile latency
+    hedge_quantile: float = 0.95
+
+
+@dataclass
+class ContextConfig:
+    enabled: bool = False
+    max_tokens: int = 8000
+    keep_last_turns: int = 4
+    summary_max_tokens: int = 500
 
 
 @dataclass
 class GraphConfig:
     nodes: Dict[str, GraphNodeConfig] = field(default_factory=lambda: {
         "start": GraphNodeConfig(enabled=True, log_messages=True),
-        "agent": GraphNodeConfig(enabled=True, timeout=30),
+        "agent": GraphNodeConfig(enabled=True),
         "end": GraphNodeConfig(enabled=True, log_completion=True)
     })
+    context: ContextConfig = field(default_factory=ContextConfig)
+    durability: str = "async"  # sync, async (checkpoint every step), exit (checkpoint once per turn)
 
 
 @dataclass
@@ -89,7 +266,12 @@ class Config:
     app: AppConfig = field(default_factory=AppConfig)
     model: ModelConfig = field(default_factory=ModelConfig)
     checkpoint: CheckpointConfig = field(default_factory=CheckpointConfig)
+    cache: CacheConfig = field(default_factory=CacheConfig)
+    concurrency: ConcurrencyConfig = field(default_factory=ConcurrencyConfig)
     api: APIConfig = field(default_factory=APIConfig)
+    metrics: MetricsConfig = field(default_factory=MetricsConfig)
+    jobs: JobsConfig = field(default_factory=JobsConfig)
+    idempotency: IdempotencyConfig = field(default_factory=IdempotencyConfig)
     tools: ToolsConfig = field(default_factory=ToolsConfig)
     logging: LoggingConfig = field(default_factory=LoggingConfig)
     graph: GraphConfig = field(default_factory=GraphConfig)
@@ -143,7 +325,11 @@ class ConfigLoader:
                 name=app_data.get('name', config.app.name),
                 version=app_data.get('version', config.app.version),
                 debug=app_data.get('debug', config.app.debug),
-                port=app_data.get('port', config.app.port)
+                port=app_data.get('port', config.app.port),
+                mode=app_data.get('mode', config.app.mode),
+                workers=app_data.get('workers', config.app.workers),
+                threads=app_data.get('threads', config.app.threads),
+                worker_timeout=app_data.get('worker_timeout', config.app.worker_timeout)
             )
 
         # Load model config
@@ -160,6 +346,12 @@ class ConfigLoader:
         if 'checkpoint' in data:
             checkpoint_data = data['checkpoint']
             postgres_data = checkpoint_data.get('postgres', {})
+            sqlite_data = checkpoint_data.get('sqlite', {})
+            memory_data = checkpoint_data.get('memory', {})
+            retention_data = checkpoint_data.get('retention', {})
+            cache_data = checkpoint_data.get('cache', {})
+            serializer_data = checkpoint_data.get('serializer', {})
+            write_behind_data = checkpoint_data.get('write_behind', {})
 
             config.checkpoint = CheckpointConfig(
                 type=checkpoint_data.get('type', config.checkpoint.type),
@@ -171,7 +363,88 @@ class ConfigLoader:
                     password_env=postgres_data.get('password_env', config.checkpoint.postgres.password_env),
                     connection_string_env=postgres_data.get('connection_string_env', config.checkpoint.postgres.connection_string_env),
                     pool_size=postgres_data.get('pool_size', config.checkpoint.postgres.pool_size),
-                    max_overflow=postgres_data.get('max_overflow', config.checkpoint.postgres.max_overflow)
+                    max_overflow=postgres_data.get('max_overflow', config.checkpoint.postgres.max_overflow),
+                    pool_timeout=postgres_data.get('pool_timeout', config.checkpoint.postgres.pool_timeout),
+                    pool_max_idle=postgres_data.get('pool_max_idle', config.checkpoint.postgres.pool_max_idle),
+                    shards=postgres_data.get('shards', config.checkpoint.postgres.shards) or [],
+                    virtual_nodes=postgres_data.get('virtual_nodes', config.checkpoint.postgres.virtual_nodes)
+                ),
+                sqlite=SqliteConfig(
+                    path=sqlite_data.get('path', config.checkpoint.sqlite.path),
+                    pool_size=sqlite_data.get('pool_size', config.checkpoint.sqlite.pool_size),
+                    busy_timeout=sqlite_data.get('busy_timeout', config.checkpoint.sqlite.busy_timeout),
+                    synchronous=sqlite_data.get('synchronous', config.checkpoint.sqlite.synchronous),
+                    cache_size_kb=sqlite_data.get('cache_size_kb', config.checkpoint.sqlite.cache_size_kb)
+                ),
+                memory=MemoryConfig(
+                    max_bytes=memory_data.get('max_bytes', config.checkpoint.memory.max_bytes),
+                    max_threads=memory_data.get('max_threads', config.checkpoint.memory.max_threads),
+                    idle_ttl_seconds=memory_data.get('idle_ttl_seconds', config.checkpoint.memory.idle_ttl_seconds),
+                    spill_dir=memory_data.get('spill_dir', config.checkpoint.memory.spill_dir)
+                ),
+                retention=RetentionConfig(
+                    enabled=retention_data.get('enabled', config.checkpoint.retention.enabled),
+                    keep_last=retention_data.get('keep_last', config.checkpoint.retention.keep_last),
+                    thread_ttl_hours=retention_data.get('thread_ttl_hours', config.checkpoint.retention.thread_ttl_hours),
+                    batch_size=retention_data.get('batch_size', config.checkpoint.retention.batch_size),
+                    interval_seconds=retention_data.get('interval_seconds', config.checkpoint.retention.interval_seconds)
+                ),
+                cache=CheckpointCacheConfig(
+                    enabled=cache_data.get('enabled', config.checkpoint.cache.enabled),
+                    max_bytes=cache_data.get('max_bytes', config.checkpoint.cache.max_bytes),
+                    ttl_seconds=cache_data.get('ttl_seconds', config.checkpoint.cache.ttl_seconds),
+                    invalidation=cache_data.get('invalidation', config.checkpoint.cache.invalidation)
+                ),
+                serializer=SerializerConfig(
+                    type=serializer_data.get('type', config.checkpoint.serializer.type),
+                    compression=serializer_data.get('compression', config.checkpoint.serializer.compression),
+                    threshold_bytes=serializer_data.get('threshold_bytes', config.checkpoint.serializer.threshold_bytes),
+                    level=serializer_data.get('level', config.checkpoint.serializer.level)
+                ),
+                write_behind=WriteBehindConfig(
+                    enabled=write_behind_data.get('enabled', config.checkpoint.write_behind.enabled),
+                    durability=write_behind_data.get('durability', config.checkpoint.write_behind.durability),
+                    journal_dir=write_behind_data.get('journal_dir', config.checkpoint.write_behind.journal_dir),
+                    flush_interval_ms=write_behind_data.get('flush_interval_ms', config.checkpoint.write_behind.flush_interval_ms),
+                    max_batch=write_behind_data.get('max_batch', config.checkpoint.write_behind.max_batch),
+                    max_pending=write_behind_data.get('max_pending', config.checkpoint.write_behind.max_pending),
+                    max_attempts=write_behind_data.get('max_attempts', config.checkpoint.write_behind.max_attempts),
+                    flush_on_release=write_behind_data.get('flush_on_release', config.checkpoint.write_behind.flush_on_release)
+                )
+            )
+
+        # Load cache config
+        if 'cache' in data:
+            cache_data = data['cache']
+            config.cache = CacheConfig(
+                enabled=cache_data.get('enabled', config.cache.enabled),
+                backend=cache_data.get('backend', config.cache.backend),
+                max_entries=cache_data.get('max_entries', config.cache.max_entries),
+                ttl_seconds=cache_data.get('ttl_seconds', config.cache.ttl_seconds),
+                force=cache_data.get('force', config.cache.force)
+            )
+
+        # Load concurrency config
+        if 'concurrency' in data:
+            concurrency_data = data['concurrency']
+            admission_data = concurrency_data.get('admission', {})
+            rate_limit_data = concurrency_data.get('rate_limit', {})
+            config.concurrency = ConcurrencyConfig(
+                thread_lock=concurrency_data.get('thread_lock', config.concurrency.thread_lock),
+                lock_timeout=concurrency_data.get('lock_timeout', config.concurrency.lock_timeout),
+                lock_pool_size=concurrency_data.get('lock_pool_size', config.concurrency.lock_pool_size),
+                admission=AdmissionConfig(
+                    max_concurrent=admission_data.get('max_concurrent', config.concurrency.admission.max_concurrent),
+                    max_queue=admission_data.get('max_queue', config.concurrency.admission.max_queue),
+                    queue_timeout=admission_data.get('queue_timeout', config.concurrency.admission.queue_timeout)
+                ),
+                rate_limit=RateLimitConfig(
+                    enabled=rate_limit_data.get('enabled', config.concurrency.rate_limit.enabled),
+                    key=rate_limit_data.get('key', config.concurrency.rate_limit.key),
+                    rate=rate_limit_data.get('rate', config.concurrency.rate_limit.rate),
+                    burst=rate_limit_data.get('burst', config.concurrency.rate_limit.burst),
+                    client_header=rate_limit_data.get('client_header', config.concurrency.rate_limit.client_header),
+                    max_keys=rate_limit_data.get('max_keys', config.concurrency.rate_limit.max_keys)
                 )
             )
 
@@ -179,15 +452,57 @@ class ConfigLoader:
         if 'api' in data:
             api_data = data['api']
             config.api = APIConfig(
-                endpoints=api_data.get('endpoints', config.api.endpoints),
-                cors=api_data.get('cors', config.api.cors)
+                endpoints={**config.api.endpoints, **api_data.get('endpoints', {})},
+                cors=api_data.get('cors', config.api.cors),
+                response_mode=api_data.get('response_mode', config.api.response_mode),
+                pagination={**config.api.pagination, **api_data.get('pagination', {})},
+                batch={**config.api.batch, **api_data.get('batch', {})}
+            )
+
+        # Load metrics config
+        if 'metrics' in data:
+            metrics_data = data['metrics']
+            config.metrics = MetricsConfig(
+                enabled=metrics_data.get('enabled', config.metrics.enabled)
+            )
+
+        # Load jobs config
+        if 'jobs' in data:
+            jobs_data = data['jobs']
+            config.jobs = JobsConfig(
+                enabled=jobs_data.get('enabled', config.jobs.enabled),
+                workers=jobs_data.get('workers', config.jobs.workers),
+                max_queue=jobs_data.get('max_queue', config.jobs.max_queue),
+                result_ttl=jobs_data.get('result_ttl', config.jobs.result_ttl),
+                max_wait=jobs_data.get('max_wait', config.jobs.max_wait),
+                store=jobs_data.get('store', config.jobs.store),
+                sqlite_path=jobs_data.get('sqlite_path', config.jobs.sqlite_path)
+            )
+
+        # Load idempotency config
+        if 'idempotency' in data:
+            idempotency_data = data['idempotency']
+            config.idempotency = IdempotencyConfig(
+                enabled=idempotency_data.get('enabled', config.idempotency.enabled),
+                header=idempotency_data.get('header', config.idempotency.header),
+                backend=idempotency_data.get('backend', config.idempotency.backend),
+                max_entries=idempotency_data.get('max_entries', config.idempotency.max_entries),
+                ttl_seconds=idempotency_data.get('ttl_seconds', config.idempotency.ttl_seconds),
+                wait_timeout=idempotency_data.get('wait_timeout', config.idempotency.wait_timeout),
+                claim_ttl=idempotency_data.get('claim_ttl', config.idempotency.claim_ttl)
             )
 
         # Load tools config
         if 'tools' in data:
             tools_data = data['tools']
             config.tools = ToolsConfig(
-                enabled=tools_data.get('enabled', config.tools.enabled)
+                enabled=tools_data.get('enabled', config.tools.enabled),
+                settings={name: value for name, value in tools_data.items() if isinstance(value, dict)},
+                max_workers=tools_data.get('max_workers', config.tools.max_workers),
+                timeout=tools_data.get('timeout', config.tools.timeout),
+                max_rounds=tools_data.get('max_rounds', config.tools.max_rounds),
+                cache_max_entries=tools_data.get('cache_max_entries', config.tools.cache_max_entries),
+                cache_ttl_seconds=tools_data.get('cache_ttl_seconds', config.tools.cache_ttl_seconds)
             )
 
         # Load logging config
@@ -196,7 +511,14 @@ class ConfigLoader:
             config.logging = LoggingConfig(
                 level=logging_data.get('level', config.logging.level),
                 format=logging_data.get('format', config.logging.format),
-                file=logging_data.get('file', config.logging.file)
+                file=logging_data.get('file', config.logging.file),
+                json=logging_data.get('json', config.logging.json),
+                queue=logging_data.get('queue', config.logging.queue),
+                queue_size=logging_data.get('queue_size', config.logging.queue_size),
+                payload=logging_data.get('payload', config.logging.payload),
+                max_payload_chars=logging_data.get('max_payload_chars', config.logging.max_payload_chars),
+                redact_keys=logging_data.get('redact_keys', config.logging.redact_keys),
+                debug_sample_rate=logging_data.get('debug_sample_rate', config.logging.debug_sample_rate)
             )
 
         # Load graph config
@@ -205,15 +527,34 @@ class ConfigLoader:
             nodes_data = graph_data.get('nodes', {})
 
             nodes = {}
+            defaults = GraphNodeConfig()
             for node_name, node_data in nodes_data.items():
                 nodes[node_name] = GraphNodeConfig(
-                    enabled=node_data.get('enabled', True),
-                    log_messages=node_data.get('log_messages', False),
-                    log_completion=node_data.get('log_completion', False),
-                    timeout=node_data.get('timeout', 30)
+                    enabled=node_data.get('enabled', defaults.enabled),
+                    log_messages=node_data.get('log_messages', defaults.log_messages),
+                    log_completion=node_data.get('log_completion', defaults.log_completion),
+                    timeout=node_data.get('timeout', defaults.timeout),
+                    retries=node_data.get('retries', defaults.retries),
+                    retry_backoff=node_data.get('retry_backoff', defaults.retry_backoff),
+                    retry_max_backoff=node_data.get('retry_max_backoff', defaults.retry_max_backoff),
+                    hedge=node_data.get('hedge', defaults.hedge),
+                    hedge_delay=node_data.get('hedge_delay', defaults.hedge_delay),
+                    hedge_quantile=node_data.get('hedge_quantile', defaults.hedge_quantile)
                 )
 
-            config.graph = GraphConfig(nodes=nodes)
+            context_data = graph_data.get('context', {})
+            context = ContextConfig(
+                enabled=context_data.get('enabled', config.graph.context.enabled),
+                max_tokens=context_data.get('max_tokens', config.graph.context.max_tokens),
+                keep_last_turns=context_data.get('keep_last_turns', config.graph.context.keep_last_turns),
+                summary_max_tokens=context_data.get('summary_max_tokens', config.graph.context.summary_max_tokens)
+            )
+
+            config.graph = GraphConfig(
+                nodes=nodes or config.graph.nodes,
+                context=context,
+                durability=graph_data.get('durability', config.graph.durability)
+            )
 
         return config
 
@@ -234,6 +575,20 @@ class ConfigLoader:
             except ValueError:
                 logging.warning(f"Invalid PORT value: {port_env}")
 
+        workers_env = os.getenv('WEB_CONCURRENCY')
+        if workers_env is not None:
+            try:
+                self._config.app.workers = int(workers_env)
+            except ValueError:
+                logging.warning(f"Invalid WEB_CONCURRENCY value: {workers_env}")
+
+        threads_env = os.getenv('THREADS')
+        if threads_env is not None:
+            try:
+                self._config.app.threads = int(threads_env)
+            except ValueError:
+                logging.warning(f"Invalid THREADS value: {threads_env}")
+
         # Override postgres settings from environment
         postgres_host = os.getenv('POSTGRES_HOST')
         if postgres_host:
@@ -254,6 +609,20 @@ class ConfigLoader:
         if postgres_user:
             self._config.checkpoint.postgres.user = postgres_user
 
+        pool_size = os.getenv('POSTGRES_POOL_SIZE')
+        if pool_size:
+            try:
+                self._config.checkpoint.postgres.pool_size = int(pool_size)
+            except ValueError:
+                logging.warning(f"Invalid POSTGRES_POOL_SIZE value: {pool_size}")
+
+        max_overflow = os.getenv('POSTGRES_MAX_OVERFLOW')
+        if max_overflow:
+            try:
+                self._config.checkpoint.postgres.max_overflow = int(max_overflow)
+            except ValueError:
+                logging.warning(f"Invalid POSTGRES_MAX_OVERFLOW value: {max_overflow}")
+
     def get_api_key(self) -> str:
         """Get the API key from environment"""
         if self._config is None:
@@ -274,20 +643,67 @@ class ConfigLoader:
         """Get PostgreSQL connection string from environment or build it"""
         if self._config is None:
             return None
+        return self.build_postgres_connection_string(self._config.checkpoint.postgres)
 
+    @staticmethod
+    def build_postgres_connection_string(postgres: PostgresConfig) -> Optional[str]:
+        """Build a PostgreSQL connection string for the given postgres config"""
         # Check for direct connection string
-        conn_str = os.getenv(self._config.checkpoint.postgres.connection_string_env)
+        conn_str = os.getenv(postgres.connection_string_env)
         if conn_str:
             return conn_str
 
         # Build from components
-        password = self.get_postgres_password()
+        password = os.getenv(postgres.password_env)
         if not password:
             return None
 
-        postgres = self._config.checkpoint.postgres
         return f"postgresql://{postgres.user}:{password}@{postgres.host}:{postgres.port}/{postgres.database}"
 
+    def get_postgres_connection_strings(self) -> Dict[str, Optional[str]]:
+        """Get the connection string of every checkpoint shard, by shard name"""
+        if self._config is None:
+            return {}
+        return {
+            shard.name: self.build_postgres_connection_string(shard.postgres)
+            for shard in self.build_postgres_shards(self._config.checkpoint.postgres)
+            if shard.sqlite_path is None
+        }
+
+    @staticmethod
+    def build_postgres_shards(postgres: PostgresConfig) -> List[PostgresShardConfig]:
+        """The shards of the checkpoint database; a single "default" shard when not sharded.
+
+        A shard inherits every setting it does not override, except
+        connection_string_env: shards would otherwise share one database.
+        """
+        if not postgres.shards:
+            return [PostgresShardConfig(name="default", postgres=postgres)]
+
+        shards = []
+        for entry in postgres.shards:
+            settings = dict(entry)
+            name = settings.pop('name', None)
+            if not name:
+                raise ValueError("Every checkpoint.postgres.shards entry needs a name")
+            joining = bool(settings.pop('joining', False))
+            sqlite_path = settings.pop('sqlite_path', None)
+            settings.setdefault('connection_string_env', "")
+            try:
+                shard_postgres = replace(postgres, shards=[], **settings)
+            except TypeError as e:
+                raise ValueError(f"Invalid settings for checkpoint shard {name}: {e}")
+            shards.append(PostgresShardConfig(str(name), shard_postgres, joining, sqlite_path))
+
+        names = [shard.name for shard in shards]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Checkpoint shard names must be unique: {names}")
+        if len({shard.sqlite_path is None for shard in shards}) > 1:
+            raise ValueError("Set sqlite_path on every checkpoint shard (local stand-in) or on none")
+        if all(shard.joining for shard in shards):
+            raise ValueError("At least one checkpoint shard must not be joining")
+        return shards
+
     @property
     def config(self) -> Config:
         """Get the loaded configuration"""
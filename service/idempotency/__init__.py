@@ -0,0 +1,3 @@
+from .store import IdempotencyStore, IdempotencyConflictError, IdempotencyInProgressError
+
+__all__ = ['IdempotencyStore', 'IdempotencyConflictError', 'IdempotencyInProgressError']
@@ -0,0 +1,377 @@
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+from service.config import Config
+from service.cache import LRUCache
+
+try:
+    from psycopg.types.json import Jsonb
+    from psycopg_pool import AsyncConnectionPool, ConnectionPool
+    PSYCOPG_AVAILABLE = True
+except ImportError:
+    PSYCOPG_AVAILABLE = False
+
+# A response as the API sends it: (status code, JSON body, headers)
+Outcome = Tuple[int, Any, Dict[str, str]]
+
+# How often a retry re-reads a key claimed by another instance
+POLL_INTERVAL = 0.25
+
+
+class IdempotencyConflictError(Exception):
+    """Raised when a key is reused for a different request"""
+
+
+class IdempotencyInProgressError(Exception):
+    """Raised when the request holding a key is still running after the wait timeout"""
+
+
+class PostgresIdempotencyBackend:
+    """Keys shared by all instances, stored in the application's Postgres database.
+
+    A row without a response is a claim: the request is running on some
+    instance. Claims expire after `claim_ttl` seconds so a crashed instance
+    does not block its keys; finished rows after `ttl_seconds`.
+    """
+
+    CREATE_TABLE = """
+        CREATE TABLE IF NOT EXISTS idempotency_keys (
+            key TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            response JSONB,
+            expires_at TIMESTAMPTZ NOT NULL
+        )
+    """
+    CREATE_INDEX = """
+        CREATE INDEX IF NOT EXISTS idempotency_keys_expires_at_idx
+        ON idempotency_keys (expires_at)
+    """
+    CLAIM = """
+        INSERT INTO idempotency_keys (key, fingerprint, response, expires_at)
+        VALUES (%s, %s, NULL, now() + make_interval(secs => %s))
+        ON CONFLICT (key) DO UPDATE
+        SET fingerprint = EXCLUDED.fingerprint, response = NULL, expires_at = EXCLUDED.expires_at
+        WHERE idempotency_keys.expires_at <= now()
+        RETURNING key
+    """
+    SELECT = "SELECT fingerprint, response FROM idempotency_keys WHERE key = %s AND expires_at > now()"
+    COMPLETE = """
+        UPDATE idempotency_keys SET response = %s, expires_at = now() + make_interval(secs => %s)
+        WHERE key = %s
+    """
+    RELEASE = "DELETE FROM idempotency_keys WHERE key = %s AND response IS NULL"
+    PURGE = """
+        DELETE FROM idempotency_keys WHERE key IN (
+            SELECT key FROM idempotency_keys WHERE expires_at <= now() LIMIT 1000
+        )
+    """
+    # Expired rows are purged once every this many completed requests
+    PURGE_EVERY = 500
+
+    def __init__(self, pool, ttl_seconds: int, claim_ttl: float):
+        self.pool = pool
+        self.ttl_seconds = ttl_seconds
+        self.claim_ttl = claim_ttl
+        self.errors = 0
+        self._completed = 0
+
+    def setup(self) -> None:
+        with self.pool.connection() as conn:
+            conn.execute(self.CREATE_TABLE)
+            conn.execute(self.CREATE_INDEX)
+
+    async def asetup(self) -> None:
+        async with self.pool.connection() as conn:
+            await conn.execute(self.CREATE_TABLE)
+            await conn.execute(self.CREATE_INDEX)
+
+    def claim(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """None once the key is ours, else its row (response is None while it runs elsewhere)"""
+        try:
+            with self.pool.connection() as conn:
+                if conn.execute(self.CLAIM, (key, fingerprint, self.claim_ttl)).fetchone() is not None:
+                    return None
+                row = conn.execute(self.SELECT, (key,)).fetchone()
+        except Exception as e:
+            self.errors += 1
+            logging.warning(f"Idempotency key claim failed, running the request: {e}")
+            return None
+        return self._row(row, fingerprint)
+
+    async def aclaim(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        try:
+            async with self.pool.connection() as conn:
+                cursor = await conn.execute(self.CLAIM, (key, fingerprint, self.claim_ttl))
+                if await cursor.fetchone() is not None:
+                    return None
+                cursor = await conn.execute(self.SELECT, (key,))
+                row = await cursor.fetchone()
+        except Exception as e:
+            self.errors += 1
+            logging.warning(f"Idempotency key claim failed, running the request: {e}")
+            return None
+        return self._row(row, fingerprint)
+
+    def complete(self, key: str, response: Optional[Dict[str, Any]]) -> None:
+        """Store the response, or drop the claim when there is none to keep"""
+        try:
+            with self.pool.connection() as conn:
+                if response is None:
+                    conn.execute(self.RELEASE, (key,))
+                    return
+                conn.execute(self.COMPLETE, (Jsonb(response), self.ttl_seconds, key))
+                if self._due_for_purge():
+                    conn.execute(self.PURGE)
+        except Exception as e:
+            self.errors += 1
+            logging.warning(f"Idempotency key store failed: {e}")
+
+    async def acomplete(self, key: str, response: Optional[Dict[str, Any]]) -> None:
+        try:
+            async with self.pool.connection() as conn:
+                if response is None:
+                    await conn.execute(self.RELEASE, (key,))
+                    return
+                await conn.execute(self.COMPLETE, (Jsonb(response), self.ttl_seconds, key))
+                if self._due_for_purge():
+                    await conn.execute(self.PURGE)
+        except Exception as e:
+            self.errors += 1
+            logging.warning(f"Idempotency key store failed: {e}")
+
+    def _due_for_purge(self) -> bool:
+        self._completed += 1
+        return self._completed % self.PURGE_EVERY == 0
+
+    @staticmethod
+    def _row(row, fingerprint: str) -> Dict[str, Any]:
+        if row is None:
+            # Released or expired since the claim attempt: treat as still running, the next poll claims it
+            return {"fingerprint": fingerprint, "response": None}
+        return {"fingerprint": row["fingerprint"], "response": row["response"]}
+
+
+class _Flight:
+    """A request running in this process, which retries of the same key wait for"""
+
+    def __init__(self, fingerprint: str, event):
+        self.fingerprint = fingerprint
+        self.event = event
+        self.outcome: Optional[Outcome] = None
+
+
+class IdempotencyStore:
+    """Runs a request at most once per idempotency key.
+
+    A retry that arrives while the first request runs in this process waits
+    for it and gets the same response; across instances the shared Postgres
+    tier holds a claim on the key and the retry polls until the response is
+    stored. Finished responses are kept in a bounded local LRU (and the
+    shared table) for `ttl_seconds`. Only successful (2xx) responses are
+    kept or handed to waiting retries: after an error or a 429 a retry runs
+    the request again.
+    """
+
+    def __init__(self, local: LRUCache, shared: Optional[PostgresIdempotencyBackend] = None,
+                 wait_timeout: float = 60.0, metrics=None):
+        self.local = local
+        self.shared = shared
+        self.wait_timeout = wait_timeout
+        self.metrics = metrics
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def from_config(config: Config, connection_pool=None, metrics=None) -> Optional["IdempotencyStore"]:
+        """Create the idempotency store, or None if Idempotency-Key headers are ignored"""
+        idempotency = config.idempotency
+        if not idempotency.enabled:
+            return None
+
+        local = LRUCache(max_entries=idempotency.max_entries, ttl_seconds=idempotency.ttl_seconds)
+
+        shared = None
+        if idempotency.backend == "postgres":
+            if PSYCOPG_AVAILABLE and isinstance(connection_pool, (ConnectionPool, AsyncConnectionPool)):
+                shared = PostgresIdempotencyBackend(connection_pool, idempotency.ttl_seconds, idempotency.claim_ttl)
+            else:
+                logging.warning("Postgres idempotency keys require the pooled Postgres checkpointer, keeping them in memory")
+        elif idempotency.backend != "memory":
+            logging.warning(f"Unknown idempotency backend: {idempotency.backend}, keeping keys in memory")
+
+        logging.info(f"Idempotency keys enabled: backend={idempotency.backend if shared else 'memory'}, "
+                     f"max_entries={idempotency.max_entries}, ttl={idempotency.ttl_seconds}s")
+        return IdempotencyStore(local, shared, idempotency.wait_timeout, metrics)
+
+    def setup(self) -> None:
+        """Create the shared key table if needed"""
+        if self.shared is not None:
+            self.shared.setup()
+
+    async def asetup(self) -> None:
+        if self.shared is not None:
+            await self.shared.asetup()
+
+    @staticmethod
+    def fingerprint(request: Dict[str, Any]) -> str:
+        """Hash of the request, to tell a retry from a different request reusing the key"""
+        payload = json.dumps(request, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def run(self, key: str, fingerprint: str, execute: Callable[[], Outcome]) -> Tuple[Outcome, bool]:
+        """Return execute()'s outcome, running it only if no request with this key did; the flag is True on a replay"""
+        while True:
+            with self._lock:
+                record = self.local.get(key)
+                flight = self._flights.get(key) if record is None else None
+                owner = record is None and flight is None
+                if owner:
+                    flight = self._flights[key] = _Flight(fingerprint, threading.Event())
+
+            if record is not None:
+                return self._replay(record, fingerprint), True
+            if owner:
+                break
+
+            self._check(flight.fingerprint, fingerprint)
+            self._count("joined")
+            if not flight.event.wait(self.wait_timeout):
+                raise self._in_progress()
+            if self._succeeded(flight.outcome):
+                return flight.outcome, True
+            # The first request raised or failed: run it again, as a later retry would
+
+        try:
+            response = self._claim_shared(key, fingerprint)
+            if response is not None:
+                self.local.set(key, {"fingerprint": fingerprint, "response": response})
+                flight.outcome = self._outcome(response)
+                return flight.outcome, True
+
+            self._count("executed")
+            stored = None
+            try:
+                flight.outcome = execute()
+                stored = self._keep(key, fingerprint, flight.outcome)
+            finally:
+                if self.shared is not None:
+                    self.shared.complete(key, stored)
+            return flight.outcome, False
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.event.set()
+
+    async def arun(self, key: str, fingerprint: str, execute) -> Tuple[Outcome, bool]:
+        """Async variant of run; execute is a coroutine function"""
+        while True:
+            record = self.local.get(key)
+            flight = self._flights.get(key) if record is None else None
+            if record is not None:
+                return self._replay(record, fingerprint), True
+            if flight is None:
+                flight = self._flights[key] = _Flight(fingerprint, asyncio.Event())
+                break
+
+            self._check(flight.fingerprint, fingerprint)
+            self._count("joined")
+            try:
+                await asyncio.wait_for(flight.event.wait(), self.wait_timeout)
+            except asyncio.TimeoutError:
+                raise self._in_progress()
+            if self._succeeded(flight.outcome):
+                return flight.outcome, True
+
+        try:
+            response = await self._aclaim_shared(key, fingerprint)
+            if response is not None:
+                self.local.set(key, {"fingerprint": fingerprint, "response": response})
+                flight.outcome = self._outcome(response)
+                return flight.outcome, True
+
+            self._count("executed")
+            stored = None
+            try:
+                flight.outcome = await execute()
+                stored = self._keep(key, fingerprint, flight.outcome)
+            finally:
+                if self.shared is not None:
+                    await self.shared.acomplete(key, stored)
+            return flight.outcome, False
+        finally:
+            del self._flights[key]
+            flight.event.set()
+
+    def _claim_shared(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """None once this process may run the request, else the response stored by another instance"""
+        if self.shared is None:
+            return None
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            row = self.shared.claim(key, fingerprint)
+            if row is None:
+                return None
+            self._check(row["fingerprint"], fingerprint)
+            if row["response"] is not None:
+                self._count("replayed")
+                return row["response"]
+            if time.monotonic() >= deadline:
+                raise self._in_progress()
+            time.sleep(POLL_INTERVAL)
+
+    async def _aclaim_shared(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        if self.shared is None:
+            return None
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            row = await self.shared.aclaim(key, fingerprint)
+            if row is None:
+                return None
+            self._check(row["fingerprint"], fingerprint)
+            if row["response"] is not None:
+                self._count("replayed")
+                return row["response"]
+            if time.monotonic() >= deadline:
+                raise self._in_progress()
+            await asyncio.sleep(POLL_INTERVAL)
+
+    def _keep(self, key: str, fingerprint: str, outcome: Outcome) -> Optional[Dict[str, Any]]:
+        """Store a successful outcome locally; returns what the shared tier should keep"""
+        if not self._succeeded(outcome):
+            return None
+        code, body, headers = outcome
+        response = {"code": code, "body": body, "headers": dict(headers or {})}
+        self.local.set(key, {"fingerprint": fingerprint, "response": response})
+        return response
+
+    @staticmethod
+    def _succeeded(outcome: Optional[Outcome]) -> bool:
+        return outcome is not None and 200 <= outcome[0] < 300
+
+    def _replay(self, record: Dict[str, Any], fingerprint: str) -> Outcome:
+        self._check(record["fingerprint"], fingerprint)
+        self._count("replayed")
+        return self._outcome(record["response"])
+
+    def _check(self, stored: str, fingerprint: str) -> None:
+        if stored != fingerprint:
+            self._count("conflict")
+            raise IdempotencyConflictError("Idempotency-Key was already used for a different request")
+
+    def _in_progress(self) -> IdempotencyInProgressError:
+        self._count("in_progress")
+        return IdempotencyInProgressError(
+            f"a request with this Idempotency-Key is still running after {self.wait_timeout}s, retry later"
+        )
+
+    def _count(self, outcome: str) -> None:
+        if self.metrics is not None:
+            self.metrics.idempotency_requests.labels(outcome=outcome).inc()
+
+    @staticmethod
+    def _outcome(response: Dict[str, Any]) -> Outcome:
+        return response["code"], response["body"], response.get("headers") or {}
@@ -0,0 +1,4 @@
+from .store import Job, MemoryJobStore, SqliteJobStore
+from .manager import JobManager
+
+__all__ = ['Job', 'MemoryJobStore', 'SqliteJobStore', 'JobManager']
@@ -0,0 +1,235 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from service.config import Config
+from service.concurrency import OverloadedError
+from .store import DONE, FAILED, RUNNING, Job, MemoryJobStore, SqliteJobStore
+
+# Heartbeat and expiry sweep interval; owners silent for STALE_INTERVALS of them lose their jobs
+HOUSEKEEPING_INTERVAL = 10.0
+STALE_INTERVALS = 3
+# How often a long poll re-reads a job executed by another process
+POLL_INTERVAL = 0.25
+
+
+class JobManager:
+    """Runs turns in the background on a bounded pool of workers.
+
+    Jobs of one thread run one at a time in submission order; jobs of
+    different threads run in parallel, up to `workers` at once. At most
+    `max_queue` jobs wait in this process; more are rejected with
+    OverloadedError. The runner is a function (or coroutine function, in
+    async mode) taking a Job and returning its JSON-serializable result.
+
+    The order of a thread's jobs holds within one process: with a store
+    shared by several workers, jobs of one thread submitted to different
+    workers may run in either order (the thread lock still keeps their
+    turns from overlapping).
+    """
+
+    def __init__(self, store, workers: int = 4, max_queue: int = 1000, max_wait: float = 30.0):
+        self.store = store
+        self.workers = workers
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.owner = f"{os.uname().nodename}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+        self._runner: Optional[Callable] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        self._lock = threading.Lock()
+        self._threads: Dict[str, deque] = {}  # thread_id -> jobs waiting behind the running one
+        self._pending = 0
+        self._done_events: Dict[str, Any] = {}
+        self._stop_event = threading.Event()
+
+    @staticmethod
+    def from_config(config: Config) -> Optional["JobManager"]:
+        """Create the job manager, or None if async jobs are disabled"""
+        jobs = config.jobs
+        if not jobs.enabled:
+            return None
+        if jobs.store == "sqlite":
+            store = SqliteJobStore(jobs.sqlite_path, jobs.result_ttl)
+        else:
+            if jobs.store != "memory":
+                logging.warning(f"Unknown job store: {jobs.store}, keeping jobs in memory")
+            store = MemoryJobStore(jobs.result_ttl)
+        return JobManager(store, jobs.workers, jobs.max_queue, jobs.max_wait)
+
+    def start(self, runner: Callable) -> None:
+        """Start executing jobs with a blocking runner"""
+        self._runner = runner
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="job")
+        self._start_housekeeping()
+
+    def astart(self, runner: Callable) -> None:
+        """Start executing jobs with a coroutine runner; call from the serving event loop"""
+        self._runner = runner
+        self._loop = asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(self.workers)
+        self._start_housekeeping()
+
+    def stop(self) -> None:
+        """Finish the running jobs; queued ones stay in a durable store for the next process"""
+        self._stop_event.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        self.store.close()
+
+    def submit(self, thread_id: str, payload: Dict[str, Any]) -> Job:
+        """Queue a turn; raises OverloadedError when the queue is full"""
+        job = Job(id=uuid.uuid4().hex, thread_id=thread_id, payload=payload)
+        with self._lock:
+            if self._pending >= self.max_queue:
+                raise OverloadedError("job_queue_full", self.max_wait)
+            self._pending += 1
+        # Owned before it is stored, so housekeeping never recovers it as an orphan
+        self._own(job)
+        try:
+            self.store.add(job, self.owner)
+        except BaseException:
+            self._done_events.pop(job.id, None)
+            with self._lock:
+                self._pending -= 1
+            raise
+        self._enqueue(job)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.store.get(job_id)
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Job]:
+        """Long poll: the job once finished, or as it is after `timeout` seconds"""
+        timeout = min(timeout, self.max_wait)
+        event = self._done_events.get(job_id)
+        if isinstance(event, threading.Event):
+            event.wait(timeout)
+            return self.store.get(job_id)
+
+        deadline = time.monotonic() + timeout
+        job = self.store.get(job_id)
+        while job is not None and not job.finished and time.monotonic() < deadline:
+            time.sleep(min(POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+            job = self.store.get(job_id)
+        return job
+
+    async def await_job(self, job_id: str, timeout: float) -> Optional[Job]:
+        """Async variant of wait"""
+        timeout = min(timeout, self.max_wait)
+        event = self._done_events.get(job_id)
+        if isinstance(event, asyncio.Event):
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            return self.store.get(job_id)
+
+        deadline = time.monotonic() + timeout
+        job = self.store.get(job_id)
+        while job is not None and not job.finished and time.monotonic() < deadline:
+            await asyncio.sleep(min(POLL_INTERVAL, max(0.0, deadline - time.monotonic())))
+            job = self.store.get(job_id)
+        return job
+
+    def stats(self):
+        with self._lock:
+            return {"pending": self._pending, "threads": len(self._threads), "workers": self.workers}
+
+    def _own(self, job: Job) -> None:
+        """Register a job run by this process, with the event its waiters block on"""
+        self._done_events[job.id] = asyncio.Event() if self._loop is not None else threading.Event()
+
+    def _enqueue(self, job: Job) -> None:
+        with self._lock:
+            waiting = self._threads.get(job.thread_id)
+            if waiting is not None:
+                waiting.append(job)  # runs after the thread's current job
+                return
+            self._threads[job.thread_id] = deque()
+        self._schedule(job)
+
+    def _schedule(self, job: Job) -> None:
+        if self._stop_event.is_set():
+            return  # left queued in the store
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(lambda: self._loop.create_task(self._arun(job)))
+        else:
+            self._executor.submit(self._run, job)
+
+    def _next(self, job: Job) -> None:
+        """Release the finished job's thread, scheduling its next job if any"""
+        with self._lock:
+            self._pending -= 1
+            waiting = self._threads[job.thread_id]
+            if not waiting:
+                del self._threads[job.thread_id]
+                return
+            following = waiting.popleft()
+        self._schedule(following)
+
+    def _run(self, job: Job) -> None:
+        try:
+            self._started(job)
+            try:
+                self._finished(job, DONE, result=self._runner(job))
+            except Exception as e:
+                logging.error(f"job {job.id} failed: {e}")
+                self._finished(job, FAILED, error=str(e))
+        finally:
+            self._next(job)
+
+    async def _arun(self, job: Job) -> None:
+        try:
+            async with self._semaphore:
+                self._started(job)
+                try:
+                    self._finished(job, DONE, result=await self._runner(job))
+                except Exception as e:
+                    logging.error(f"job {job.id} failed: {e}")
+                    self._finished(job, FAILED, error=str(e))
+        finally:
+            self._next(job)
+
+    def _started(self, job: Job) -> None:
+        job.status = RUNNING
+        self.store.update(job)
+
+    def _finished(self, job: Job, status: str, result=None, error=None) -> None:
+        job.status, job.result, job.error, job.finished_at = status, result, error, time.time()
+        self.store.update(job)
+        event = self._done_events.pop(job.id, None)
+        if event is not None:
+            event.set()
+
+    def _start_housekeeping(self) -> None:
+        self.store.heartbeat(self.owner)
+        self._housekeeping()
+        threading.Thread(target=self._housekeeping_loop, name="job-housekeeping", daemon=True).start()
+
+    def _housekeeping_loop(self) -> None:
+        while not self._stop_event.wait(HOUSEKEEPING_INTERVAL):
+            try:
+                self._housekeeping()
+            except Exception as e:
+                logging.error(f"job housekeeping failed: {e}")
+
+    def _housekeeping(self) -> None:
+        self.store.heartbeat(self.owner)
+        self.store.purge()
+        for job in self.store.recover(self.owner, HOUSEKEEPING_INTERVAL * STALE_INTERVALS):
+            if job.id in self._done_events:
+                continue  # already queued here
+            logging.info(f"recovered queued job {job.id} for thread {job.thread_id}")
+            with self._lock:
+                self._pending += 1
+            self._own(job)
+            self._enqueue(job)
@@ -0,0 +1,222 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED = (DONE, FAILED)
+
+
+@dataclass
+class Job:
+    id: str
+    thread_id: str
+    payload: Dict[str, Any]  # what the runner needs to execute the turn
+    status: str = QUEUED
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Public view of the job, as returned by GET /jobs/<id>"""
+        view = {"job_id": self.id, "thread_id": self.thread_id, "status": self.status, "created_at": self.created_at}
+        if self.finished:
+            view["finished_at"] = self.finished_at
+        if self.status == DONE:
+            view["result"] = self.result
+        elif self.status == FAILED:
+            view["error"] = self.error
+        return view
+
+
+class MemoryJobStore:
+    """Jobs of this process; finished ones are dropped `result_ttl` seconds after they finish"""
+
+    durable = False
+
+    def __init__(self, result_ttl: float):
+        self.result_ttl = result_ttl
+        self._jobs: Dict[str, Job] = {}
+        self._expiry = deque()  # (expires_at, job_id), in finishing order
+        self._lock = threading.Lock()
+
+    def add(self, job: Job, owner: str = "") -> None:
+        with self._lock:
+            self._jobs[job.id] = job
+
+    def update(self, job: Job) -> None:
+        with self._lock:
+            self._jobs[job.id] = job
+            if job.finished:
+                self._expiry.append((job.finished_at + self.result_ttl, job.id))
+
+    def get(self, job_id: str) -> Optional[Job]:
+        self.purge()
+        return self._jobs.get(job_id)
+
+    def purge(self) -> int:
+        now = time.time()
+        purged = 0
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                _, job_id = self._expiry.popleft()
+                if self._jobs.pop(job_id, None) is not None:
+                    purged += 1
+        return purged
+
+    def heartbeat(self, owner: str) -> None:
+        pass
+
+    def recover(self, owner: str, stale_after: float) -> List[Job]:
+        return []
+
+    def close(self) -> None:
+        pass
+
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        id TEXT NOT NULL UNIQUE,
+        thread_id TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        owner TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        finished_at REAL,
+        expires_at REAL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS jobs_owner_status ON jobs (owner, status)",
+    "CREATE INDEX IF NOT EXISTS jobs_expires_at ON jobs (expires_at)",
+    """
+    CREATE TABLE IF NOT EXISTS job_owners (
+        owner TEXT PRIMARY KEY,
+        seen_at REAL NOT NULL
+    )
+    """,
+]
+
+
+class SqliteJobStore:
+    """Jobs kept in a local SQLite file, so queued turns survive a restart.
+
+    Every process serving jobs registers as an owner and heartbeats. Queued
+    jobs of an owner that stopped heartbeating are adopted by another
+    process; jobs it was running are marked failed rather than run twice,
+    since their turn may already be partly checkpointed.
+    """
+
+    durable = True
+
+    def __init__(self, path: str, result_ttl: float, busy_timeout: float = 30.0):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.result_ttl = result_ttl
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        with self._lock:
+            for statement in SCHEMA:
+                self._conn.execute(statement)
+
+    def add(self, job: Job, owner: str = "") -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, thread_id, payload, status, owner, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (job.id, job.thread_id, json.dumps(job.payload), job.status, owner, job.created_at),
+            )
+
+    def update(self, job: Job) -> None:
+        expires_at = job.finished_at + self.result_ttl if job.finished else None
+        result = json.dumps(job.result) if job.result is not None else None
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, expires_at = ? WHERE id = ?",
+                (job.status, result, job.error, job.finished_at, expires_at, job.id),
+            )
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, thread_id, payload, status, result, error, created_at, finished_at FROM jobs "
+                "WHERE id = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (job_id, time.time()),
+            ).fetchone()
+        return self._job(row) if row else None
+
+    def purge(self) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM jobs WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def heartbeat(self, owner: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO job_owners (owner, seen_at) VALUES (?, ?) "
+                "ON CONFLICT (owner) DO UPDATE SET seen_at = excluded.seen_at",
+                (owner, time.time()),
+            )
+
+    def recover(self, owner: str, stale_after: float) -> List[Job]:
+        """Adopt the queued jobs of owners that stopped heartbeating; returns them in submission order"""
+        now = time.time()
+        stale = "SELECT owner FROM job_owners WHERE seen_at < ?"
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    f"UPDATE jobs SET status = ?, error = ?, finished_at = ?, expires_at = ? "
+                    f"WHERE status = ? AND (owner IN ({stale}) OR owner NOT IN (SELECT owner FROM job_owners))",
+                    (FAILED, "interrupted by a restart", now, now + self.result_ttl, RUNNING, now - stale_after),
+                )
+                self._conn.execute(
+                    f"UPDATE jobs SET owner = ? "
+                    f"WHERE status = ? AND owner != ? AND (owner IN ({stale}) OR owner NOT IN (SELECT owner FROM job_owners))",
+                    (owner, QUEUED, owner, now - stale_after),
+                )
+                self._conn.execute(f"DELETE FROM job_owners WHERE owner IN ({stale}) AND owner != ?",
+                                   (now - stale_after, owner))
+                rows = self._conn.execute(
+                    "SELECT id, thread_id, payload, status, result, error, created_at, finished_at FROM jobs "
+                    "WHERE owner = ? AND status = ? ORDER BY seq",
+                    (owner, QUEUED),
+                ).fetchall()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [self._job(row) for row in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _job(row) -> Job:
+        return Job(
+            id=row[0],
+            thread_id=row[1],
+            payload=json.loads(row[2]),
+            status=row[3],
+            result=json.loads(row[4]) if row[4] is not None else None,
+            error=row[5],
+            created_at=row[6],
+            finished_at=row[7],
+        )
@@ -0,0 +1,4 @@
+from .context import bind_request, bind_thread, current_request_id
+from .pipeline import configure_logging, stop_logging, summarize_payload
+
+__all__ = ['bind_request', 'bind_thread', 'current_request_id', 'configure_logging', 'stop_logging', 'summarize_payload']
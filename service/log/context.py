@@ -0,0 +1,60 @@
+import uuid
+import zlib
+import random
+import logging
+from contextvars import ContextVar
+from typing import Optional
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+thread_id_var: ContextVar[Optional[str]] = ContextVar("thread_id", default=None)
+
+
+def bind_request(request_id: Optional[str] = None, thread_id: Optional[str] = None) -> str:
+    """Start the log context of a request; returns its request id"""
+    request_id = request_id or str(uuid.uuid4())
+    request_id_var.set(request_id)
+    thread_id_var.set(thread_id)
+    return request_id
+
+
+def bind_thread(thread_id: Optional[str]) -> None:
+    """Attach the conversation thread to the current request's log context"""
+    thread_id_var.set(thread_id)
+
+
+def current_request_id() -> Optional[str]:
+    return request_id_var.get()
+
+
+class ContextFilter(logging.Filter):
+    """Adds request_id and thread_id to every record.
+
+    Runs on the handler in the logging thread of the caller, before records
+    are queued, since the context variables are not visible elsewhere.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get() or "-"
+        record.thread_id = thread_id_var.get() or "-"
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """Keeps a fraction of DEBUG records.
+
+    Sampling is decided per request, so a sampled request keeps all of its
+    debug lines; records outside a request are sampled individually.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        self._threshold = int(rate * 0xFFFFFFFF)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        request_id = request_id_var.get()
+        if request_id is None:
+            return random.random() < self.rate
+        return zlib.crc32(request_id.encode("utf-8")) <= self._threshold
@@ -0,0 +1,59 @@
+import json
+import logging
+from datetime import datetime, timezone
+from typing import Any, Iterable
+
+REDACTED = "[REDACTED]"
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the request context added by ContextFilter"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", "-"),
+            "thread_id": getattr(record, "thread_id", "-"),
+            "process": record.process,
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class PayloadSummarizer:
+    """Makes request bodies safe and cheap to log.
+
+    Values of sensitive keys are always redacted. In "truncate" mode long
+    strings are cut to `max_chars`; in "omit" mode strings are replaced by
+    their length; "full" logs them unchanged.
+    """
+
+    def __init__(self, mode: str = "truncate", max_chars: int = 200, redact_keys: Iterable[str] = ()):
+        self.mode = mode
+        self.max_chars = max_chars
+        self.redact_keys = {key.lower() for key in redact_keys}
+
+    def summarize(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            return {
+                key: REDACTED if str(key).lower() in self.redact_keys else self.summarize(item)
+                for key, item in value.items()
+            }
+        if isinstance(value, list):
+            return [self.summarize(item) for item in value]
+        if isinstance(value, str):
+            return self._string(value)
+        return value
+
+    def _string(self, value: str) -> str:
+        if self.mode == "omit":
+            return f"<{len(value)} chars>"
+        if self.mode == "truncate" and len(value) > self.max_chars:
+            return f"{value[:self.max_chars]}...(+{len(value) - self.max_chars} chars)"
+        return value
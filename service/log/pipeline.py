@@ -0,0 +1,85 @@
+import queue
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+from service.config import LoggingConfig
+from .context import ContextFilter, DebugSamplingFilter
+from .formatting import JsonFormatter, PayloadSummarizer
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[logging.Handler] = None
+_summarizer = PayloadSummarizer()
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that drops records when the queue is full instead of blocking or raising"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(config: LoggingConfig) -> None:
+    """Install the root handlers described by the logging config.
+
+    With `queue` enabled, request threads only put records on a bounded
+    queue; formatting and writing happen in a background listener thread.
+    Handlers installed implicitly by logging calls made before this (e.g.
+    while loading the config) are replaced.
+    """
+    global _listener, _handler, _summarizer
+
+    root = logging.getLogger()
+    if _handler is not None and _handler in root.handlers:
+        return  # Already configured
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+        existing.close()
+
+    _summarizer = PayloadSummarizer(config.payload, config.max_payload_chars, config.redact_keys)
+
+    if config.file:
+        output = logging.FileHandler(config.file)
+    else:
+        output = logging.StreamHandler()
+    output.setFormatter(JsonFormatter() if config.json else logging.Formatter(config.format))
+
+    filters = [ContextFilter()]
+    if config.debug_sample_rate < 1:
+        filters.append(DebugSamplingFilter(config.debug_sample_rate))
+
+    if config.queue:
+        handler = DroppingQueueHandler(queue.Queue(maxsize=config.queue_size))
+        _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+    else:
+        handler = output
+
+    # Filters run in the caller's thread, where the request context is visible
+    for log_filter in filters:
+        handler.addFilter(log_filter)
+
+    _handler = handler
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, config.level.upper()))
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def summarize_payload(data):
+    """Request body as it should appear in the logs (redacted and truncated per config)"""
+    return _summarizer.summarize(data)
@@ -0,0 +1,3 @@
+from .prometheus import Metrics, get_metrics
+
+__all__ = ['Metrics', 'get_metrics']
@@ -0,0 +1,284 @@
+import os
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+from service.config import Config
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        REGISTRY,
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+        multiprocess,
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+
+# LLM calls take seconds, checkpoint operations milliseconds
+LLM_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+STORAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+class LLMCall:
+    """Handle given to the caller of Metrics.llm to report the model's response"""
+
+    def __init__(self, metrics: "Metrics", model: str):
+        self.metrics = metrics
+        self.model = model
+
+    def record(self, response) -> None:
+        usage = getattr(response, "usage_metadata", None) or {}
+        for kind in ("input_tokens", "output_tokens"):
+            if usage.get(kind):
+                self.metrics.llm_tokens.labels(model=self.model, kind=kind.split("_")[0]).inc(usage[kind])
+
+
+class Metrics:
+    """Prometheus collectors for graph nodes, LLM calls, tool calls, caches and checkpoint operations"""
+
+    def __init__(self, registry=None):
+        registry = registry if registry is not None else REGISTRY
+        self.registry = registry
+        self._scrape_hooks: Dict[str, Callable[[], None]] = {}
+
+        self.node_duration = Histogram(
+            "agent_node_duration_seconds", "Time spent in a graph node", ["node"],
+            buckets=LLM_BUCKETS, registry=registry,
+        )
+        self.node_in_flight = Gauge(
+            "agent_node_in_flight", "Graph nodes currently running", ["node"],
+            multiprocess_mode="livesum", registry=registry,
+        )
+        self.node_errors = Counter(
+            "agent_node_errors_total", "Graph nodes that raised", ["node"], registry=registry,
+        )
+
+        self.llm_duration = Histogram(
+            "llm_request_duration_seconds", "Latency of model calls", ["model", "purpose"],
+            buckets=LLM_BUCKETS, registry=registry,
+        )
+        self.llm_in_flight = Gauge(
+            "llm_requests_in_flight", "Model calls currently waiting for a response", ["model"],
+            multiprocess_mode="livesum", registry=registry,
+        )
+        self.llm_errors = Counter(
+            "llm_request_errors_total", "Model calls that raised", ["model", "purpose"], registry=registry,
+        )
+        self.llm_tokens = Counter(
+            "llm_tokens_total", "Tokens reported by the model", ["model", "kind"], registry=registry,
+        )
+        self.llm_retries = Counter(
+            "llm_retries_total", "Model calls repeated after a transient failure", ["model", "purpose"],
+            registry=registry,
+        )
+        self.llm_timeouts = Counter(
+            "llm_timeouts_total", "Model calls that ran past the node timeout", ["model", "purpose"],
+            registry=registry,
+        )
+        self.llm_hedges = Counter(
+            "llm_hedged_requests_total", "Second attempts started for slow model calls", ["model", "purpose"],
+            registry=registry,
+        )
+        self.llm_busy = Counter(
+            "llm_busy_total",
+            "Model calls run on the caller's thread, without their deadline, because every model-call worker was busy",
+            ["model", "purpose"], registry=registry,
+        )
+        self.llm_abandoned = Counter(
+            "llm_abandoned_requests_total", "Model attempts cancelled or left running without being used",
+            ["model", "purpose", "reason"], registry=registry,
+        )
+
+        self.checkpoint_duration = Histogram(
+            "checkpoint_operation_duration_seconds", "Latency of checkpointer operations", ["operation"],
+            buckets=STORAGE_BUCKETS, registry=registry,
+        )
+        self.checkpoint_in_flight = Gauge(
+            "checkpoint_operations_in_flight", "Checkpointer operations currently running", ["operation"],
+            multiprocess_mode="livesum", registry=registry,
+        )
+        self.checkpoint_errors = Counter(
+            "checkpoint_operation_errors_total", "Checkpointer operations that raised", ["operation"],
+            registry=registry,
+        )
+        self.shard_duration = Histogram(
+            "checkpoint_shard_operation_duration_seconds", "Latency of checkpoint operations per shard",
+            ["shard", "operation"], buckets=STORAGE_BUCKETS, registry=registry,
+        )
+        self.shard_in_flight = Gauge(
+            "checkpoint_shard_operations_in_flight", "Checkpoint operations currently running per shard",
+            ["shard", "operation"], multiprocess_mode="livesum", registry=registry,
+        )
+        self.shard_errors = Counter(
+            "checkpoint_shard_operation_errors_total", "Checkpoint operations that raised, per shard",
+            ["shard", "operation"], registry=registry,
+        )
+        self.shard_moves = Counter(
+            "checkpoint_shard_thread_moves_total", "Threads moved onto a shard by rebalancing", ["shard"],
+            registry=registry,
+        )
+        self.checkpoint_stats = Gauge(
+            "checkpoint_layer_stats", "Statistics of the checkpointer layers (cache, memory, write_behind, sharding), "
+            "refreshed when metrics are scraped", ["layer", "stat"], multiprocess_mode="livesum", registry=registry,
+        )
+        self.pool_stats = Gauge(
+            "checkpoint_pool_stats", "Checkpoint connection pool statistics per shard (size, in_use, waiting, "
+            "requests, timeouts, ...), refreshed when metrics are scraped", ["shard", "stat"],
+            multiprocess_mode="livesum", registry=registry,
+        )
+        self.checkpoint_pending = Gauge(
+            "checkpoint_write_behind_pending", "Checkpoint writes acknowledged but not yet committed",
+            multiprocess_mode="livesum", registry=registry,
+        )
+
+        self.admission_waiting = Gauge(
+            "admission_queue_depth", "Turns waiting for a concurrency slot",
+            multiprocess_mode="livesum", registry=registry,
+        )
+        self.admission_rejections = Counter(
+            "admission_rejections_total", "Requests turned away with 429", ["reason"], registry=registry,
+        )
+
+        self.tool_duration = Histogram(
+            "tool_call_duration_seconds", "Latency of tool calls", ["tool"],
+            buckets=LLM_BUCKETS, registry=registry,
+        )
+        self.tool_in_flight = Gauge(
+            "tool_calls_in_flight", "Tool calls currently running", ["tool"],
+            multiprocess_mode="livesum", registry=registry,
+        )
+        self.tool_errors = Counter(
+            "tool_call_errors_total", "Tool calls that raised", ["tool"], registry=registry,
+        )
+        self.tool_timeouts = Counter(
+            "tool_call_timeouts_total", "Tool calls abandoned at their timeout", ["tool"], registry=registry,
+        )
+        self.tool_cache_hits = Counter(
+            "tool_cache_hits_total", "Tool calls answered from the memoization cache", ["tool"], registry=registry,
+        )
+
+        self.response_cache_hits = Counter(
+            "response_cache_hits_total", "Model calls answered from the response cache, by tier", ["tier"],
+            registry=registry,
+        )
+        self.response_cache_misses = Counter(
+            "response_cache_misses_total", "Response cache lookups that found nothing", registry=registry,
+        )
+        self.response_cache_evictions = Counter(
+            "response_cache_evictions_total", "Entries dropped from the local response cache to stay in bounds",
+            registry=registry,
+        )
+
+        self.idempotency_requests = Counter(
+            "idempotency_requests_total", "Requests carrying an idempotency key, by outcome", ["outcome"],
+            registry=registry,
+        )
+
+    @contextmanager
+    def node(self, name: str):
+        """Time a graph node"""
+        with self._measure(self.node_duration.labels(node=name), self.node_in_flight.labels(node=name),
+                           self.node_errors.labels(node=name)):
+            yield
+
+    @contextmanager
+    def llm(self, model: str, purpose: str):
+        """Time a model call; report the response through the yielded LLMCall"""
+        with self._measure(self.llm_duration.labels(model=model, purpose=purpose),
+                           self.llm_in_flight.labels(model=model),
+                           self.llm_errors.labels(model=model, purpose=purpose)):
+            yield LLMCall(self, model)
+
+    @contextmanager
+    def tool(self, name: str):
+        """Time a tool call"""
+        with self._measure(self.tool_duration.labels(tool=name), self.tool_in_flight.labels(tool=name),
+                           self.tool_errors.labels(tool=name)):
+            yield
+
+    @contextmanager
+    def checkpoint(self, operation: str):
+        """Time a checkpointer operation"""
+        with self._measure(self.checkpoint_duration.labels(operation=operation),
+                           self.checkpoint_in_flight.labels(operation=operation),
+                           self.checkpoint_errors.labels(operation=operation)):
+            yield
+
+    @contextmanager
+    def shard(self, name: str, operation: str):
+        """Time a checkpoint operation on one shard"""
+        with self._measure(self.shard_duration.labels(shard=name, operation=operation),
+                           self.shard_in_flight.labels(shard=name, operation=operation),
+                           self.shard_errors.labels(shard=name, operation=operation)):
+            yield
+
+    @contextmanager
+    def _measure(self, histogram, in_flight, errors):
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            yield
+        except asyncio.CancelledError:
+            raise  # abandoned, not failed
+        except BaseException:
+            errors.inc()
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - started)
+            in_flight.dec()
+
+    def on_scrape(self, name: str, hook: Callable[[], None]) -> None:
+        """Run hook() before every render, to refresh gauges read from a component's stats.
+
+        A hook registered again under the same name replaces the previous one.
+        """
+        self._scrape_hooks[name] = hook
+
+    def render(self) -> Tuple[bytes, str]:
+        """Metrics in the Prometheus text format, and its content type.
+
+        Under a multi-worker server (PROMETHEUS_MULTIPROC_DIR set), the
+        samples of all workers are aggregated rather than only this one's;
+        gauges refreshed by scrape hooks hold each worker's values as of the
+        last scrape it served.
+        """
+        for name, hook in list(self._scrape_hooks.items()):
+            try:
+                hook()
+            except Exception as e:
+                logging.warning(f"Failed to refresh {name} metrics: {e}")
+
+        registry = self.registry
+        if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+_metrics: Optional[Metrics] = None
+
+
+def get_metrics(config: Config) -> Optional[Metrics]:
+    """The process-wide metrics, or None if disabled or prometheus_client is not installed.
+
+    Collectors are registered once per process, so every agent and
+    checkpointer in the process reports into the same series.
+    """
+    global _metrics
+
+    if not config.metrics.enabled:
+        return None
+    if not PROMETHEUS_AVAILABLE:
+        logging.warning("prometheus_client is not installed, metrics are disabled")
+        return None
+
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
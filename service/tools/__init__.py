@@ -0,0 +1,4 @@
+from .registry import ToolRegistry
+from .executor import ToolExecutor
+
+__all__ = ['ToolRegistry', 'ToolExecutor']
@@ -0,0 +1,124 @@
+import os
+import ast
+import math
+import operator
+from typing import Any, Dict
+from langchain_core.tools import BaseTool, StructuredTool
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+FUNCTIONS = {
+    name: getattr(math, name)
+    for name in ("sqrt", "exp", "log", "log10", "log2", "sin", "cos", "tan", "asin", "acos", "atan",
+                 "floor", "ceil", "factorial")
+}
+FUNCTIONS.update({"abs": abs, "round": round, "min": min, "max": max})
+CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau}
+
+# Bounds that keep one expression from pinning a worker (e.g. 9**9**9 or factorial(10**6))
+MAX_EXPRESSION_CHARS = 500
+MAX_EXPONENT = 10000
+MAX_FACTORIAL = 1000
+# Largest integer result, checked before computing it (about 4200 digits, within Python's int-to-str limit)
+MAX_INT_BITS = 14000
+
+
+def evaluate(expression: str) -> float:
+    """Evaluate an arithmetic expression without eval(); names are limited to math functions and constants"""
+    if len(expression) > MAX_EXPRESSION_CHARS:
+        raise ValueError(f"expression longer than {MAX_EXPRESSION_CHARS} characters")
+    return _evaluate(ast.parse(expression, mode="eval").body)
+
+
+def _evaluate(node):
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool):
+        return node.value
+    if isinstance(node, ast.Name) and node.id in CONSTANTS:
+        return CONSTANTS[node.id]
+    if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+        return UNARY_OPERATORS[type(node.op)](_evaluate(node.operand))
+    if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+        left, right = _evaluate(node.left), _evaluate(node.right)
+        if isinstance(node.op, ast.Pow) and abs(right) > MAX_EXPONENT:
+            raise ValueError(f"exponent larger than {MAX_EXPONENT}")
+        if _result_bits(node.op, left, right) > MAX_INT_BITS:
+            raise ValueError(f"result larger than {MAX_INT_BITS} bits")
+        return BINARY_OPERATORS[type(node.op)](left, right)
+    if (isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in FUNCTIONS
+            and not node.keywords):
+        args = [_evaluate(arg) for arg in node.args]
+        if node.func.id == "factorial" and args and args[0] > MAX_FACTORIAL:
+            raise ValueError(f"factorial argument larger than {MAX_FACTORIAL}")
+        return FUNCTIONS[node.func.id](*args)
+    raise ValueError(f"unsupported expression: {ast.dump(node)[:80]}")
+
+
+def _result_bits(op, left, right) -> float:
+    """Upper bound on the bit length of an integer product or power (0 for anything else)"""
+    if not isinstance(left, int) or not isinstance(right, int):
+        return 0
+    if isinstance(op, ast.Mult):
+        return abs(left).bit_length() + abs(right).bit_length()
+    if isinstance(op, ast.Pow) and right > 0 and abs(left) > 1:
+        return right * math.log2(abs(left))
+    return 0
+
+
+def create_calculator(settings: Dict[str, Any]) -> BaseTool:
+    precision = settings.get("precision")
+
+    def calculator(expression: str) -> str:
+        result = evaluate(expression)
+        if precision is not None and isinstance(result, float):
+            result = round(result, precision)
+        return str(result)
+
+    return StructuredTool.from_function(
+        func=calculator,
+        name="calculator",
+        description="Evaluate an arithmetic expression, e.g. '2 * (3 + 4) ** 2' or 'sqrt(2) * pi'. "
+                    "Supports + - * / // % **, math functions and the constants pi, e and tau.",
+    )
+
+
+def create_file_operations(settings: Dict[str, Any]) -> BaseTool:
+    allowed = [os.path.realpath(path) for path in settings.get("allowed_paths", [])]
+    max_bytes = settings.get("max_bytes", 65536)
+
+    def resolve(path: str) -> str:
+        resolved = os.path.realpath(path)
+        if not any(resolved == root or resolved.startswith(root + os.sep) for root in allowed):
+            raise PermissionError(f"{path} is outside the allowed paths")
+        return resolved
+
+    def file_operations(operation: str, path: str) -> str:
+        resolved = resolve(path)
+        if operation == "list":
+            return "\n".join(sorted(os.listdir(resolved)))
+        if operation == "read":
+            with open(resolved, "rb") as f:
+                data = f.read(max_bytes + 1)
+            text = data[:max_bytes].decode("utf-8", errors="replace")
+            return text + ("\n[truncated]" if len(data) > max_bytes else "")
+        raise ValueError(f"unknown operation: {operation} (use read or list)")
+
+    return StructuredTool.from_function(
+        func=file_operations,
+        name="file_operations",
+        description="Read a text file (operation 'read') or list a directory (operation 'list'). "
+                    f"Only paths under {', '.join(allowed) or '(none)'} are accessible.",
+    )
+
+
+BUILTIN_TOOLS = {
+    "calculator": create_calculator,
+    "file_operations": create_file_operations,
+}
@@ -0,0 +1,133 @@
+import json
+import time
+import asyncio
+import logging
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import BaseTool
+from service.config import Config
+from service.cache import LRUCache
+
+
+class ToolExecutor:
+    """Runs the tool calls of one model response concurrently on a bounded thread pool.
+
+    Every call has a timeout (tools.timeout, or the tool's own); a call that
+    raises or times out answers with an error message so the model can
+    recover, and the turn goes on. Timed-out calls keep running in the
+    background until they return. Results of tools marked `cache: true`
+    (deterministic ones) are memoized by tool name and arguments.
+    """
+
+    def __init__(self, tools: List[BaseTool], max_workers: int = 8, timeout: float = 30.0,
+                 timeouts: Optional[Dict[str, float]] = None, cacheable: Iterable[str] = (),
+                 cache: Optional[LRUCache] = None, metrics=None):
+        self.tools = {tool.name: tool for tool in tools}
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+        self.cacheable = set(cacheable)
+        self.cache = cache
+        self.metrics = metrics
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+
+    @staticmethod
+    def from_config(config: Config, tools: List[BaseTool], metrics=None) -> Optional["ToolExecutor"]:
+        """Create the executor for the given tools, or None if there are none"""
+        if not tools:
+            return None
+        tools_config = config.tools
+        settings = tools_config.settings
+        timeouts = {tool.name: settings[tool.name]["timeout"] for tool in tools
+                    if "timeout" in settings.get(tool.name, {})}
+        cacheable = [tool.name for tool in tools if settings.get(tool.name, {}).get("cache")]
+        cache = None
+        if cacheable:
+            cache = LRUCache(max_entries=tools_config.cache_max_entries, ttl_seconds=tools_config.cache_ttl_seconds)
+        return ToolExecutor(tools, tools_config.max_workers, tools_config.timeout, timeouts, cacheable, cache, metrics)
+
+    def run(self, tool_calls: List[Dict[str, Any]]) -> List[ToolMessage]:
+        """Answer every tool call, in order; the calls run at the same time"""
+        started = time.monotonic()
+        pending = [(call, self._ready(call) or self._submit(call)) for call in tool_calls]
+
+        messages = []
+        for call, result in pending:
+            if isinstance(result, ToolMessage):
+                messages.append(result)
+                continue
+            remaining = max(0.0, started + self._timeout(call) - time.monotonic())
+            try:
+                messages.append(self._succeeded(call, result.result(timeout=remaining)))
+            except TimeoutError:
+                result.cancel()
+                messages.append(self._timed_out(call))
+            except Exception as e:
+                messages.append(self._failed(call, e))
+        return messages
+
+    async def arun(self, tool_calls: List[Dict[str, Any]]) -> List[ToolMessage]:
+        """Async variant of run; the tools still run on the executor's threads"""
+        async def answer(call):
+            ready = self._ready(call)
+            if ready is not None:
+                return ready
+            try:
+                content = await asyncio.wait_for(asyncio.wrap_future(self._submit(call)), self._timeout(call))
+            except asyncio.TimeoutError:
+                return self._timed_out(call)
+            except Exception as e:
+                return self._failed(call, e)
+            return self._succeeded(call, content)
+
+        return list(await asyncio.gather(*(answer(call) for call in tool_calls)))
+
+    def _ready(self, call) -> Optional[ToolMessage]:
+        """The answer of a call that needs no execution: unknown tool or memoized result"""
+        if call["name"] not in self.tools:
+            return self._message(call, f"error: unknown tool {call['name']}", "error")
+        if call["name"] in self.cacheable:
+            content = self.cache.get(self._cache_key(call))
+            if content is not None:
+                if self.metrics is not None:
+                    self.metrics.tool_cache_hits.labels(tool=call["name"]).inc()
+                return self._message(call, content)
+        return None
+
+    def _submit(self, call) -> Future:
+        return self._executor.submit(contextvars.copy_context().run, self._invoke, call)
+
+    def _invoke(self, call) -> str:
+        tool = self.tools[call["name"]]
+        if self.metrics is None:
+            return str(tool.invoke(call["args"]))
+        with self.metrics.tool(tool.name):
+            return str(tool.invoke(call["args"]))
+
+    def _timeout(self, call) -> float:
+        return self.timeouts.get(call["name"], self.timeout)
+
+    def _succeeded(self, call, content: str) -> ToolMessage:
+        if call["name"] in self.cacheable:
+            self.cache.set(self._cache_key(call), content)
+        return self._message(call, content)
+
+    def _timed_out(self, call) -> ToolMessage:
+        logging.warning(f"tool {call['name']} timed out after {self._timeout(call)}s")
+        if self.metrics is not None:
+            self.metrics.tool_timeouts.labels(tool=call["name"]).inc()
+        return self._message(call, f"error: tool timed out after {self._timeout(call)}s", "error")
+
+    @staticmethod
+    def _failed(call, error: Exception) -> ToolMessage:
+        logging.warning(f"tool {call['name']} failed: {type(error).__name__}: {error}")
+        return ToolExecutor._message(call, f"error: {error}", "error")
+
+    @staticmethod
+    def _message(call, content: str, status: str = "success") -> ToolMessage:
+        return ToolMessage(content=content, tool_call_id=call["id"], name=call["name"], status=status)
+
+    @staticmethod
+    def _cache_key(call) -> tuple:
+        return call["name"], json.dumps(call["args"], sort_keys=True, default=str)
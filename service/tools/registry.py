@@ -0,0 +1,40 @@
+import logging
+from typing import Callable, Dict, List
+from langchain_core.tools import BaseTool
+from service.config import Config
+from .builtin import BUILTIN_TOOLS
+
+
+class ToolRegistry:
+    """Factory of the tools enabled in config.tools"""
+
+    _factories: Dict[str, Callable[[dict], BaseTool]] = dict(BUILTIN_TOOLS)
+
+    @staticmethod
+    def register(name: str, factory: Callable[[dict], BaseTool]) -> None:
+        """Make a tool available to config.tools; the factory receives the tool's settings"""
+        ToolRegistry._factories[name] = factory
+
+    @staticmethod
+    def enabled_names(config: Config) -> List[str]:
+        """Tools listed in tools.enabled or whose own section sets enabled: true"""
+        names = list(config.tools.enabled)
+        for name, settings in config.tools.settings.items():
+            if settings.get("enabled") and name not in names:
+                names.append(name)
+        return [name for name in names if config.tools.settings.get(name, {}).get("enabled", True)]
+
+    @staticmethod
+    def from_config(config: Config) -> List[BaseTool]:
+        """Create the enabled tools; unknown names are skipped with a warning"""
+        tools = []
+        for name in ToolRegistry.enabled_names(config):
+            factory = ToolRegistry._factories.get(name)
+            if factory is None:
+                logging.warning(f"Unknown tool: {name}, skipping it")
+                continue
+            tools.append(factory(config.tools.settings.get(name, {})))
+
+        if tools:
+            logging.info(f"Tools enabled: {', '.join(tool.name for tool in tools)}")
+        return tools
@@ -0,0 +1,20 @@
+import pytest
+from service.config import SqliteConfig
+from service.checkpointer.sqlite import SqliteCheckpointSaver, SqliteConnectionPool
+
+
+@pytest.fixture
+def sqlite_saver(tmp_path):
+    """Factory of SQLite checkpointers in the test's directory, closed at teardown"""
+    pools = []
+
+    def create(name="checkpoints.sqlite"):
+        pool = SqliteConnectionPool(SqliteConfig(path=str(tmp_path / name)))
+        pools.append(pool)
+        saver = SqliteCheckpointSaver(pool)
+        saver.setup()
+        return saver
+
+    yield create
+    for pool in pools:
+        pool.close()
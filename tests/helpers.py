@@ -0,0 +1,29 @@
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.base.id import uuid6
+
+
+def thread_config(thread_id, checkpoint_ns=""):
+    return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns}}
+
+
+def make_checkpoint(step):
+    """A checkpoint with one channel holding the step number"""
+    checkpoint = empty_checkpoint()
+    checkpoint["id"] = str(uuid6(clock_seq=step))
+    checkpoint["channel_values"] = {"step": step}
+    checkpoint["channel_versions"] = {"step": step + 1}
+    return checkpoint
+
+
+def put_steps(saver, thread_id, steps):
+    """Write `steps` checkpoints to a thread, each with one pending write; returns the last config"""
+    config = thread_config(thread_id)
+    for step in range(steps):
+        config = saver.put(config, make_checkpoint(step), {"step": step}, {"step": step + 1})
+        saver.put_writes(config, [("step", step)], f"task-{step}")
+    return config
+
+
+def steps(saver, thread_id):
+    """Steps of a thread's checkpoints, oldest first"""
+    return sorted(item.metadata["step"] for item in saver.list({"configurable": {"thread_id": thread_id}}))
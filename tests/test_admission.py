@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+import pytest
+from service.concurrency import AdmissionController, OverloadedError, TokenBucketLimiter
+
+
+def hold_slots(admission, count):
+    """Occupy `count` slots from background threads; returns the event that releases them"""
+    release, started = threading.Event(), threading.Semaphore(0)
+
+    def hold():
+        with admission.admit():
+            started.release()
+            release.wait(5)
+
+    for _ in range(count):
+        threading.Thread(target=hold, daemon=True).start()
+        started.acquire(timeout=5)
+    return release
+
+
+def test_turns_beyond_the_limit_wait_for_a_slot():
+    admission = AdmissionController(1, max_queue=1, queue_timeout=5)
+    release = hold_slots(admission, 1)
+    threading.Timer(0.05, release.set).start()
+
+    with admission.admit():
+        assert admission.stats()["in_flight"] == 1
+    assert admission.stats() == {"in_flight": 0, "waiting": 0, "max_concurrent": 1, "max_queue": 1}
+
+
+def test_full_queue_rejects_at_once():
+    admission = AdmissionController(1, max_queue=0, queue_timeout=5)
+    release = hold_slots(admission, 1)
+    try:
+        started = time.monotonic()
+        with pytest.raises(OverloadedError) as rejected:
+            with admission.admit():
+                pass
+        assert rejected.value.reason == "queue_full" and rejected.value.retry_after >= 1
+        assert time.monotonic() - started < 1
+        with pytest.raises(OverloadedError):
+            admission.check()
+    finally:
+        release.set()
+
+
+def test_queue_timeout_rejects_a_waiting_turn():
+    admission = AdmissionController(1, max_queue=1, queue_timeout=0.05)
+    release = hold_slots(admission, 1)
+    try:
+        with pytest.raises(OverloadedError) as rejected:
+            with admission.admit():
+                pass
+        assert rejected.value.reason == "queue_timeout"
+        assert admission.stats()["waiting"] == 0
+    finally:
+        release.set()
+
+
+def test_async_admission_times_out_and_recovers():
+    async def scenario():
+        admission = AdmissionController(1, max_queue=1, queue_timeout=0.05)
+        release = asyncio.Event()
+
+        async def hold():
+            async with admission.aadmit():
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        with pytest.raises(OverloadedError):
+            async with admission.aadmit():
+                pass
+        release.set()
+        await holder
+        async with admission.aadmit():
+            assert admission.stats()["in_flight"] == 1
+
+    asyncio.run(scenario())
+
+
+def test_rate_limit_is_per_key():
+    limiter = TokenBucketLimiter(rate=0.001, burst=2)
+    limiter.acquire("a")
+    limiter.acquire("a")
+    with pytest.raises(OverloadedError) as limited:
+        limiter.acquire("a")
+    assert limited.value.reason == "rate_limited"
+    limiter.acquire("b")
+
+
+def test_batch_cost_is_charged_in_full():
+    limiter = TokenBucketLimiter(rate=0.001, burst=10)
+    limiter.acquire("client", cost=8)
+    with pytest.raises(OverloadedError):
+        limiter.acquire("client", cost=3)
+    with pytest.raises(ValueError):
+        limiter.acquire("other", cost=11)
+
+
+def test_bucket_refills_at_the_rate():
+    limiter = TokenBucketLimiter(rate=100, burst=1)
+    limiter.acquire("a")
+    time.sleep(0.03)
+    limiter.acquire("a")
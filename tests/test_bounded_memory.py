@@ -0,0 +1,93 @@
+import os
+import time
+from service.checkpointer.bounded_memory import BoundedMemorySaver
+from .helpers import put_steps, steps, thread_config
+
+
+def spilled(directory):
+    return [name for _, _, names in os.walk(directory) for name in names if name.endswith(".ckpt")]
+
+
+def test_least_recently_used_threads_are_evicted_over_the_thread_budget():
+    saver = BoundedMemorySaver(max_threads=2)
+    put_steps(saver, "t1", 1)
+    put_steps(saver, "t2", 1)
+    saver.get_tuple(thread_config("t1"))
+    put_steps(saver, "t3", 1)
+
+    assert steps(saver, "t2") == []
+    assert steps(saver, "t1") == [0] and steps(saver, "t3") == [0]
+    assert saver.stats()["evictions"] == 1
+
+
+def test_threads_are_evicted_over_the_byte_budget_but_not_the_one_being_written():
+    saver = BoundedMemorySaver(max_bytes=1)
+    put_steps(saver, "t1", 2)
+    assert steps(saver, "t1") == [0, 1]
+
+    put_steps(saver, "t2", 1)
+    assert steps(saver, "t1") == []
+    assert saver.stats()["threads"] == 1
+    assert saver.stats()["bytes"] > 1
+
+
+def test_reads_of_unknown_threads_track_nothing():
+    saver = BoundedMemorySaver(max_threads=1)
+    put_steps(saver, "t1", 1)
+
+    for thread_id in ("ghost-1", "ghost-2"):
+        assert saver.get_tuple(thread_config(thread_id)) is None
+        assert list(saver.list(thread_config(thread_id))) == []
+
+    assert steps(saver, "t1") == [0]
+    assert saver.stats()["threads"] == 1 and saver.stats()["evictions"] == 0
+    assert "ghost-1" not in saver.storage
+
+
+def test_idle_threads_are_evicted():
+    saver = BoundedMemorySaver(idle_ttl_seconds=0.05)
+    put_steps(saver, "t1", 1)
+    time.sleep(0.1)
+    put_steps(saver, "t2", 1)
+
+    assert steps(saver, "t1") == []
+    assert steps(saver, "t2") == [0]
+
+
+def test_evicted_threads_are_spilled_and_loaded_back(tmp_path):
+    saver = BoundedMemorySaver(max_threads=1, spill_dir=str(tmp_path / "spill"))
+    put_steps(saver, "t1", 2)
+    put_steps(saver, "t2", 1)
+    assert len(spilled(tmp_path / "spill")) == 1
+
+    latest = saver.get_tuple(thread_config("t1"))
+    assert latest.checkpoint["channel_values"] == {"step": 1}
+    assert latest.pending_writes == [("task-1", "step", 1)]
+    assert steps(saver, "t1") == [0, 1]
+    assert saver.stats()["reloads"] == 1
+    # Loading t1 back spilled t2 in its place
+    assert steps(saver, "t2") == [0]
+
+
+def test_deleting_a_spilled_thread_removes_its_file(tmp_path):
+    saver = BoundedMemorySaver(max_threads=1, spill_dir=str(tmp_path / "spill"))
+    put_steps(saver, "t1", 1)
+    put_steps(saver, "t2", 1)
+
+    saver.delete_thread("t1")
+    assert spilled(tmp_path / "spill") == []
+    assert saver.get_tuple(thread_config("t1")) is None
+
+
+def test_each_process_spills_to_its_own_slot(tmp_path):
+    spill_dir = str(tmp_path / "spill")
+    first = BoundedMemorySaver(max_threads=1, spill_dir=spill_dir)
+    second = BoundedMemorySaver(max_threads=1, spill_dir=spill_dir)
+    put_steps(first, "t1", 1)
+    put_steps(first, "t2", 1)
+    put_steps(second, "t1", 3)
+    put_steps(second, "t2", 1)
+
+    assert first.spill_dir != second.spill_dir
+    assert steps(first, "t1") == [0]
+    assert steps(second, "t1") == [0, 1, 2]
@@ -0,0 +1,73 @@
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.checkpoint.memory import MemorySaver
+from service.agent.agent import chat_agent
+from service.agent.context import ContextWindow
+from service.config import Config, ContextConfig
+
+
+def turns(count, words=20):
+    """`count` question/answer turns of about `words` tokens per message"""
+    messages = []
+    for turn in range(count):
+        messages.append(HumanMessage("question " * words, id=f"h{turn}"))
+        messages.append(AIMessage("answer " * words, id=f"a{turn}"))
+    return messages
+
+
+def window(max_tokens=100, keep_last_turns=2, summary_max_tokens=10):
+    return ContextWindow(ContextConfig(enabled=True, max_tokens=max_tokens, keep_last_turns=keep_last_turns,
+                                       summary_max_tokens=summary_max_tokens))
+
+
+def test_a_prompt_under_budget_is_not_summarized():
+    update, summarized = window(max_tokens=10000).plan({"messages": turns(3)})
+
+    assert summarized == []
+    assert set(update["token_counts"]) == {"h0", "a0", "h1", "a1", "h2", "a2"}
+
+
+def test_old_turns_are_cut_at_a_turn_boundary_keeping_the_last_ones():
+    _, summarized = window(max_tokens=60, keep_last_turns=2).plan({"messages": turns(5)})
+
+    assert [msg.id for msg in summarized] == ["h0", "a0", "h1", "a1", "h2", "a2"]
+
+
+def test_summarized_messages_stay_in_the_history_but_leave_the_prompt():
+    context = window(max_tokens=60, keep_last_turns=2)
+    state = {"messages": turns(5)}
+    update, summarized = context.plan(state)
+    state.update(context.apply(update, summarized, "they talked"))
+
+    assert len(state["messages"]) == 10
+    assert state["summarized_through"] == "a2"
+    prompt = context.prompt_messages(state)
+    assert isinstance(prompt[0], SystemMessage) and "they talked" in prompt[0].content
+    assert [msg.id for msg in prompt[1:]] == ["h3", "a3", "h4", "a4"]
+
+
+def test_only_unsummarized_messages_count_towards_the_budget():
+    context = window(max_tokens=60, keep_last_turns=2)
+    state = {"messages": turns(5), "summary": "they talked", "summarized_through": "a2", "token_counts": {}}
+
+    update, summarized = context.plan(state)
+    assert summarized == []
+    assert set(update["token_counts"]) == {"h3", "a3", "h4", "a4"}
+
+
+def test_a_thread_keeps_its_full_history_through_summaries():
+    config = Config()
+    config.graph.context.enabled = True
+    config.graph.context.max_tokens = 120
+    config.graph.context.keep_last_turns = 2
+    config.graph.context.summary_max_tokens = 30
+    model = FakeListChatModel(responses=["answer " * 10, "SUMMARY"] * 20)
+    agent = chat_agent(model, [], MemorySaver(), config)
+
+    for turn in range(6):
+        state, _ = agent.handle_message(f"question number {turn} " * 3, "t1")
+
+    assert len(state["messages"]) == 12
+    assert state["summary"] == "SUMMARY"
+    page, _ = agent.get_messages("t1", limit=100)
+    assert len(page["messages"]) == 12
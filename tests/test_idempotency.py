@@ -0,0 +1,121 @@
+import asyncio
+import threading
+import pytest
+from service.cache import LRUCache
+from service.idempotency.store import IdempotencyConflictError, IdempotencyStore
+
+
+class Outcomes:
+    """Stand-in for the metrics, recording the idempotency outcomes counted"""
+
+    def __init__(self):
+        self.joined = threading.Event()
+        self.idempotency_requests = self
+
+    def labels(self, outcome):
+        if outcome == "joined":
+            self.joined.set()
+        return self
+
+    def inc(self):
+        pass
+
+
+def store():
+    return IdempotencyStore(LRUCache(max_entries=100, ttl_seconds=60), wait_timeout=5, metrics=Outcomes())
+
+
+def run_while_first_waits(store, first_outcome, second_outcome):
+    """Run a request, and a retry of it while the first one still runs; returns both results and the calls made"""
+    calls, started, release = [], threading.Event(), threading.Event()
+
+    def first():
+        calls.append("first")
+        started.set()
+        release.wait(5)
+        return first_outcome
+
+    def second():
+        calls.append("second")
+        return second_outcome
+
+    results = {}
+    thread = threading.Thread(target=lambda: results.setdefault("first", store.run("key", "request", first)))
+    thread.start()
+    started.wait(5)
+    retry = threading.Thread(target=lambda: results.setdefault("retry", store.run("key", "request", second)))
+    retry.start()
+    store.metrics.joined.wait(5)
+    release.set()
+    thread.join(5)
+    retry.join(5)
+    return results, calls
+
+
+def test_retry_waiting_for_a_success_gets_its_response():
+    results, calls = run_while_first_waits(store(), (200, {"answer": 1}, {}), (200, {"answer": 2}, {}))
+
+    assert results["first"] == ((200, {"answer": 1}, {}), False)
+    assert results["retry"] == ((200, {"answer": 1}, {}), True)
+    assert calls == ["first"]
+
+
+@pytest.mark.parametrize("code", [429, 500, 504])
+def test_retry_waiting_for_a_failure_runs_again(code):
+    results, calls = run_while_first_waits(store(), (code, {"error": "x"}, {}), (200, {"answer": 2}, {}))
+
+    assert results["first"] == ((code, {"error": "x"}, {}), False)
+    assert results["retry"] == ((200, {"answer": 2}, {}), False)
+    assert calls == ["first", "second"]
+
+
+def test_finished_success_is_replayed_and_failure_is_not():
+    keys = store()
+    assert keys.run("ok", "request", lambda: (200, {"n": 1}, {}))[1] is False
+    assert keys.run("ok", "request", lambda: (200, {"n": 2}, {})) == ((200, {"n": 1}, {}), True)
+
+    assert keys.run("failed", "request", lambda: (500, {}, {}))[1] is False
+    assert keys.run("failed", "request", lambda: (200, {"n": 3}, {})) == ((200, {"n": 3}, {}), False)
+
+
+def test_key_reused_for_another_request_conflicts():
+    keys = store()
+    keys.run("key", "request", lambda: (200, {}, {}))
+    with pytest.raises(IdempotencyConflictError):
+        keys.run("key", "another request", lambda: (200, {}, {}))
+
+
+def test_async_retry_waiting_for_a_failure_runs_again():
+    async def scenario():
+        keys = store()
+        release = asyncio.Event()
+
+        async def first():
+            await release.wait()
+            return 503, {}, {}
+
+        async def second():
+            return 200, {"answer": 2}, {}
+
+        async def succeed():
+            await release.wait()
+            return 200, {"answer": 3}, {}
+
+        running = asyncio.create_task(keys.arun("key", "request", first))
+        await asyncio.sleep(0)
+        retry = asyncio.create_task(keys.arun("key", "request", second))
+        await asyncio.sleep(0)
+        release.set()
+        assert (await running)[0][0] == 503
+        assert await retry == ((200, {"answer": 2}, {}), False)
+
+        release.clear()
+        running = asyncio.create_task(keys.arun("other", "request", succeed))
+        await asyncio.sleep(0)
+        retry = asyncio.create_task(keys.arun("other", "request", second))
+        await asyncio.sleep(0)
+        release.set()
+        assert await running == ((200, {"answer": 3}, {}), False)
+        assert await retry == ((200, {"answer": 3}, {}), True)
+
+    asyncio.run(scenario())
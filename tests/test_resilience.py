@@ -0,0 +1,106 @@
+import time
+import asyncio
+import threading
+import pytest
+from service.agent.resilience import ModelTimeoutError, ResilientCaller
+from service.config import ConfigLoader, GraphNodeConfig
+
+
+class Attempts:
+    """A model call that plays a script: per attempt, seconds to sleep or an exception to raise"""
+
+    def __init__(self, *script):
+        self.script = list(script)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _next(self):
+        with self._lock:
+            self.calls += 1
+            return self.script.pop(0) if self.script else 0
+
+    def __call__(self):
+        step = self._next()
+        if isinstance(step, Exception):
+            raise step
+        time.sleep(step)
+        return f"answer {self.calls}"
+
+    async def acall(self):
+        step = self._next()
+        if isinstance(step, Exception):
+            raise step
+        await asyncio.sleep(step)
+        return f"answer {self.calls}"
+
+
+def caller(max_workers=8, **node):
+    node.setdefault("retry_backoff", 0.001)
+    return ResilientCaller(GraphNodeConfig(**node), max_workers=max_workers)
+
+
+def test_transient_failures_are_retried():
+    attempts = Attempts(ConnectionError("reset"), TimeoutError("slow"))
+
+    assert caller(retries=2).call(attempts, "chat") == "answer 3"
+    assert attempts.calls == 3
+
+
+def test_retries_stop_after_the_configured_count():
+    attempts = Attempts(ConnectionError("reset"), ConnectionError("reset"))
+
+    with pytest.raises(ConnectionError):
+        caller(retries=1).call(attempts, "chat")
+    assert attempts.calls == 2
+
+
+def test_other_failures_are_not_retried():
+    attempts = Attempts(ValueError("bad request"))
+
+    with pytest.raises(ValueError):
+        caller(retries=2).call(attempts, "chat")
+    assert attempts.calls == 1
+
+
+def test_a_slow_call_times_out():
+    with pytest.raises(ModelTimeoutError):
+        caller(timeout=0.05, retries=0).call(Attempts(1), "chat")
+
+
+def test_a_slow_async_call_times_out():
+    with pytest.raises(ModelTimeoutError):
+        asyncio.run(caller(timeout=0.05, retries=0).acall(Attempts(1).acall, "chat"))
+
+
+def test_a_hedge_answers_for_a_slow_first_attempt():
+    attempts = Attempts(1, 0)
+    started = time.monotonic()
+
+    assert caller(timeout=5, hedge=True, hedge_delay=0.05).call(attempts, "chat") == "answer 2"
+    assert time.monotonic() - started < 0.5
+
+
+def test_an_async_hedge_answers_for_a_slow_first_attempt():
+    attempts = Attempts(1, 0)
+
+    result = asyncio.run(caller(timeout=5, hedge=True, hedge_delay=0.05).acall(attempts.acall, "chat"))
+    assert result == "answer 2"
+
+
+def test_a_call_runs_inline_when_every_worker_is_busy():
+    resilient = caller(max_workers=1, timeout=5)
+    blocker = threading.Thread(target=resilient.call, args=(Attempts(0.3), "chat"))
+    blocker.start()
+    time.sleep(0.05)
+    try:
+        assert resilient.call(Attempts(0), "chat") == "answer 1"
+    finally:
+        blocker.join()
+
+
+def test_nodes_default_to_the_same_retries_in_code_and_yaml(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text("graph:\n  nodes:\n    agent:\n      timeout: 10\n")
+
+    loaded = ConfigLoader(str(path)).load().graph.nodes["agent"]
+    assert loaded.retries == GraphNodeConfig().retries == 2
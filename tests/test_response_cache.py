@@ -0,0 +1,52 @@
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from service.cache import LRUCache, ResponseCache
+
+SEARCH = {"type": "function", "function": {"name": "search", "description": "Search the web", "parameters": {}}}
+
+
+def response_cache(model="gemini", parameters=None):
+    return ResponseCache(model, parameters or {"temperature": 0}, LRUCache(max_entries=100))
+
+
+def test_ids_and_whitespace_do_not_change_the_key():
+    cache = response_cache()
+    first = [SystemMessage("Be brief."), HumanMessage("what  is\n2+2?", id="a")]
+    second = [SystemMessage("Be brief."), HumanMessage(" what is 2+2? ", id="b")]
+
+    assert cache.key(first) == cache.key(second)
+
+
+def test_prompt_model_and_parameters_are_part_of_the_key():
+    prompt = [HumanMessage("what is 2+2?")]
+    key = response_cache().key(prompt)
+
+    assert response_cache().key([HumanMessage("what is 2+3?")]) != key
+    assert response_cache(model="other").key(prompt) != key
+    assert response_cache(parameters={"temperature": 0, "max_tokens": 10}).key(prompt) != key
+
+
+def test_tool_calls_in_the_prompt_are_part_of_the_key():
+    cache = response_cache()
+    asked = AIMessage("", tool_calls=[{"name": "search", "args": {"q": "paris"}, "id": "1"}])
+    other = AIMessage("", tool_calls=[{"name": "search", "args": {"q": "rome"}, "id": "2"}])
+
+    assert cache.key([HumanMessage("hi"), asked]) != cache.key([HumanMessage("hi"), other])
+
+
+def test_calls_with_and_without_tools_do_not_share_entries():
+    cache = response_cache()
+    prompt = [HumanMessage("what's the weather in Paris?")]
+    cache.set(prompt, AIMessage("", tool_calls=[{"name": "search", "args": {"q": "paris"}, "id": "1"}]), [SEARCH])
+
+    assert cache.get(prompt) is None
+    assert cache.get(prompt, [SEARCH]).tool_calls[0]["args"] == {"q": "paris"}
+
+
+def test_hits_get_a_fresh_message_id():
+    cache = response_cache()
+    prompt = [HumanMessage("hi")]
+    cache.set(prompt, AIMessage("hello", id="cached"))
+
+    hit = cache.get([HumanMessage("hi", id="other")])
+    assert hit.content == "hello"
+    assert hit.id is None
@@ -0,0 +1,87 @@
+import pytest
+from langgraph.checkpoint.memory import MemorySaver
+from service.checkpointer.rebalance import ShardRebalancer
+from service.checkpointer.sharding import HashRing, ShardedCheckpointSaver
+from .helpers import put_steps, steps, thread_config
+
+
+def threads_owned_by(shard, count=3):
+    """Thread ids that `shard` owns on a ring of shards a and b"""
+    ring = HashRing(["a", "b"])
+    return [thread_id for thread_id in (f"thread-{i}" for i in range(1000)) if ring.owner(thread_id) == shard][:count]
+
+
+class FailingSaver(MemorySaver):
+    """Fails the n-th put, like a shard losing its connection in the middle of a move"""
+
+    def __init__(self, fail_at):
+        super().__init__()
+        self.fail_at = fail_at
+        self.puts = 0
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        self.puts += 1
+        if self.puts == self.fail_at:
+            raise ConnectionError("shard went away")
+        return super().put(config, checkpoint, metadata, new_versions)
+
+
+def test_threads_route_to_their_owner(sqlite_saver):
+    shards = {"a": sqlite_saver("a.sqlite"), "b": sqlite_saver("b.sqlite")}
+    sharded = ShardedCheckpointSaver(shards)
+    for i in range(20):
+        put_steps(sharded, f"t{i}", 1)
+
+    for i in range(20):
+        owner = sharded.owner(f"t{i}")
+        assert steps(shards[owner], f"t{i}") == [0]
+        assert all(steps(shard, f"t{i}") == [] for name, shard in shards.items() if name != owner)
+    assert len(list(sharded.list(None))) == 20
+
+
+def test_joining_shard_takes_threads_over_on_access():
+    old, new = MemorySaver(), MemorySaver()
+    thread_id = threads_owned_by("b", 1)[0]
+    put_steps(ShardedCheckpointSaver({"a": old}), thread_id, 3)
+
+    sharded = ShardedCheckpointSaver({"a": old, "b": new}, joining=["b"])
+    latest = sharded.get_tuple(thread_config(thread_id))
+
+    assert latest.metadata["step"] == 2
+    assert latest.pending_writes == [("task-2", "step", 2)]
+    assert steps(new, thread_id) == [0, 1, 2]
+    assert steps(old, thread_id) == []
+    assert sharded.stats()["moved"] == 1
+
+
+def test_interrupted_move_is_resumed_by_the_next_access():
+    old, new = MemorySaver(), FailingSaver(fail_at=2)
+    thread_id = threads_owned_by("b", 1)[0]
+    put_steps(ShardedCheckpointSaver({"a": old}), thread_id, 3)
+    sharded = ShardedCheckpointSaver({"a": old, "b": new}, joining=["b"])
+
+    with pytest.raises(ConnectionError):
+        sharded.get_tuple(thread_config(thread_id))
+    # Half copied: the new owner has the oldest checkpoint, the old shard still has them all
+    assert steps(new, thread_id) == [0]
+    assert steps(old, thread_id) == [0, 1, 2]
+
+    assert sharded.get_tuple(thread_config(thread_id)).metadata["step"] == 2
+    assert steps(new, thread_id) == [0, 1, 2]
+    assert steps(old, thread_id) == []
+
+
+def test_rebalance_moves_threads_nobody_touched():
+    old, new = MemorySaver(), MemorySaver()
+    moving, staying = threads_owned_by("b"), threads_owned_by("a")
+    for thread_id in moving + staying:
+        put_steps(ShardedCheckpointSaver({"a": old}), thread_id, 2)
+    sharded = ShardedCheckpointSaver({"a": old, "b": new}, joining=["b"])
+
+    assert ShardRebalancer(sharded, dry_run=True).run()["misplaced"] == len(moving)
+    report = ShardRebalancer(sharded).run()
+
+    assert report["moved"] == len(moving) and report["failed"] == 0
+    assert all(steps(new, thread_id) == [0, 1] and steps(old, thread_id) == [] for thread_id in moving)
+    assert all(steps(old, thread_id) == [0, 1] for thread_id in staying)
+    assert ShardRebalancer(sharded).run()["misplaced"] == 0
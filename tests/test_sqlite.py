@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import pytest
+from langgraph.checkpoint.base import ERROR
+from .helpers import make_checkpoint, put_steps, steps, thread_config
+
+
+def test_latest_checkpoint_is_read_back_with_its_writes(sqlite_saver):
+    saver = sqlite_saver()
+    put_steps(saver, "t1", 3)
+
+    latest = saver.get_tuple(thread_config("t1"))
+    assert latest.checkpoint["channel_values"] == {"step": 2}
+    assert latest.metadata["step"] == 2
+    assert latest.pending_writes == [("task-2", "step", 2)]
+    parent = saver.get_tuple(latest.parent_config)
+    assert parent.checkpoint["channel_values"] == {"step": 1}
+
+
+def test_unknown_thread_has_no_checkpoint(sqlite_saver):
+    assert sqlite_saver().get_tuple(thread_config("missing")) is None
+
+
+def test_list_filters_pages_and_orders_newest_first(sqlite_saver):
+    saver = sqlite_saver()
+    put_steps(saver, "t1", 4)
+    put_steps(saver, "t2", 1)
+
+    listed = list(saver.list(thread_config("t1"), limit=2))
+    assert [item.metadata["step"] for item in listed] == [3, 2]
+    older = list(saver.list(thread_config("t1"), before=listed[-1].config))
+    assert [item.metadata["step"] for item in older] == [1, 0]
+    assert [item.metadata["step"] for item in saver.list(thread_config("t1"), filter={"step": 1})] == [1]
+
+
+def test_special_writes_replace_and_regular_writes_are_kept(sqlite_saver):
+    saver = sqlite_saver()
+    config = saver.put(thread_config("t1"), make_checkpoint(0), {"step": 0}, {"step": 1})
+    saver.put_writes(config, [("step", 1)], "task")
+    saver.put_writes(config, [("step", 2)], "task")
+    saver.put_writes(config, [(ERROR, "first")], "task")
+    saver.put_writes(config, [(ERROR, "second")], "task")
+
+    writes = saver.get_tuple(config).pending_writes
+    assert ("task", "step", 1) in writes and ("task", "step", 2) not in writes
+    assert ("task", ERROR, "second") in writes and ("task", ERROR, "first") not in writes
+
+
+def test_delete_thread_removes_only_that_thread(sqlite_saver):
+    saver = sqlite_saver()
+    put_steps(saver, "t1", 2)
+    put_steps(saver, "t2", 2)
+
+    saver.delete_thread("t1")
+    assert steps(saver, "t1") == []
+    assert steps(saver, "t2") == [0, 1]
+
+
+def test_nested_transactions_commit_together_or_not_at_all(sqlite_saver):
+    saver = sqlite_saver()
+    with pytest.raises(RuntimeError):
+        with saver.pool.transaction():
+            put_steps(saver, "t1", 2)
+            raise RuntimeError("abort the group")
+    assert steps(saver, "t1") == []
+
+    with saver.pool.transaction():
+        put_steps(saver, "t1", 2)
+    assert steps(saver, "t1") == [0, 1]
+
+
+def test_async_methods_share_the_store(sqlite_saver):
+    saver = sqlite_saver()
+
+    async def scenario():
+        config = await saver.aput(thread_config("t1"), make_checkpoint(0), {"step": 0}, {"step": 1})
+        await saver.aput_writes(config, [("step", 0)], "task")
+        return await saver.aget_tuple(thread_config("t1")), [item async for item in saver.alist(thread_config("t1"))]
+
+    latest, listed = asyncio.run(scenario())
+    assert latest.pending_writes == [("task", "step", 0)]
+    assert len(listed) == 1
+    assert saver.get_tuple(thread_config("t1")).checkpoint["channel_values"] == {"step": 0}
+
+
+def test_pool_counts_every_borrow_across_threads(sqlite_saver):
+    saver = sqlite_saver()
+    put_steps(saver, "t1", 1)
+    before = saver.pool.stats()["requests"]
+
+    def read():
+        for _ in range(50):
+            saver.get_tuple(thread_config("t1"))
+
+    readers = [threading.Thread(target=read) for _ in range(8)]
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+
+    stats = saver.pool.stats()
+    assert stats["requests"] - before == 400
+    assert stats["waiting"] == 0 and stats["in_use"] == 0
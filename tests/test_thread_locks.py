@@ -0,0 +1,103 @@
+import time
+import asyncio
+import threading
+import pytest
+from service.agent.agent import chat_agent
+from service.concurrency.thread_locks import PostgresThreadLockManager, ThreadBusyError, ThreadLockManager
+
+
+def run_turns(locks, turns, hold=0.05):
+    """Run (thread_id, label) turns on their own threads, started in order; returns the labels in run order"""
+    order, workers = [], []
+
+    def turn(thread_id, label):
+        with locks.hold(thread_id):
+            order.append(label)
+            time.sleep(hold)
+
+    for thread_id, label in turns:
+        worker = threading.Thread(target=turn, args=(thread_id, label))
+        worker.start()
+        workers.append(worker)
+        time.sleep(0.01)
+    for worker in workers:
+        worker.join()
+    return order
+
+
+def test_turns_of_one_thread_run_one_at_a_time_in_arrival_order():
+    locks = ThreadLockManager()
+    started = time.monotonic()
+
+    assert run_turns(locks, [("t1", 1), ("t1", 2), ("t1", 3)]) == [1, 2, 3]
+    assert time.monotonic() - started >= 0.15
+    assert len(locks) == 0
+
+
+def test_other_threads_are_not_blocked():
+    locks = ThreadLockManager()
+    started = time.monotonic()
+
+    run_turns(locks, [("t1", 1), ("t2", 2), ("t3", 3)], hold=0.2)
+    assert time.monotonic() - started < 0.4
+
+
+def test_a_turn_waiting_too_long_is_rejected():
+    locks = ThreadLockManager(timeout=0.05)
+    with locks.hold("t1"):
+        with pytest.raises(ThreadBusyError):
+            with locks.hold("t1"):
+                pass
+    with locks.hold("t1"):
+        pass
+    assert len(locks) == 0
+
+
+def test_async_turns_of_one_thread_are_serialized():
+    locks = ThreadLockManager(timeout=1)
+    order = []
+
+    async def turn(label):
+        async with locks.ahold("t1"):
+            order.append(f"{label} in")
+            await asyncio.sleep(0.01)
+            order.append(f"{label} out")
+
+    async def scenario():
+        await asyncio.gather(turn("a"), turn("b"))
+
+    asyncio.run(scenario())
+    assert order == ["a in", "a out", "b in", "b out"]
+    assert len(locks) == 0
+
+
+def test_async_turn_waiting_too_long_is_rejected():
+    locks = ThreadLockManager(timeout=0.05)
+
+    async def scenario():
+        async with locks.ahold("t1"):
+            with pytest.raises(ThreadBusyError):
+                async with locks.ahold("t1"):
+                    pass
+
+    asyncio.run(scenario())
+
+
+def test_advisory_lock_keys_are_stable_signed_64_bit_integers():
+    key = PostgresThreadLockManager.lock_key("t1")
+
+    assert key == PostgresThreadLockManager.lock_key("t1")
+    assert key != PostgresThreadLockManager.lock_key("t2")
+    assert -2 ** 63 <= key < 2 ** 63
+    assert PostgresThreadLockManager.lock_key(42) == PostgresThreadLockManager.lock_key("42")
+
+
+def test_batch_items_need_a_string_thread_id():
+    results, rounds = chat_agent._plan_batch([
+        {"thread_id": 42, "message": "hi"},
+        {"thread_id": "t1", "message": "hi"},
+        {"thread_id": "t1", "message": "again"},
+    ])
+
+    assert results[0] == {"thread_id": 42, "error": "thread_id must be a string"}
+    assert rounds == [[1], [2]]
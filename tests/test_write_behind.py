@@ -0,0 +1,148 @@
+import os
+import asyncio
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langgraph.checkpoint.memory import MemorySaver
+from service.agent.agent import chat_agent
+from service.checkpointer.write_behind import CheckpointJournal, WriteBehindCheckpointSaver
+from service.config import Config
+from .helpers import put_steps, steps, thread_config
+
+
+def write_behind(inner, tmp_path, **kwargs):
+    """A write-behind saver whose flusher never runs on its own during a test"""
+    kwargs.setdefault("flush_interval", 3600)
+    return WriteBehindCheckpointSaver(inner, journal_dir=str(tmp_path / "journal"), **kwargs)
+
+
+def test_reads_are_answered_from_the_buffer(tmp_path, sqlite_saver):
+    inner = sqlite_saver()
+    saver = write_behind(inner, tmp_path).start()
+    try:
+        put_steps(saver, "t1", 3)
+
+        assert inner.get_tuple(thread_config("t1")) is None
+        latest = saver.get_tuple(thread_config("t1"))
+        assert latest.checkpoint["channel_values"] == {"step": 2}
+        assert latest.pending_writes == [("task-2", "step", 2)]
+        assert saver.stats()["flushed"] == 0
+    finally:
+        saver.close()
+
+
+def test_listing_a_thread_flushes_it_first(tmp_path, sqlite_saver):
+    inner = sqlite_saver()
+    saver = write_behind(inner, tmp_path).start()
+    try:
+        put_steps(saver, "t1", 3)
+
+        assert steps(saver, "t1") == [0, 1, 2]
+        assert steps(inner, "t1") == [0, 1, 2]
+        assert saver.stats()["pending"] == 0
+    finally:
+        saver.close()
+
+
+def test_close_commits_everything_buffered(tmp_path, sqlite_saver):
+    inner = sqlite_saver()
+    saver = write_behind(inner, tmp_path).start()
+    put_steps(saver, "t1", 2)
+    put_steps(saver, "t2", 1)
+
+    saver.close()
+
+    assert steps(inner, "t1") == [0, 1]
+    assert steps(inner, "t2") == [0]
+    assert inner.get_tuple(thread_config("t1")).pending_writes == [("task-1", "step", 1)]
+    journal = tmp_path / "journal" / "slot-0"
+    assert not [name for name in os.listdir(journal) if name.endswith(".log")]
+
+
+def test_journal_is_replayed_after_a_crash(tmp_path):
+    database = MemorySaver()
+    crashed = write_behind(database, tmp_path)
+    put_steps(crashed, "t1", 3)
+    # A crash: the process dies with its buffer uncommitted and its slot lock released
+    crashed.journal.close()
+    assert steps(database, "t1") == []
+
+    restarted = write_behind(database, tmp_path).start()
+    try:
+        assert steps(database, "t1") == [0, 1, 2]
+        assert database.get_tuple(thread_config("t1")).pending_writes == [("task-2", "step", 2)]
+    finally:
+        restarted.close()
+
+
+def test_memory_durability_keeps_no_journal(tmp_path):
+    database = MemorySaver()
+    saver = write_behind(database, tmp_path, durability="memory").start()
+    try:
+        put_steps(saver, "t1", 1)
+        assert saver.journal is None
+        assert not (tmp_path / "journal").exists()
+    finally:
+        saver.close()
+    assert steps(database, "t1") == [0]
+
+
+def test_a_turn_commits_its_thread_before_releasing_it(tmp_path, sqlite_saver):
+    inner = sqlite_saver()
+    saver = write_behind(inner, tmp_path).start()
+    try:
+        agent = chat_agent(FakeListChatModel(responses=["hi"] * 4), [], saver, Config())
+        agent.handle_message("hello", "t1")
+        asyncio.run(agent.ahandle_message("again", "t1"))
+
+        # Another worker reads the database directly and sees both turns
+        assert len(inner.get_tuple(thread_config("t1")).checkpoint["channel_values"]["messages"]) == 4
+        assert saver.stats()["pending"] == 0
+    finally:
+        saver.close()
+
+
+def test_flush_on_release_can_be_turned_off(tmp_path, sqlite_saver):
+    inner = sqlite_saver()
+    saver = write_behind(inner, tmp_path).start()
+    config = Config()
+    config.checkpoint.write_behind.flush_on_release = False
+    try:
+        agent = chat_agent(FakeListChatModel(responses=["hi"]), [], saver, config)
+        agent.handle_message("hello", "t1")
+
+        assert inner.get_tuple(thread_config("t1")) is None
+        assert saver.stats()["pending"] > 0
+    finally:
+        saver.close()
+
+
+class PoisonedSaver(MemorySaver):
+    """A store that refuses every write of one thread"""
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        if config["configurable"]["thread_id"] == "poison":
+            raise ValueError("value too long for type character varying")
+        return super().put(config, checkpoint, metadata, new_versions)
+
+
+def test_a_write_that_keeps_failing_is_dead_lettered(tmp_path):
+    database = PoisonedSaver()
+    saver = write_behind(database, tmp_path, max_attempts=3)
+    try:
+        put_steps(saver, "poison", 1)
+        put_steps(saver, "t1", 2)
+
+        for _ in range(2):
+            with pytest.raises(ValueError):
+                saver.flush()
+        assert saver.stats()["pending"] == 6
+        saver.flush()
+
+        assert steps(database, "t1") == [0, 1]
+        assert saver.stats()["pending"] == 0
+        assert saver.stats()["dead_lettered"] == 1
+        [segment] = os.listdir(tmp_path / "journal" / "dead-letter")
+        [typed] = CheckpointJournal.read(str(tmp_path / "journal" / "dead-letter" / segment))
+        assert saver.serde.loads_typed(typed)["config"]["configurable"]["thread_id"] == "poison"
+    finally:
+        saver.close()